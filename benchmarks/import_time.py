@@ -0,0 +1,91 @@
+"""
+Import time benchmark and regression guard.
+
+Imports the package's entry points in fresh interpreters, reports their median cumulative
+import time as measured by `python -X importtime`, and exits with status 1 if a budget is
+exceeded or if a heavy dependency got pulled in at import time.
+
+    python benchmarks/import_time.py [--runs 7] [--budget-ms 80]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["green_invoice", "green_invoice.models", "green_invoice.resources"]
+
+# Must only be imported once actually used
+DEFERRED = ["requests", "urllib3", "lxml", "asyncio", "httpx", "orjson"]
+
+
+def import_time_us(module):
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        cwd=ROOT,
+        env=dict(os.environ, PYTHONPATH=ROOT),
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    ).stderr
+    for line in output.splitlines():
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    raise RuntimeError("No import time reported for {}".format(module))
+
+
+def loaded_deferred_modules(module):
+    code = (
+        "import sys, {}; print(' '.join(m for m in {!r} if m in sys.modules))".format(
+            module, DEFERRED
+        )
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        env=dict(os.environ, PYTHONPATH=ROOT),
+        stdout=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    ).stdout
+    return output.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=80,
+        help="maximum median import time of any entry point",
+    )
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        # Warm up, so that compiling .pyc files isn't measured
+        import_time_us(module)
+        median_ms = (
+            statistics.median(import_time_us(module) for _ in range(args.runs)) / 1000
+        )
+        loaded = loaded_deferred_modules(module)
+
+        status = "ok"
+        if median_ms > args.budget_ms:
+            status = "over budget"
+            failed = True
+        if loaded:
+            status = "imports " + ", ".join(loaded)
+            failed = True
+        print("{:<28} {:>8.1f} ms  {}".format(module, median_ms, status))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,555 @@
+"""
+Local stand-in for the Green Invoice API, for benchmarks.
+
+Serves the token, clients, documents, search and download link endpoints from memory,
+plus the PDF files the download links point to, with configurable latency and error
+injection. Run standalone, or start it from a benchmark with `start_server`:
+
+    python benchmarks/mock_server.py --port 8000 --latency 0.02 --error-rate 0.01
+
+Besides the API under /api, it serves:
+    GET  /_mock/stats   requests served per endpoint
+    POST /_mock/reset   zero the stats
+    POST /_mock/config  update latency, jitter, error_rate, error_status, token_ttl,
+                        drop_rate
+"""
+
+import argparse
+import base64
+import datetime
+import hashlib
+import json
+import random
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+API_PREFIX = "/api"
+
+DROP_AFTER_HEADER = "X-Mock-Drop-After"
+
+_id_segment = re.compile(r"^(?=.*\d)(?!v\d+$)[\w-]+$")
+
+DOCUMENT_TYPES = (305, 320, 330, 400)
+CURRENCIES = ("ILS", "ILS", "ILS", "USD", "EUR")
+PAYMENT_TYPES = (1, 2, 3, 4)
+VAT_RATE = 0.17
+
+
+def _endpoint(method, path):
+    return "{} {}".format(
+        method,
+        "/".join("{id}" if _id_segment.match(s) else s for s in path.split("/")),
+    )
+
+
+def _jwt(ttl):
+    def encode(obj):
+        data = json.dumps(obj).encode("utf-8")
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+    return "{}.{}.signature".format(
+        encode({"alg": "HS256", "typ": "JWT"}), encode({"exp": int(time.time() + ttl)})
+    )
+
+
+def _page(items, params):
+    page = max(int(params.get("page") or 1), 1)
+    page_size = max(int(params.get("pageSize") or 25), 1)
+    start = (page - 1) * page_size
+    return {
+        "total": len(items),
+        "page": page,
+        "pageSize": page_size,
+        "pages": (len(items) + page_size - 1) // page_size,
+        "items": items[start : start + page_size],
+    }
+
+
+def pdf_bytes(document_id, lang, size):
+    """
+    :return: deterministic fake PDF content of `size` bytes for a document
+    """
+    seed = hashlib.sha256("{}:{}".format(document_id, lang).encode()).digest()
+    header = b"%PDF-1.4\n"
+    body = seed * ((size - len(header)) // len(seed) + 1)
+    return (header + body)[:size]
+
+
+class MockGreenInvoice(object):
+    """
+    In-memory Green Invoice account.
+    `handle` maps one request to a (status, headers, body bytes) response.
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        error_status=503,
+        token_ttl=3600,
+        pdf_size=64 * 1024,
+        drop_rate=0.0,
+        seed=0,
+    ):
+        """
+        :param latency: seconds added to every API call
+        :param jitter: up to this many random seconds added on top of `latency`
+        :param error_rate: fraction of API calls answered with `error_status` instead
+        :param token_ttl: lifetime of issued tokens in seconds
+        :param pdf_size: size of the served document files in bytes
+        :param drop_rate: fraction of file downloads whose connection is dropped midway
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.token_ttl = token_ttl
+        self.pdf_size = pdf_size
+        self.drop_rate = drop_rate
+        self.base_url = "http://127.0.0.1"
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.clients = {}
+        self.documents = {}
+        self.stats = {}
+
+    # Data
+
+    def _new_id(self):
+        with self._lock:
+            entity_id = "{:012d}".format(self._next_id)
+            self._next_id += 1
+        return entity_id
+
+    def seed(self, clients=50, documents=1000, days=365):
+        """
+        Fill the account with clients and documents spread over the last `days` days
+        """
+        rnd = self._random
+        now = int(time.time())
+        client_ids = [
+            self.add_client(
+                {
+                    "name": "Client {}".format(i),
+                    "taxId": str(500000000 + i),
+                    "emails": ["client{}@example.com".format(i)],
+                    "active": True,
+                },
+                timestamp=now - rnd.randint(0, days * 86400),
+            )["id"]
+            for i in range(clients)
+        ]
+        created = sorted(now - rnd.randint(0, days * 86400) for _ in range(documents))
+        for i, timestamp in enumerate(created):
+            client = self.clients[rnd.choice(client_ids)]
+            currency = rnd.choice(CURRENCIES)
+            price = round(rnd.uniform(10, 5000), 2)
+            self.add_document(
+                {
+                    "description": "Document {}".format(i),
+                    "type": rnd.choice(DOCUMENT_TYPES),
+                    "currency": currency,
+                    "lang": rnd.choice(("he", "en")),
+                    "date": datetime.date.fromtimestamp(timestamp).isoformat(),
+                    "client": {"id": client["id"], "name": client["name"]},
+                    "income": [
+                        {
+                            "description": "Item",
+                            "quantity": rnd.randint(1, 3),
+                            "price": price,
+                            "currency": currency,
+                            "vatType": 0,
+                        }
+                    ],
+                    "payment": [{"type": rnd.choice(PAYMENT_TYPES), "price": price}],
+                },
+                timestamp=timestamp,
+                paid=rnd.random() < 0.8,
+            )
+        return self
+
+    def add_client(self, draft, timestamp=None):
+        timestamp = int(timestamp or time.time())
+        client = dict(
+            draft, id=self._new_id(), creationDate=timestamp, lastUpdateDate=timestamp
+        )
+        client.setdefault("active", True)
+        self.clients[client["id"]] = client
+        return client
+
+    def add_document(self, draft, timestamp=None, paid=True):
+        timestamp = int(timestamp or time.time())
+        document_id = self._new_id()
+        currency = draft.get("currency", "ILS")
+        income = [dict(row) for row in draft.get("income") or []]
+        amount_excluded = 0.0
+        for row in income:
+            row["amount"] = round(row.get("price", 0) * row.get("quantity", 1), 2)
+            row["vat"] = round(row["amount"] * VAT_RATE, 2)
+            row["amountTotal"] = round(row["amount"] + row["vat"], 2)
+            amount_excluded += row["amount"]
+        vat = round(amount_excluded * VAT_RATE, 2)
+        amount = round(amount_excluded + vat, 2)
+        rate = 1.0 if currency == "ILS" else 3.7
+        urls = self.document_urls(document_id)
+        document = {
+            "id": document_id,
+            "description": draft.get("description", ""),
+            "type": draft.get("type", 320),
+            "number": str(10000 + len(self.documents)),
+            "documentDate": draft.get("date")
+            or datetime.date.fromtimestamp(timestamp).isoformat(),
+            "creationDate": timestamp,
+            "status": 1 if paid else 0,
+            "lang": draft.get("lang", "he"),
+            "amountDueVat": round(amount_excluded, 2),
+            "amountExemptVat": 0,
+            "amountExcludedVat": round(amount_excluded, 2),
+            "amountLocal": round(amount * rate, 2),
+            "amountOpened": 0 if paid else amount,
+            "vat": vat,
+            "amount": amount,
+            "currency": currency,
+            "currencyRate": rate,
+            "vatType": draft.get("vatType", 0),
+            "income": income,
+            "payment": [
+                dict(payment, name="Payment") for payment in draft.get("payment") or []
+            ],
+            "client": dict(draft.get("client") or {}),
+            "business": {"type": 2, "exemption": False},
+            "url": urls,
+            "signed": draft.get("signed", True),
+        }
+        document["client"].pop("add", None)
+        self.documents[document_id] = document
+        return document
+
+    def document_urls(self, document_id):
+        return {
+            lang: "{}/files/{}/{}.pdf".format(self.base_url, document_id, lang)
+            for lang in ("origin", "he", "en")
+        }
+
+    # Search
+
+    def search_clients(self, params):
+        items = list(self.clients.values())
+        if params.get("name"):
+            items = [c for c in items if params["name"] in c.get("name", "")]
+        if "active" in params:
+            items = [c for c in items if c.get("active") == params["active"]]
+        if params.get("taxId"):
+            items = [c for c in items if c.get("taxId") == params["taxId"]]
+        if params.get("email"):
+            items = [c for c in items if params["email"] in (c.get("emails") or [])]
+        return _page(items, params)
+
+    def search_documents(self, params):
+        items = list(self.documents.values())
+        if params.get("type"):
+            items = [d for d in items if d["type"] in params["type"]]
+        if params.get("status"):
+            items = [d for d in items if d["status"] in params["status"]]
+        if params.get("paymentTypes"):
+            types = set(params["paymentTypes"])
+            items = [
+                d for d in items if types.intersection(p["type"] for p in d["payment"])
+            ]
+        if params.get("fromDate"):
+            items = [d for d in items if d["documentDate"] >= params["fromDate"]]
+        if params.get("toDate"):
+            items = [d for d in items if d["documentDate"] <= params["toDate"]]
+        if params.get("clientId"):
+            items = [d for d in items if d["client"].get("id") == params["clientId"]]
+        if params.get("clientName"):
+            items = [
+                d
+                for d in items
+                if params["clientName"] in (d["client"].get("name") or "")
+            ]
+        if params.get("description"):
+            items = [d for d in items if params["description"] in d["description"]]
+        if params.get("number"):
+            items = [d for d in items if d["number"] == str(params["number"])]
+        sort = params.get("sort") or "documentDate"
+        items.sort(key=lambda d: (d[sort], d["id"]), reverse=True)
+        return _page(items, params)
+
+    # HTTP
+
+    def handle(self, method, path, headers, body):
+        """
+        :param path: URL path, with its query string
+        :param headers: request headers, a case insensitive mapping
+        :param body: request body bytes
+        :return: tuple of status code, headers dictionary and body bytes
+        """
+        path = path.split("?", 1)[0]
+        if path.startswith("/_mock/"):
+            return self._handle_control(method, path, body)
+        if path.startswith("/files/"):
+            return self._count(
+                method + " /files/{id}/{lang}.pdf", self._file(path, headers)
+            )
+        if not path.startswith(API_PREFIX + "/"):
+            return self._json(404, {"errorMessage": "Not found"})
+
+        path = path[len(API_PREFIX) :]
+        endpoint = _endpoint(method, path)
+        self._sleep()
+        if path == "/v1/account/token":
+            return self._count(endpoint, self._token(body))
+
+        if self._random.random() < self.error_rate:
+            return self._count(
+                endpoint,
+                self._json(
+                    self.error_status,
+                    {"errorCode": 1, "errorMessage": "Injected error"},
+                    {"Retry-After": "0"},
+                ),
+            )
+        if not (headers.get("Authorization") or "").startswith("Bearer "):
+            return self._count(endpoint, self._json(401, {"errorCode": 401}))
+
+        data = json.loads(body) if body else {}
+        return self._count(endpoint, self._route(method, path, data))
+
+    def handle_request(self, request):
+        """
+        Handler for green_invoice.transport.InProcessTransport
+        """
+        path = urlsplit(request.url).path
+        headers = {name.title(): value for name, value in request.headers.items()}
+        return self.handle(request.method, path, headers, request.body or b"")
+
+    def _count(self, endpoint, response):
+        with self._lock:
+            self.stats[endpoint] = self.stats.get(endpoint, 0) + 1
+        return response
+
+    def _sleep(self):
+        delay = self.latency + (
+            self._random.random() * self.jitter if self.jitter else 0
+        )
+        if delay > 0:
+            time.sleep(delay)
+
+    # noinspection PyMethodMayBeStatic
+    def _json(self, status, obj, headers=None):
+        data = json.dumps(obj).encode("utf-8")
+        return status, dict(headers or {}, **{"Content-Type": "application/json"}), data
+
+    def _token(self, body):
+        credentials = json.loads(body) if body else {}
+        if not credentials.get("id") or not credentials.get("secret"):
+            return self._json(
+                401, {"errorCode": 401, "errorMessage": "Bad credentials"}
+            )
+        return self._json(200, {}, {"X-Authorization-Bearer": _jwt(self.token_ttl)})
+
+    def _route(self, method, path, data):
+        parts = path.strip("/").split("/")[1:]  # without the version
+        if parts[0] == "clients":
+            return self._route_clients(method, parts[1:], data)
+        if parts[0] == "documents":
+            return self._route_documents(method, parts[1:], data)
+        return self._json(404, {"errorMessage": "Not found"})
+
+    def _route_clients(self, method, parts, data):
+        if not parts:
+            if method == "POST":
+                return self._json(201, self.add_client(data))
+        elif parts == ["search"] and method == "POST":
+            return self._json(200, self.search_clients(data))
+        elif parts[0] in self.clients:
+            client = self.clients[parts[0]]
+            if len(parts) == 1 and method == "GET":
+                return self._json(200, client)
+            if len(parts) == 1 and method == "PUT":
+                client.update(data, lastUpdateDate=int(time.time()))
+                return self._json(200, client)
+            if len(parts) == 1 and method == "DELETE":
+                del self.clients[parts[0]]
+                return self._json(200, {})
+            if parts[1:] == ["assoc"] and method == "POST":
+                for document_id in data.get("ids") or []:
+                    if document_id in self.documents:
+                        self.documents[document_id]["client"] = {
+                            "id": client["id"],
+                            "name": client["name"],
+                        }
+                return self._json(200, {})
+        return self._json(404, {"errorCode": 404, "errorMessage": "Not found"})
+
+    def _route_documents(self, method, parts, data):
+        if not parts:
+            if method == "POST":
+                document = self.add_document(data)
+                return self._json(
+                    201,
+                    {
+                        "id": document["id"],
+                        "number": int(document["number"]),
+                        "signed": document["signed"],
+                        "lang": document["lang"],
+                        "url": document["url"],
+                    },
+                )
+        elif parts == ["search"] and method == "POST":
+            return self._json(200, self.search_documents(data))
+        elif parts[0] in self.documents:
+            if len(parts) == 1 and method == "GET":
+                return self._json(200, self.documents[parts[0]])
+            if parts[1:] == ["download", "links"] and method == "GET":
+                return self._json(200, self.document_urls(parts[0]))
+        return self._json(404, {"errorCode": 404, "errorMessage": "Not found"})
+
+    def _file(self, path, headers):
+        match = re.match(r"^/files/([^/]+)/(\w+)\.pdf$", path)
+        if not match or match.group(1) not in self.documents:
+            return 404, {}, b""
+        self._sleep()
+        content = pdf_bytes(match.group(1), match.group(2), self.pdf_size)
+        response_headers = {
+            "Content-Type": "application/pdf",
+            "Accept-Ranges": "bytes",
+            "Digest": "sha-256="
+            + base64.b64encode(hashlib.sha256(content).digest()).decode("ascii"),
+        }
+
+        ranged = re.match(r"^bytes=(\d+)-$", headers.get("Range") or "")
+        if ranged:
+            start = int(ranged.group(1))
+            if start >= len(content):
+                response_headers["Content-Range"] = "bytes */{}".format(len(content))
+                return 416, response_headers, b""
+            response_headers["Content-Range"] = "bytes {}-{}/{}".format(
+                start, len(content) - 1, len(content)
+            )
+            content = content[start:]
+            status = 206
+        else:
+            status = 200
+        if self._random.random() < self.drop_rate:
+            # Tells the HTTP handler to cut the connection halfway through the body
+            response_headers[DROP_AFTER_HEADER] = str(len(content) // 2)
+        return status, response_headers, content
+
+    def _handle_control(self, method, path, body):
+        if path == "/_mock/stats":
+            with self._lock:
+                stats = dict(self.stats)
+            return self._json(200, {"requests": stats, "total": sum(stats.values())})
+        if path == "/_mock/reset" and method == "POST":
+            with self._lock:
+                self.stats.clear()
+            return self._json(200, {})
+        if path == "/_mock/config" and method == "POST":
+            config = json.loads(body) if body else {}
+            for name in (
+                "latency",
+                "jitter",
+                "error_rate",
+                "error_status",
+                "token_ttl",
+            ):
+                if name in config:
+                    setattr(self, name, config[name])
+            return self._json(200, {})
+        return self._json(404, {})
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, Nagle would hold the body back
+    disable_nagle_algorithm = True
+    app = None
+    """:type : MockGreenInvoice"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        status, headers, data = self.app.handle(
+            self.command, self.path, self.headers, body
+        )
+        drop_after = headers.pop(DROP_AFTER_HEADER, None)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if drop_after is None:
+            self.wfile.write(data)
+            return
+        self.wfile.write(data[: int(drop_after)])
+        self.wfile.flush()
+        self.close_connection = True
+        self.connection.shutdown(socket.SHUT_RDWR)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def start_server(app, host="127.0.0.1", port=0):
+    """
+    Serve `app` from a background thread
+    :return: the running server, stop it with server.shutdown()
+    """
+    handler = type("Handler", (_Handler,), {"app": app})
+    server = _Server((host, port), handler)
+    app.base_url = "http://{}:{}".format(host, server.server_address[1])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Green Invoice API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--pdf-size", type=int, default=64 * 1024)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app = MockGreenInvoice(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        pdf_size=args.pdf_size,
+        drop_rate=args.drop_rate,
+    )
+    server = start_server(app, args.host, args.port)
+    app.seed(clients=args.clients, documents=args.documents)
+    # The first line tells a parent process where to connect
+    print(app.base_url + API_PREFIX, flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+Benchmarks of Client, ClientResource and DocumentResource against a local mock server.
+
+Starts benchmarks/mock_server.py in a subprocess, so that serving requests doesn't compete
+with the measured client for the GIL, or with --transport=inprocess calls it in process to
+measure the client's own overhead. Then runs every scenario and reports for each:
+operations/sec, requests/sec, p50/p95/p99 latency per operation, round-trips per
+operation (as counted by the server) and the peak memory allocated by one operation
+(measured with tracemalloc in a separate, untimed pass).
+bulk_download's round-trips include the file transfers besides the API calls.
+
+    python benchmarks/run.py [--latency 0.005] [--error-rate 0.01] [--scenario search_scan]
+"""
+
+import argparse
+import atexit
+import contextlib
+import json
+import os
+import random
+import statistics
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+sys.path[:0] = [
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    os.path.dirname(os.path.abspath(__file__)),
+]
+
+from green_invoice.cache import MemoryCache  # noqa: E402
+from green_invoice.client import Client  # noqa: E402
+from green_invoice.resources import ClientResource, DocumentResource  # noqa: E402
+from green_invoice.transport import InProcessTransport  # noqa: E402
+
+from mock_server import API_PREFIX, MockGreenInvoice  # noqa: E402
+
+MOCK_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py")
+
+
+class MockServer(object):
+    """
+    benchmarks/mock_server.py running in a subprocess
+    """
+
+    def __init__(self, api_url):
+        self.api_url = api_url
+
+    def served_requests(self):
+        """
+        :return: API calls served so far
+        """
+        url = self.api_url.rsplit("/api", 1)[0] + "/_mock/stats"
+        with urllib.request.urlopen(url) as response:
+            return json.loads(response.read())["total"]
+
+    def client_options(self, transport):
+        return {"transport": transport}
+
+
+class InProcessMockServer(object):
+    """
+    The mock server's application called in process through InProcessTransport,
+    measuring the client without any networking
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.api_url = app.base_url + API_PREFIX
+
+    def served_requests(self):
+        return sum(self.app.stats.values())
+
+    def client_options(self, transport):
+        return {"transport": InProcessTransport(self.app.handle_request)}
+
+
+@contextlib.contextmanager
+def mock_server(args):
+    """
+    :return: context manager running the mock server, yielding a MockServer
+    """
+    if args.transport == "inprocess":
+        app = MockGreenInvoice(
+            latency=args.latency, jitter=args.jitter, error_rate=args.error_rate
+        )
+        app.base_url = "http://mock.invalid"
+        app.seed(clients=args.clients, documents=args.documents)
+        yield InProcessMockServer(app)
+        return
+
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            MOCK_SERVER,
+            "--port=0",
+            "--latency={}".format(args.latency),
+            "--jitter={}".format(args.jitter),
+            "--error-rate={}".format(args.error_rate),
+            "--documents={}".format(args.documents),
+            "--clients={}".format(args.clients),
+        ],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    try:
+        yield MockServer(process.stdout.readline().strip())
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def make_client(api_url, **options):
+    client_class = type(
+        "BenchmarkClient", (Client,), {"ENDPOINTS": {"sandbox": api_url}}
+    )
+    return client_class("sandbox", "benchmark-id", "benchmark-secret", **options)
+
+
+def document_draft(i):
+    return {
+        "description": "Benchmark document {}".format(i),
+        "type": 320,
+        "currency": "ILS",
+        "lang": "he",
+        "client": {"name": "Benchmark client", "add": False},
+        "income": [
+            {
+                "description": "Item",
+                "quantity": 1,
+                "price": 100 + i,
+                "currency": "ILS",
+                "vatType": 0,
+            }
+        ],
+        "payment": [{"type": 1, "price": 100 + i, "currency": "ILS"}],
+    }
+
+
+# Scenarios build their operation from the client and return it with a description
+
+BULK_SIZE = 20
+READ_IDS = 20
+
+
+def single_create(client, args):
+    documents = DocumentResource(client)
+    counter = iter(range(sys.maxsize))
+    return "create one document", lambda: documents.create(
+        document_draft(next(counter))
+    )
+
+
+def bulk_create(client, args):
+    documents = DocumentResource(client)
+    drafts = [document_draft(i) for i in range(BULK_SIZE)]
+    return (
+        "create_many of {} documents, concurrency {}".format(
+            BULK_SIZE, args.concurrency
+        ),
+        lambda: documents.create_many(drafts, concurrency=args.concurrency),
+    )
+
+
+def search_scan(client, args):
+    documents = DocumentResource(client)
+    return (
+        "iterate all documents, page size {}".format(args.page_size),
+        lambda: sum(1 for _ in documents.iter_documents(page_size=args.page_size)),
+    )
+
+
+def search_scan_prefetch(client, args):
+    documents = DocumentResource(client)
+    return (
+        "iterate all documents, page size {}, prefetch {}".format(
+            args.page_size, args.concurrency
+        ),
+        lambda: sum(
+            1
+            for _ in documents.iter_documents(
+                page_size=args.page_size, prefetch=args.concurrency
+            )
+        ),
+    )
+
+
+def client_scan(client, args):
+    clients = ClientResource(client)
+    return (
+        "iterate all clients, page size {}".format(args.page_size),
+        lambda: sum(1 for _ in clients.iter_clients(page_size=args.page_size)),
+    )
+
+
+def _document_ids(client):
+    page = DocumentResource(client).search_document({"pageSize": READ_IDS})
+    return [item["id"] for item in page["items"]]
+
+
+def uncached_read(client, args):
+    documents = DocumentResource(client)
+    ids = _document_ids(client)
+    rnd = random.Random(0)
+    return (
+        "find_by_document_id over {} documents".format(len(ids)),
+        lambda: documents.find_by_document_id(rnd.choice(ids)),
+    )
+
+
+def cached_read(client, args):
+    documents = DocumentResource(client, cache=MemoryCache(ttl=300))
+    ids = _document_ids(client)
+    rnd = random.Random(0)
+    return (
+        "find_by_document_id over {} documents, MemoryCache".format(len(ids)),
+        lambda: documents.find_by_document_id(rnd.choice(ids)),
+    )
+
+
+def bulk_download(client, args):
+    documents = DocumentResource(client)
+    ids = _document_ids(client)
+    dest_dir = tempfile.mkdtemp(prefix="green-invoice-benchmark-")
+    atexit.register(shutil.rmtree, dest_dir, True)
+    return (
+        "download_documents of {} PDFs, concurrency {}".format(
+            len(ids), args.concurrency
+        ),
+        lambda: documents.download_documents(
+            ids, dest_dir, concurrency=args.concurrency
+        ),
+    )
+
+
+# Creating scenarios run last, so the scans see the same number of documents
+SCENARIOS = {
+    "search_scan": search_scan,
+    "search_scan_prefetch": search_scan_prefetch,
+    "client_scan": client_scan,
+    "uncached_read": uncached_read,
+    "cached_read": cached_read,
+    "bulk_download": bulk_download,
+    "single_create": single_create,
+    "bulk_create": bulk_create,
+}
+
+# Operations per scenario, the slow ones run fewer times
+DEFAULT_OPS = {
+    "bulk_create": 10,
+    "bulk_download": 10,
+    "search_scan": 10,
+    "search_scan_prefetch": 10,
+    "client_scan": 20,
+}
+
+
+def percentile(sorted_values, fraction):
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_scenario(name, server, args):
+    ops = args.ops or DEFAULT_OPS.get(name, 200)
+    with make_client(
+        server.api_url,
+        rate_limit=None,
+        json_codec=args.json_codec,
+        pool_maxsize=args.pool,
+        **server.client_options(args.transport)
+    ) as client:
+        description, operation = SCENARIOS[name](client, args)
+        # Warm up: token, connections, caches
+        operation()
+
+        requests_before = server.served_requests()
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(ops):
+            op_started = time.perf_counter()
+            operation()
+            latencies.append(time.perf_counter() - op_started)
+        elapsed = time.perf_counter() - started
+        round_trips = server.served_requests() - requests_before
+
+        alloc_ops = min(ops, args.alloc_ops)
+        peaks = []
+        tracemalloc.start()
+        try:
+            for _ in range(alloc_ops):
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                operation()
+                peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        finally:
+            tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "description": description,
+        "ops": ops,
+        "seconds": elapsed,
+        "ops_per_sec": ops / elapsed,
+        "requests_per_sec": round_trips / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "round_trips_per_op": round_trips / ops,
+        "peak_kib_per_op": statistics.mean(peaks) / 1024 if peaks else None,
+    }
+
+
+def print_report(results):
+    columns = (
+        ("scenario", "{:<22}", "{:<22}"),
+        ("ops/s", "{:>9}", "{:>9.1f}"),
+        ("req/s", "{:>9}", "{:>9.1f}"),
+        ("p50 ms", "{:>9}", "{:>9.2f}"),
+        ("p95 ms", "{:>9}", "{:>9.2f}"),
+        ("p99 ms", "{:>9}", "{:>9.2f}"),
+        ("rt/op", "{:>8}", "{:>8.2f}"),
+        ("KiB/op", "{:>9}", "{:>9.1f}"),
+    )
+    keys = (
+        "scenario",
+        "ops_per_sec",
+        "requests_per_sec",
+        "p50_ms",
+        "p95_ms",
+        "p99_ms",
+        "round_trips_per_op",
+        "peak_kib_per_op",
+    )
+    print(" ".join(header.format(title) for title, header, _ in columns))
+    for result in results:
+        print(
+            " ".join(
+                cell.format(result[key] if result[key] is not None else float("nan"))
+                for (_, _, cell), key in zip(columns, keys)
+            )
+        )
+    print()
+    for result in results:
+        print("{:<22} {}".format(result["scenario"], result["description"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Green Invoice client against a local mock server"
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="scenario to run, may be repeated, defaults to all",
+    )
+    parser.add_argument("--ops", type=int, help="operations per scenario")
+    parser.add_argument(
+        "--alloc-ops",
+        type=int,
+        default=5,
+        help="operations measured with tracemalloc",
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="server latency")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency jitter")
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="fraction of failing calls"
+    )
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pool", type=int, default=10, help="connection pool size")
+    parser.add_argument("--json-codec", default=None, help="json, orjson or auto")
+    parser.add_argument(
+        "--transport",
+        default="requests",
+        choices=("requests", "http2", "inprocess"),
+        help="inprocess calls the mock server's handler directly, without networking",
+    )
+    parser.add_argument("--json", metavar="PATH", help="also write results as JSON")
+    args = parser.parse_args()
+
+    scenarios = args.scenario or list(SCENARIOS)
+    with mock_server(args) as server:
+        results = [run_scenario(name, server, args) for name in scenarios]
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Stress test of one Client shared by many threads, against the mock server running in a
+background thread.
+
+Every thread creates and reads back clients, checking that each call's result and the
+client's `last_response` are its own. Short lived tokens make the threads refresh the
+token concurrently, and the token endpoint must be called once per expiry, not once per
+thread. Exits with status 1 on any failure.
+
+    python benchmarks/stress.py [--threads 32] [--calls 200] [--token-ttl 3] [--transport http2]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+
+sys.path[:0] = [
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    os.path.dirname(os.path.abspath(__file__)),
+]
+
+from green_invoice.resources import ClientResource  # noqa: E402
+
+from mock_server import API_PREFIX, MockGreenInvoice, start_server  # noqa: E402
+from run import make_client  # noqa: E402
+
+
+class Worker(threading.Thread):
+    def __init__(self, index, resource, calls, start_barrier):
+        super().__init__(name="stress-{}".format(index))
+        self.index = index
+        self.resource = resource
+        self.calls = calls
+        self.start_barrier = start_barrier
+        self.errors = []
+        self.mixed_up = 0
+        self.dropped = 0
+        # (id, name) of the last client this thread created
+        self.created = None
+
+    def run(self):
+        client = self.resource.client
+        self.start_barrier.wait()
+        for call in range(self.calls):
+            name = "thread {} call {}".format(self.index, call)
+            try:
+                if call % 2 == 0 or self.created is None:
+                    body = self.resource.create({"name": name})
+                    self.created = (body["id"], name)
+                    expected = name
+                else:
+                    body = self.resource.find_by_client_id(self.created[0])
+                    expected = self.created[1]
+                last = json.loads(client.last_response.content)
+                if body.get("name") != expected or last.get("name") != expected:
+                    self.mixed_up += 1
+            except client.connection_errors:
+                # Dropped connections are retried by the client's retry policy,
+                # disabled here to count them
+                self.dropped += 1
+            except Exception:
+                self.errors.append(traceback.format_exc())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Hammer one shared Client from many threads"
+    )
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--calls", type=int, default=200, help="calls per thread")
+    parser.add_argument(
+        "--token-ttl", type=int, default=3, help="lifetime of the mock's tokens"
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="server latency")
+    parser.add_argument("--pool", type=int, default=16, help="connection pool size")
+    parser.add_argument(
+        "--transport", default="requests", choices=("requests", "http2")
+    )
+    args = parser.parse_args()
+
+    app = MockGreenInvoice(latency=args.latency, token_ttl=args.token_ttl)
+    server = start_server(app)
+    app.base_url = "http://{}:{}".format(*server.server_address)
+
+    client = make_client(
+        app.base_url + API_PREFIX,
+        transport=args.transport,
+        pool_maxsize=args.pool,
+        retry=None,
+    )
+    resource = ClientResource(client)
+    start_barrier = threading.Barrier(args.threads)
+    workers = [
+        Worker(index, resource, args.calls, start_barrier)
+        for index in range(args.threads)
+    ]
+
+    # Switch threads as often as possible, to hit races the default 5ms would hide
+    sys.setswitchinterval(1e-6)
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = time.monotonic() - started
+    pool = client.pool_stats()
+    server.shutdown()
+    client.close()
+
+    calls = args.threads * args.calls
+    errors = sum(len(worker.errors) for worker in workers)
+    mixed_up = sum(worker.mixed_up for worker in workers)
+    dropped = sum(worker.dropped for worker in workers)
+    token_calls = app.stats.get("POST /v1/account/token", 0)
+    # A token is used for half its lifetime at least, see auth.TokenCache, and the
+    # mock's whole second expiry may cut a second off that lifetime
+    max_token_calls = int(seconds / ((args.token_ttl - 1) / 2)) + 2
+
+    print(
+        "{} threads, {} calls in {:.2f}s ({:.0f} calls/s)".format(
+            args.threads, calls, seconds, calls / seconds
+        )
+    )
+    print("errors:                {}".format(errors))
+    print("mixed up responses:    {}".format(mixed_up))
+    print("dropped connections:   {}".format(dropped))
+    print("token fetches:         {} (at most {})".format(token_calls, max_token_calls))
+    print("pool:                  {}".format(pool))
+    for worker in workers:
+        for error in worker.errors[:1]:
+            print(error)
+
+    if errors or mixed_up or token_calls > max_token_calls:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
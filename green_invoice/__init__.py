@@ -1,3 +1,41 @@
-__all__ = ["client", "exceptions", "models", "resources", "version"]
+__all__ = [
+    "auth",
+    "cache",
+    "circuit",
+    "client",
+    "codec",
+    "columnar",
+    "compact",
+    "coalesce",
+    "download",
+    "exceptions",
+    "metrics",
+    "mirror",
+    "models",
+    "pagination",
+    "query",
+    "ratelimit",
+    "resources",
+    "retry",
+    "sync",
+    "tenants",
+    "transport",
+    "validation",
+    "vat",
+    "version",
+]
 
-from . import client, exceptions, models, resources, version
+
+def __getattr__(name):
+    # Submodules are imported on first access, keeping `import green_invoice` cheap
+    if name in __all__:
+        import importlib
+
+        module = importlib.import_module("." + name, __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,148 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+
+
+def decode_jwt_expiry(token):
+    """
+    Read the `exp` claim of a JWT without verifying its signature
+    :param token: JWT token string
+    :return: expiry as a unix timestamp, or None if it cannot be decoded
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload.encode("ascii")))
+        return float(claims["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenCache(object):
+    """
+    Caches the bearer token returned by `fetch_token` until shortly before it expires.
+    Refreshing is single-flight: concurrent callers wait for one refresh instead of
+    all re-authenticating together.
+    """
+
+    def __init__(self, fetch_token, refresh_margin=60, default_ttl=300):
+        """
+        :param fetch_token: callable returning a fresh JWT token string
+        :param refresh_margin: seconds before expiry at which the token is refreshed
+        :param default_ttl: lifetime in seconds to assume when the token has no `exp` claim
+        """
+        self._fetch_token = fetch_token
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._token = None
+        self._refresh_at = 0.0
+
+        self.hits = 0
+        self.refreshes = 0
+        self.refresh_seconds_total = 0.0
+        self.last_refresh_seconds = None
+
+    def get(self):
+        """
+        :return: a valid token, refreshing it if needed
+        """
+        token = self._cached_token()
+        if token:
+            return token
+
+        with self._lock:
+            # Another thread may have refreshed while we were waiting for the lock
+            token = self._cached_token()
+            if token:
+                return token
+
+            started = time.monotonic()
+            token = self._fetch_token()
+            self._store(token, time.monotonic() - started)
+            return token
+
+    def invalidate(self, token=None):
+        """
+        Drop the cached token so the next `get` fetches a new one
+        :param token: only invalidate if this is still the cached token
+        """
+        with self._lock:
+            self._drop(token)
+
+    @property
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "hits": self.hits,
+                "refreshes": self.refreshes,
+                "refresh_seconds_total": self.refresh_seconds_total,
+                "last_refresh_seconds": self.last_refresh_seconds,
+            }
+
+    def _cached_token(self):
+        token, refresh_at = self._token, self._refresh_at
+        if token and time.time() < refresh_at:
+            with self._stats_lock:
+                self.hits += 1
+            return token
+        return None
+
+    def _drop(self, token):
+        if token is None or token == self._token:
+            self._token = None
+            self._refresh_at = 0.0
+
+    def _store(self, token, elapsed):
+        now = time.time()
+        expires_at = decode_jwt_expiry(token)
+        lifetime = expires_at - now if expires_at else self.default_ttl
+        # Never reuse a token for less than half of its lifetime, even with a large margin
+        self._refresh_at = now + max(lifetime - self.refresh_margin, lifetime / 2)
+        self._token = token
+
+        with self._stats_lock:
+            self.refreshes += 1
+            self.refresh_seconds_total += elapsed
+            self.last_refresh_seconds = elapsed
+
+
+class AsyncTokenCache(TokenCache):
+    """
+    TokenCache for coroutine based clients, `fetch_token` must be a coroutine function
+    """
+
+    def __init__(self, fetch_token, refresh_margin=60, default_ttl=300):
+        super().__init__(
+            fetch_token, refresh_margin=refresh_margin, default_ttl=default_ttl
+        )
+        self._async_lock = asyncio.Lock()
+
+    async def get(self):
+        """
+        :return: a valid token, refreshing it if needed
+        """
+        token = self._cached_token()
+        if token:
+            return token
+
+        async with self._async_lock:
+            token = self._cached_token()
+            if token:
+                return token
+
+            started = time.monotonic()
+            token = await self._fetch_token()
+            self._store(token, time.monotonic() - started)
+            return token
+
+    def invalidate(self, token=None):
+        """
+        Drop the cached token so the next `get` fetches a new one
+        :param token: only invalidate if this is still the cached token
+        """
+        self._drop(token)
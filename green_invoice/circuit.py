@@ -0,0 +1,324 @@
+import collections
+import threading
+import time
+
+from .exceptions import CircuitOpenError
+from .metrics import endpoint_of
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class Circuit(object):
+    """
+    Circuit breaker of one endpoint.
+    While closed, calls go through and the outcomes of the last `window` calls are kept.
+    Failures are connection errors, `failure_statuses` responses and, with
+    `slow_call_seconds`, slower calls. Once they make up `failure_threshold` of at least
+    `min_calls` calls the circuit opens, and calls fail fast with CircuitOpenError for
+    `reset_timeout` seconds. It is then half-open and lets `half_open_probes` calls
+    through: it closes when they all succeed, and opens again on the first failure.
+    """
+
+    def __init__(
+        self,
+        endpoint,
+        window=20,
+        min_calls=10,
+        failure_threshold=0.5,
+        slow_call_seconds=None,
+        reset_timeout=30,
+        half_open_probes=1,
+        failure_statuses=(500, 502, 503, 504),
+        notify=None,
+    ):
+        """
+        :param endpoint: endpoint path, with ids collapsed, see metrics.endpoint_of
+        :param window: number of recent calls the failure rate is computed over
+        :param min_calls: calls needed in the window before the circuit may open
+        :param failure_threshold: fraction of failed calls opening the circuit
+        :param slow_call_seconds: duration from which a call counts as failed, None to
+                                  ignore durations
+        :param reset_timeout: seconds the circuit stays open before probing the endpoint
+        :param half_open_probes: calls let through while half-open
+        :param failure_statuses: HTTP status codes counted as failures
+        :param notify: called as notify(endpoint, old_state, new_state) on state changes
+        """
+        self.endpoint = endpoint
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.failure_statuses = frozenset(failure_statuses)
+        self.notify = notify
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        # Incremented on every state change, so that calls admitted in a previous state
+        # don't count in the current one
+        self._generation = 0
+        self._outcomes = collections.deque(maxlen=window)
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probes_succeeded = 0
+
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            change = self._expire(time.monotonic())
+        self._notify(change)
+        return self._state
+
+    def check(self):
+        """
+        :raises CircuitOpenError: if a call would be rejected now
+        """
+        with self._lock:
+            now = time.monotonic()
+            change = self._expire(now)
+            retry_after = self._rejection(now)
+        self._notify(change)
+        if retry_after is not None:
+            raise CircuitOpenError(self.endpoint, retry_after)
+
+    def call(self, connection_errors=()):
+        """
+        Admit a call, whose outcome is recorded when the returned context exits.
+        Exceptions other than `connection_errors` don't count either way.
+
+            with circuit.call(connection_errors) as call:
+                response = send(request)
+                call.status_code = response.status_code
+
+        :rtype : CircuitCall
+        :raises CircuitOpenError: if the circuit is open, or half-open with all its probes
+                                  in flight
+        """
+        with self._lock:
+            now = time.monotonic()
+            change = self._expire(now)
+            retry_after = self._rejection(now)
+            if retry_after is None and self._state == HALF_OPEN:
+                self._probes += 1
+            generation = self._generation
+        self._notify(change)
+        if retry_after is not None:
+            raise CircuitOpenError(self.endpoint, retry_after)
+        return CircuitCall(self, generation, connection_errors)
+
+    def reset(self):
+        """
+        Close the circuit and forget past calls
+        """
+        with self._lock:
+            change = self._set_state(CLOSED)
+        self._notify(change)
+
+    def _expire(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+            return self._set_state(HALF_OPEN)
+        return None
+
+    def _rejection(self, now):
+        """
+        :return: seconds until calls may be admitted again, or None if one is admitted
+        """
+        if self._state == OPEN:
+            self.rejected += 1
+            return self.reset_timeout - (now - self._opened_at)
+        if self._state == HALF_OPEN and self._probes >= self.half_open_probes:
+            self.rejected += 1
+            # Until a probe in flight closes or reopens the circuit
+            return 0.0
+        return None
+
+    def _set_state(self, state):
+        """
+        :return: (old state, new state) to notify once the lock is released
+        """
+        old = self._state
+        self._state = state
+        self._generation += 1
+        self._outcomes.clear()
+        self._failures = 0
+        self._probes = 0
+        self._probes_succeeded = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.opened += 1
+        return old, state
+
+    def _notify(self, change):
+        if change is not None and change[0] != change[1] and self.notify is not None:
+            self.notify(self.endpoint, *change)
+
+    def _record(self, generation, failed):
+        change = None
+        with self._lock:
+            if generation != self._generation:
+                # Admitted before the last state change, which it doesn't count in
+                return
+            if self._state == HALF_OPEN:
+                if failed:
+                    change = self._set_state(OPEN)
+                else:
+                    self._probes_succeeded += 1
+                    if self._probes_succeeded >= self.half_open_probes:
+                        change = self._set_state(CLOSED)
+            elif self._state == CLOSED:
+                outcomes = self._outcomes
+                if len(outcomes) == outcomes.maxlen and outcomes[0]:
+                    self._failures -= 1
+                outcomes.append(failed)
+                self._failures += failed
+                calls = len(outcomes)
+                if (
+                    calls >= self.min_calls
+                    and self._failures >= self.failure_threshold * calls
+                ):
+                    change = self._set_state(OPEN)
+        self._notify(change)
+
+    def _release(self, generation):
+        with self._lock:
+            if generation == self._generation and self._state == HALF_OPEN:
+                self._probes -= 1
+
+    def _failed(self, status_code, seconds):
+        return status_code in self.failure_statuses or (
+            self.slow_call_seconds is not None and seconds >= self.slow_call_seconds
+        )
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._state,
+                "calls": len(self._outcomes),
+                "failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+class CircuitCall(object):
+    """
+    A call admitted by Circuit.call
+    """
+
+    __slots__ = ("circuit", "generation", "connection_errors", "started", "status_code")
+
+    def __init__(self, circuit, generation, connection_errors):
+        self.circuit = circuit
+        self.generation = generation
+        self.connection_errors = connection_errors
+        self.started = None
+        self.status_code = None
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        circuit = self.circuit
+        if exc_type is None:
+            seconds = time.monotonic() - self.started
+            circuit._record(self.generation, circuit._failed(self.status_code, seconds))
+        elif issubclass(exc_type, self.connection_errors):
+            circuit._record(self.generation, True)
+        else:
+            circuit._release(self.generation)
+        return False
+
+
+class CircuitBreaker(object):
+    """
+    Client side circuit breaker with one Circuit per endpoint, created on first use.
+    Endpoints are request paths with their ids collapsed, e.g. /v1/documents/{id}, so an
+    outage of one endpoint doesn't stop calls to the others.
+    """
+
+    def __init__(self, endpoints=None, hooks=None, **circuit_options):
+        """
+        :param endpoints: dictionary of path prefix to Circuit keyword arguments of the
+                          endpoints starting with it
+        :param hooks: callables notified of state changes, see add_hook
+        :param circuit_options: Circuit keyword arguments shared by all endpoints
+        """
+        self.circuit_options = circuit_options
+        self.endpoints = endpoints or {}
+        self.circuits = {}
+        self._prefixes = sorted(self.endpoints, key=len, reverse=True)
+        self._hooks = list(hooks or [])
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """
+        :param hook: callable as hook(endpoint, old_state, new_state), states being one
+                     of CLOSED, OPEN and HALF_OPEN. Called from the thread or task whose
+                     call changed the state, e.g. to queue work while an endpoint is open.
+        """
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def _notify(self, endpoint, old_state, new_state):
+        for hook in self._hooks:
+            hook(endpoint, old_state, new_state)
+
+    def circuit_for(self, path):
+        """
+        :rtype : Circuit
+        """
+        endpoint = endpoint_of(path)
+        circuit = self.circuits.get(endpoint)
+        if circuit is None:
+            with self._lock:
+                circuit = self.circuits.get(endpoint)
+                if circuit is None:
+                    circuit = self.circuits[endpoint] = Circuit(
+                        endpoint, notify=self._notify, **self._options(endpoint)
+                    )
+        return circuit
+
+    def _options(self, endpoint):
+        for prefix in self._prefixes:
+            if endpoint.startswith(prefix):
+                return dict(self.circuit_options, **self.endpoints[prefix])
+        return self.circuit_options
+
+    def check(self, path):
+        """
+        :raises CircuitOpenError: if calls to `path` are rejected
+        """
+        self.circuit_for(path).check()
+
+    def call(self, path, connection_errors=()):
+        """
+        Admit a call to `path`, see Circuit.call
+        :rtype : CircuitCall
+        """
+        return self.circuit_for(path).call(connection_errors)
+
+    def state(self, path):
+        return self.circuit_for(path).state
+
+    def reset(self):
+        """
+        Close all circuits
+        """
+        for circuit in list(self.circuits.values()):
+            circuit.reset()
+
+    @property
+    def stats(self):
+        return {
+            endpoint: circuit.stats for endpoint, circuit in list(self.circuits.items())
+        }
@@ -1,6 +1,26 @@
-import json
-import requests
+import asyncio
+import contextvars
+import copy
+import time
+import weakref
+from abc import ABC, abstractmethod
 from logging import Logger
+
+from .auth import AsyncTokenCache, TokenCache
+from .codec import get_codec
+from .coalesce import AsyncSingleFlight, SingleFlight
+from .metrics import (
+    AsyncHttpxTracer,
+    Hooks,
+    RequestTrace,
+    current_trace,
+    httpx_pool_stats,
+    record_phase,
+    suspend_trace,
+)
+from .circuit import CircuitBreaker
+from .ratelimit import RateLimiter, parse_retry_after
+from .retry import RetryPolicy
 from .exceptions import (
     ImproperlyConfigured,
     APIError,
@@ -8,6 +28,11 @@ from .exceptions import (
     AuthenticationError,
 )
 
+# Last response of every client in the current thread or task, keyed by a weak reference
+# to the client. The mapping is replaced, never mutated, so tasks that copied the context
+# don't see each other's responses.
+_last_responses = contextvars.ContextVar("green_invoice_last_responses", default={})
+
 
 def default_user_agent():
     """
@@ -15,6 +40,7 @@ def default_user_agent():
     :return: string
     """
     import platform
+    import requests
     from .version import __version__
 
     library_versions = "requests {}; python {}".format(
@@ -23,13 +49,19 @@ def default_user_agent():
     return "mayple/bluesnap {} ({})".format(__version__, library_versions)
 
 
+def _text(body):
+    if isinstance(body, bytes):
+        return body.decode("utf-8", "replace")
+    return body or ""
+
+
 def format_request(req):
     return "\n".join(
         [
             "%s %s" % (req.method, req.url),
             "\n".join("%s: %s" % (k, v) for k, v in req.headers.items()),
             "",
-            req.body or "",
+            _text(getattr(req, "body", None) or getattr(req, "content", None)),
         ]
     )
 
@@ -37,7 +69,11 @@ def format_request(req):
 def format_response(res):
     return "\n".join(
         [
-            "%d %s" % (res.status_code, res.reason or ""),
+            "%d %s"
+            % (
+                res.status_code,
+                getattr(res, "reason", None) or getattr(res, "reason_phrase", ""),
+            ),
             "\n".join("%s: %s" % (k, v) for k, v in res.headers.items()),
             "",
             res.text,
@@ -45,21 +81,28 @@ def format_response(res):
     )
 
 
-class BearerAuth(requests.auth.AuthBase):
-    def __init__(self, token):
-        self.token = token
-
-    def __call__(self, r):
-        r.headers["authorization"] = "Bearer " + self.token
-        return r
-
+class BaseClient(ABC):
+    """
+    Environment, authentication and error handling shared by Client and AsyncClient
+    """
 
-class Client(object):
     ENDPOINTS = {
         "live": "https://api.greeninvoice.co.il/api",
         "sandbox": "https://sandbox.d.greeninvoice.co.il/api",
     }
 
+    # Starting points of the adaptive rate limiter per env, see `rate_limit`
+    RATE_LIMITS = {
+        "live": {"rate": 5, "burst": 10},
+        "sandbox": {"rate": 2, "burst": 4},
+    }
+
+    # Methods whose concurrent identical calls can share one response
+    COALESCED_METHODS = frozenset(["GET", "HEAD"])
+
+    token_cache_class = TokenCache
+    single_flight_class = SingleFlight
+
     def __init__(
         self,
         # Environment
@@ -69,7 +112,37 @@ class Client(object):
         api_key_secret,
         # Logger
         logger=None,
+        # Token cache
+        token_refresh_margin=60,
+        # Rate limiting
+        rate_limit=None,
+        # Retries
+        retry=True,
+        # Circuit breaking
+        circuit_breaker=None,
+        # Request coalescing
+        coalesce=False,
+        # Instrumentation
+        hooks=None,
+        metrics=None,
+        # Serialization
+        json_codec=None,
     ):
+        """
+        :param rate_limit: None to disable client side rate limiting, True for the env's
+                           RATE_LIMITS, a dictionary of RateLimiter arguments or a RateLimiter
+        :param retry: True for the default RetryPolicy, a dictionary of RetryPolicy
+                      arguments, a RetryPolicy, or None to disable retries
+        :param circuit_breaker: None to disable it, True for the default CircuitBreaker,
+                                a dictionary of CircuitBreaker arguments or a
+                                CircuitBreaker, which fails calls to unavailable endpoints
+                                fast with CircuitOpenError
+        :param coalesce: share one in-flight call between concurrent identical GET requests
+        :param hooks: callables notified of every phase of every call, see Hooks.add
+        :param metrics: MetricsRegistry collecting the calls' metrics
+        :param json_codec: JSONCodec or codec name for request and response bodies,
+                           "auto" picks the fastest installed one, see codec.get_codec
+        """
         if env not in self.ENDPOINTS:
             raise ValueError("env not in {0}".format(self.ENDPOINTS.keys()))
 
@@ -79,82 +152,191 @@ class Client(object):
 
         self.logger = logger if isinstance(logger, Logger) else None
 
-        self.last_response = None
+        self._ref = weakref.ref(self)
+
+        self.token_cache = self.token_cache_class(
+            self._fetch_token, refresh_margin=token_refresh_margin
+        )
+
+        if rate_limit is True:
+            rate_limit = self.RATE_LIMITS[env]
+        if isinstance(rate_limit, dict):
+            rate_limit = RateLimiter(**rate_limit)
+        self.rate_limiter = rate_limit
+        """:type : .ratelimit.RateLimiter"""
+
+        if retry is True:
+            retry = RetryPolicy()
+        elif isinstance(retry, dict):
+            retry = RetryPolicy(**retry)
+        self.retry_policy = retry or None
+        """:type : .retry.RetryPolicy"""
+
+        if circuit_breaker is True:
+            circuit_breaker = CircuitBreaker()
+        elif isinstance(circuit_breaker, dict):
+            circuit_breaker = CircuitBreaker(**circuit_breaker)
+        self.circuit_breaker = circuit_breaker or None
+        """:type : .circuit.CircuitBreaker"""
+
+        self.single_flight = self.single_flight_class() if coalesce else None
+
+        self.json_codec = get_codec(json_codec)
+
+        self.hooks = Hooks(hooks)
+        self.metrics = metrics
+        """:type : .metrics.MetricsRegistry"""
+        if metrics is not None:
+            self.hooks.add(metrics)
+
+    @property
+    def last_response(self):
+        """
+        :return: response of this client's last call in the current thread or task, so
+                 clients shared between threads report each thread's own call
+        """
+        return _last_responses.get().get(self._ref)
+
+    @last_response.setter
+    def last_response(self, response):
+        responses = {
+            ref: value
+            for ref, value in _last_responses.get().items()
+            # Drop the responses of clients that were garbage collected
+            if ref() is not None
+        }
+        responses[self._ref] = response
+        _last_responses.set(responses)
 
     @property
     def endpoint_url(self):
         return self.ENDPOINTS[self.env]
 
     @property
-    def http_bearer_auth(self):
-        authenticate_url = self.ENDPOINTS[self.env] + "/v1/account/token"
-        response = requests.post(
-            authenticate_url,
-            json={"id": self.api_key_id, "secret": self.api_key_secret},
-        )
-        jwt_token = response.headers.get("X-Authorization-Bearer")
-        if not response.ok or not jwt_token:
-            raise AuthenticationError()
-        return BearerAuth(jwt_token)
+    def authenticate_url(self):
+        return self.endpoint_url + "/v1/account/token"
 
-    def request(self, method, path, data=None):
+    @property
+    def token_stats(self):
         """
-        API request method
+        Token cache counters: hits, refreshes and refresh latency
+        :return: dictionary
+        """
+        return self.token_cache.stats
 
-        :param method: HTTP method
-        :param path: URL path
-        :param data: json data as dictionary
-        :return:
+    def add_hook(self, hook):
         """
-        url = self.endpoint_url + path
+        :param hook: callable as hook(event, trace, seconds), see metrics.Hooks
+        """
+        self.hooks.add(hook)
 
-        dataString = None
-        if type(data) == dict:
-            dataString = json.dumps(data)
+    def pool_stats(self):
+        """
+        :return: dictionary of connections in use and maximum pooled connections
+        """
+        return {}
 
-        headers = {"Content-Type": "application/json"}
+    def _start_trace(self, method, path):
+        if not self.hooks:
+            return None, None
+        trace = RequestTrace(method, path, self.hooks)
+        return trace, trace.activate()
 
-        # Prepare request
-        req = requests.Request(
-            method, url, headers, data=dataString, auth=self.http_bearer_auth
-        )
-        r = req.prepare()
+    def _finish_trace(self, trace, token, error=None):
+        trace.error = error
+        trace.pool = self.pool_stats()
+        RequestTrace.deactivate(token)
+        trace.finish()
 
-        if self.logger:
-            self.logger.info("GreenInvoice request:\n%s", format_request(r))
+    # noinspection PyMethodMayBeStatic
+    def _trace_response(self, response):
+        trace = current_trace()
+        if trace is not None:
+            trace.status_code = response.status_code
 
-        # Send request, returning response
-        s = requests.Session()
-        response = s.send(r)
+    # noinspection PyMethodMayBeStatic
+    def _mark_token_refresh(self):
+        trace = current_trace()
+        if trace is not None:
+            trace.token_refreshed = True
 
-        if self.logger:
-            self.logger.info(
-                "GreenInvoice response (took %s):\n%s",
-                response.elapsed,
-                format_response(response),
-            )
+    @abstractmethod
+    def _fetch_token(self):
+        """
+        Request a new token from the API, called by the token cache when it needs one
+        :return: the JWT token
+        :raises AuthenticationError: if the API didn't return one
+        """
+        pass
 
-        # Save request and response for further logging
-        self.last_response = response
+    def _authentication_data(self):
+        return {"id": self.api_key_id, "secret": self.api_key_secret}
 
-        body = self._process_response_body(response)
+    # noinspection PyMethodMayBeStatic
+    def _token_from_response(self, response):
+        jwt_token = response.headers.get("X-Authorization-Bearer")
+        if not (200 <= response.status_code < 300) or not jwt_token:
+            raise AuthenticationError()
+        return jwt_token
 
-        return response, body
+    @property
+    def coalesced_requests(self):
+        """
+        :return: number of duplicate requests that were served by another in-flight call
+        """
+        return self.single_flight.suppressed if self.single_flight else 0
+
+    def _coalesce_key(self, method, path, data, headers):
+        """
+        :return: key identifying the call for coalescing, or None if it must be sent on its own
+        """
+        if (
+            self.single_flight is None
+            or method.upper() not in self.COALESCED_METHODS
+            or data is not None
+            or headers
+        ):
+            return None
+        return method.upper(), path
+
+    def _start_retry(self, method, idempotent):
+        """
+        :return: RetryState if the call may be retried, otherwise None
+        """
+        if self.retry_policy and self.retry_policy.is_retryable(method, idempotent):
+            return self.retry_policy.start()
+        return None
+
+    # noinspection PyMethodMayBeStatic
+    def _retry_delay(self, retry, response=None):
+        """
+        :param response: response of the failed attempt, None on connection errors
+        :return: seconds to wait before retrying, or None if the call should not be retried
+        """
+        if retry is None:
+            return None
+        if response is None:
+            return retry.next_delay()
+        if response.status_code not in retry.policy.retry_statuses:
+            return None
+        return retry.next_delay(parse_retry_after(response.headers.get("Retry-After")))
+
+    def _encode_data(self, data):
+        if data is None:
+            return None
+        return self.json_codec.dumps(data)
 
     def _process_response_body(self, response):
         body = None
 
-        if response.content:  # There's content, parse it as XML
-            responseContent = response.content
-            if type(response.content) == bytes:
-                responseContent = response.content.decode("utf-8")
-
+        if response.content:  # There's content, parse it as JSON
             try:
-                body = json.loads(responseContent)
+                body = self.json_codec.loads(response.content)
             except Exception:
                 # Cannot parse body as JSON, could be a text
                 raise APIError(
-                    description=responseContent, status_code=response.status_code
+                    description=_text(response.content),
+                    status_code=response.status_code,
                 )
 
         if not (200 <= response.status_code < 300):
@@ -211,6 +393,612 @@ class Client(object):
             )
 
 
+class Client(BaseClient):
+    def __init__(
+        self,
+        # Environment
+        env,
+        # Authentication
+        api_key_id,
+        api_key_secret,
+        # Logger
+        logger=None,
+        # Token cache
+        token_refresh_margin=60,
+        # Rate limiting
+        rate_limit=None,
+        # Retries
+        retry=True,
+        # Circuit breaking
+        circuit_breaker=None,
+        # Request coalescing
+        coalesce=False,
+        # Instrumentation
+        hooks=None,
+        metrics=None,
+        # Serialization
+        json_codec=None,
+        # Transport
+        transport=None,
+        pool_connections=10,
+        pool_maxsize=10,
+        timeout=30,
+    ):
+        """
+        :param transport: Transport sending the HTTP requests, or the name of one of
+                          transport.TRANSPORTS, by default "requests".
+                          A Transport instance can be shared by several clients, it is
+                          then left open when the client is closed.
+        :param pool_connections: hosts to pool connections for, for a named transport
+        :param pool_maxsize: connections kept per host, for a named transport
+        :param timeout: seconds, None to wait forever, for a named transport
+        """
+        super().__init__(
+            env,
+            api_key_id,
+            api_key_secret,
+            logger=logger,
+            token_refresh_margin=token_refresh_margin,
+            rate_limit=rate_limit,
+            retry=retry,
+            circuit_breaker=circuit_breaker,
+            coalesce=coalesce,
+            hooks=hooks,
+            metrics=metrics,
+            json_codec=json_codec,
+        )
+
+        # Deferred, so that importing the package doesn't import requests
+        from .transport import Transport, get_transport
+
+        self.owns_transport = not isinstance(transport, Transport)
+        self.transport = get_transport(
+            transport,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            timeout=timeout,
+        )
+        """:type : .transport.Transport"""
+        self.connection_errors = self.transport.connection_errors
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Close the pooled connections of this client, unless its transport is shared
+        """
+        if self.owns_transport:
+            self.transport.close()
+
+    @property
+    def http_bearer_auth(self):
+        from .transport import BearerAuth
+
+        return BearerAuth(self.token_cache.get())
+
+    def pool_stats(self):
+        return self.transport.pool_stats()
+
+    def _fetch_token(self):
+        from .transport import Request
+
+        self._mark_token_refresh()
+        # The token call is reported as the "auth" phase as a whole
+        suspended = suspend_trace()
+        try:
+            response = self.transport.send(
+                Request(
+                    "POST",
+                    self.authenticate_url,
+                    {"Content-Type": self.json_codec.content_type},
+                    self.json_codec.dumps(self._authentication_data()),
+                )
+            )
+        finally:
+            RequestTrace.deactivate(suspended)
+        return self._token_from_response(response)
+
+    def download(
+        self, url, path, expected_size=None, expected_sha256=None, chunk_size=65536
+    ):
+        """
+        Stream a file, e.g. a document's PDF, to disk without holding it in memory.
+        A `.part` file left by an interrupted download is resumed with a Range request,
+        failed attempts are retried according to the retry policy.
+
+        :param url: file URL, such as a link of DocumentResource.get_document_download_link
+        :param path: destination file path
+        :param expected_size: size in bytes the file must have
+        :param expected_sha256: hex digest the file must have
+        :rtype : .download.DownloadResult
+        :raises DownloadError: on HTTP errors and size or checksum mismatches
+        """
+        from .download import FileDownload
+        from .transport import Request
+
+        download = FileDownload(url, path, expected_size, expected_sha256)
+        retry = self._start_retry("GET", None)
+
+        if self.logger:
+            self.logger.info("GreenInvoice download: %s -> %s", url, path)
+
+        while True:
+            try:
+                request = Request("GET", url, download.request_headers())
+                with self.transport.stream(request, chunk_size) as response:
+                    delay = self._retry_delay(retry, response)
+                    if delay is None:
+                        download.begin(response.status_code, response.headers)
+                        for chunk in response.chunks:
+                            download.write(chunk)
+                        return download.finish()
+            except self.connection_errors:
+                download.suspend()
+                if download.written:
+                    # The next attempt resumes from here, only count attempts since then
+                    retry = self._start_retry("GET", None)
+                delay = self._retry_delay(retry)
+                if delay is None:
+                    raise
+            except Exception:
+                download.suspend()
+                raise
+
+            time.sleep(delay)
+
+    def request(
+        self, method, path, data=None, headers=None, idempotent=None, before_retry=None
+    ):
+        """
+        API request method
+
+        :param method: HTTP method
+        :param path: URL path
+        :param data: json data as dictionary
+        :param headers: extra HTTP headers
+        :param idempotent: whether the call is safe to retry, by default decided by the
+                           retry policy according to the HTTP method
+        :param before_retry: called before every retry, if it returns anything but None
+                             the call stops and returns (None, <returned value>)
+        :return:
+        """
+        key = self._coalesce_key(method, path, data, headers)
+        if key is None:
+            return self._request(method, path, data, headers, idempotent, before_retry)
+
+        (response, body), shared = self.single_flight.do(
+            key,
+            lambda: self._request(
+                method, path, data, headers, idempotent, before_retry
+            ),
+        )
+        # Each caller gets its own copy of a shared body
+        return response, copy.deepcopy(body) if shared else body
+
+    def _request(self, method, path, data, headers, idempotent, before_retry):
+        trace, token = self._start_trace(method, path)
+        if trace is None:
+            return self._perform(method, path, data, headers, idempotent, before_retry)
+
+        try:
+            result = self._perform(
+                method, path, data, headers, idempotent, before_retry
+            )
+        except Exception as e:
+            self._finish_trace(trace, token, e)
+            raise
+        self._finish_trace(trace, token)
+        return result
+
+    def _perform(self, method, path, data, headers, idempotent, before_retry):
+        started = time.monotonic()
+        dataString = self._encode_data(data)
+        record_phase("serialize", time.monotonic() - started)
+
+        retry = self._start_retry(method, idempotent)
+
+        while True:
+            try:
+                response = self._send_authenticated(method, path, dataString, headers)
+            except self.connection_errors:
+                delay = self._retry_delay(retry)
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry_delay(retry, response)
+                if delay is None:
+                    break
+
+            time.sleep(delay)
+            if before_retry:
+                result = before_retry()
+                if result is not None:
+                    return None, result
+
+        # Save request and response for further logging
+        self.last_response = response
+
+        started = time.monotonic()
+        try:
+            body = self._process_response_body(response)
+        finally:
+            record_phase("parse", time.monotonic() - started)
+
+        return response, body
+
+    def _send_authenticated(self, method, path, dataString, headers):
+        if self.circuit_breaker:
+            # Fail fast before a token refresh waits on the unavailable API
+            self.circuit_breaker.check(path)
+        token = self._get_token()
+        response = self._send(method, path, dataString, token, headers)
+
+        if response.status_code == 401:
+            # Token was revoked or expired early, retry once with a fresh one
+            self.token_cache.invalidate(token)
+            response = self._send(method, path, dataString, self._get_token(), headers)
+
+        return response
+
+    def _get_token(self):
+        started = time.monotonic()
+        try:
+            return self.token_cache.get()
+        finally:
+            record_phase("auth", time.monotonic() - started)
+
+    def _send(self, method, path, dataString, token, extra_headers=None):
+        url = self.endpoint_url + path
+        headers = {
+            "Content-Type": self.json_codec.content_type,
+            "Authorization": "Bearer " + token,
+        }
+        if extra_headers:
+            headers.update(extra_headers)
+
+        from .transport import Request
+
+        r = Request(method, url, headers, dataString)
+
+        if self.logger:
+            self.logger.info("GreenInvoice request:\n%s", format_request(r))
+
+        if self.rate_limiter:
+            delay = self.rate_limiter.reserve(path)
+            if delay:
+                time.sleep(delay)
+
+        # Send request, returning response once its body was read
+        if self.circuit_breaker:
+            with self.circuit_breaker.call(path, self.connection_errors) as call:
+                response = self.transport.send(r)
+                call.status_code = response.status_code
+        else:
+            response = self.transport.send(r)
+        self._trace_response(response)
+
+        if self.rate_limiter:
+            self.rate_limiter.update(path, response.status_code, response.headers)
+
+        if self.logger:
+            self.logger.info(
+                "GreenInvoice response (took %s):\n%s",
+                response.elapsed,
+                format_response(response),
+            )
+
+        return response
+
+
+class AsyncClient(BaseClient):
+    """
+    asyncio flavour of Client, backed by a pooled httpx.AsyncClient.
+    Requires the `httpx` package (pip install green_invoice[async]).
+    """
+
+    token_cache_class = AsyncTokenCache
+    single_flight_class = AsyncSingleFlight
+
+    def __init__(
+        self,
+        # Environment
+        env,
+        # Authentication
+        api_key_id,
+        api_key_secret,
+        # Logger
+        logger=None,
+        # Token cache
+        token_refresh_margin=60,
+        # Rate limiting
+        rate_limit=None,
+        # Retries
+        retry=True,
+        # Circuit breaking
+        circuit_breaker=None,
+        # Request coalescing
+        coalesce=False,
+        # Instrumentation
+        hooks=None,
+        metrics=None,
+        # Serialization
+        json_codec=None,
+        # Connection pool
+        pool_maxsize=100,
+        pool_keepalive=20,
+        timeout=30,
+        session=None,
+    ):
+        """
+        :param session: httpx.AsyncClient to send the requests with, shared by several
+                        clients it is left open when the client is closed. By default
+                        one is created from pool_maxsize, pool_keepalive and timeout.
+        """
+        try:
+            import httpx
+        except ImportError:
+            raise ImproperlyConfigured(
+                "AsyncClient requires httpx. Please install green_invoice[async]."
+            )
+
+        super().__init__(
+            env,
+            api_key_id,
+            api_key_secret,
+            logger=logger,
+            token_refresh_margin=token_refresh_margin,
+            rate_limit=rate_limit,
+            retry=retry,
+            circuit_breaker=circuit_breaker,
+            coalesce=coalesce,
+            hooks=hooks,
+            metrics=metrics,
+            json_codec=json_codec,
+        )
+
+        self.connection_errors = (httpx.TransportError,)
+        self.pool_maxsize = pool_maxsize
+        self.owns_session = session is None
+        self.session = session or httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=pool_maxsize, max_keepalive_connections=pool_keepalive
+            ),
+            timeout=timeout,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the pooled connections of this client, unless its session is shared
+        """
+        if self.owns_session:
+            await self.session.aclose()
+
+    def pool_stats(self):
+        return httpx_pool_stats(self.session, self.pool_maxsize)
+
+    async def _fetch_token(self):
+        self._mark_token_refresh()
+        response = await self.session.post(
+            self.authenticate_url, json=self._authentication_data()
+        )
+        return self._token_from_response(response)
+
+    async def download(
+        self, url, path, expected_size=None, expected_sha256=None, chunk_size=65536
+    ):
+        """
+        Stream a file to disk, see Client.download.
+        Chunks are written to the file from the event loop.
+
+        :rtype : .download.DownloadResult
+        """
+        from .download import FileDownload
+
+        download = FileDownload(url, path, expected_size, expected_sha256)
+        retry = self._start_retry("GET", None)
+
+        if self.logger:
+            self.logger.info("GreenInvoice download: %s -> %s", url, path)
+
+        while True:
+            try:
+                async with self.session.stream(
+                    "GET", url, headers=download.request_headers()
+                ) as response:
+                    delay = self._retry_delay(retry, response)
+                    if delay is None:
+                        download.begin(response.status_code, response.headers)
+                        async for chunk in response.aiter_bytes(chunk_size):
+                            download.write(chunk)
+                        return download.finish()
+            except self.connection_errors:
+                download.suspend()
+                if download.written:
+                    # The next attempt resumes from here, only count attempts since then
+                    retry = self._start_retry("GET", None)
+                delay = self._retry_delay(retry)
+                if delay is None:
+                    raise
+            except Exception:
+                download.suspend()
+                raise
+
+            await asyncio.sleep(delay)
+
+    async def request(
+        self, method, path, data=None, headers=None, idempotent=None, before_retry=None
+    ):
+        """
+        API request method, see Client.request
+
+        :param before_retry: coroutine function called before every retry
+        """
+        key = self._coalesce_key(method, path, data, headers)
+        if key is None:
+            return await self._request(
+                method, path, data, headers, idempotent, before_retry
+            )
+
+        (response, body), shared = await self.single_flight.do(
+            key,
+            lambda: self._request(
+                method, path, data, headers, idempotent, before_retry
+            ),
+        )
+        # Each caller gets its own copy of a shared body
+        return response, copy.deepcopy(body) if shared else body
+
+    async def _request(self, method, path, data, headers, idempotent, before_retry):
+        trace, token = self._start_trace(method, path)
+        if trace is None:
+            return await self._perform(
+                method, path, data, headers, idempotent, before_retry
+            )
+
+        try:
+            result = await self._perform(
+                method, path, data, headers, idempotent, before_retry
+            )
+        except Exception as e:
+            self._finish_trace(trace, token, e)
+            raise
+        self._finish_trace(trace, token)
+        return result
+
+    async def _perform(self, method, path, data, headers, idempotent, before_retry):
+        started = time.monotonic()
+        dataString = self._encode_data(data)
+        record_phase("serialize", time.monotonic() - started)
+
+        retry = self._start_retry(method, idempotent)
+
+        while True:
+            try:
+                response = await self._send_authenticated(
+                    method, path, dataString, headers
+                )
+            except self.connection_errors:
+                delay = self._retry_delay(retry)
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry_delay(retry, response)
+                if delay is None:
+                    break
+
+            await asyncio.sleep(delay)
+            if before_retry:
+                result = await before_retry()
+                if result is not None:
+                    return None, result
+
+        # Save request and response for further logging
+        self.last_response = response
+
+        started = time.monotonic()
+        try:
+            body = self._process_response_body(response)
+        finally:
+            record_phase("parse", time.monotonic() - started)
+
+        return response, body
+
+    async def _send_authenticated(self, method, path, dataString, headers):
+        if self.circuit_breaker:
+            # Fail fast before a token refresh waits on the unavailable API
+            self.circuit_breaker.check(path)
+        token = await self._get_token()
+        response = await self._send(method, path, dataString, token, headers)
+
+        if response.status_code == 401:
+            # Token was revoked or expired early, retry once with a fresh one
+            self.token_cache.invalidate(token)
+            response = await self._send(
+                method, path, dataString, await self._get_token(), headers
+            )
+
+        return response
+
+    async def _get_token(self):
+        started = time.monotonic()
+        try:
+            return await self.token_cache.get()
+        finally:
+            record_phase("auth", time.monotonic() - started)
+
+    async def _send(self, method, path, dataString, token, extra_headers=None):
+        url = self.endpoint_url + path
+        headers = {
+            "Content-Type": self.json_codec.content_type,
+            "Authorization": "Bearer " + token,
+        }
+        if extra_headers:
+            headers.update(extra_headers)
+
+        trace = current_trace()
+        r = self.session.build_request(
+            method,
+            url,
+            headers=headers,
+            content=dataString,
+            extensions={"trace": AsyncHttpxTracer(trace)} if trace else None,
+        )
+
+        if self.logger:
+            self.logger.info("GreenInvoice request:\n%s", format_request(r))
+
+        if self.rate_limiter:
+            delay = self.rate_limiter.reserve(path)
+            if delay:
+                await asyncio.sleep(delay)
+
+        if self.circuit_breaker:
+            with self.circuit_breaker.call(path, self.connection_errors) as call:
+                response = await self._send_request(r)
+                call.status_code = response.status_code
+        else:
+            response = await self._send_request(r)
+        self._trace_response(response)
+
+        if self.rate_limiter:
+            self.rate_limiter.update(path, response.status_code, response.headers)
+
+        if self.logger:
+            self.logger.info(
+                "GreenInvoice response (took %s):\n%s",
+                response.elapsed,
+                format_response(response),
+            )
+
+        return response
+
+    async def _send_request(self, r):
+        response = await self.session.send(r, stream=True)
+        started = time.monotonic()
+        await response.aread()
+        record_phase("read", time.monotonic() - started)
+        return response
+
+
+def __getattr__(name):
+    # BearerAuth moved to transport.py, which imports requests
+    if name == "BearerAuth":
+        from .transport import BearerAuth
+
+        return BearerAuth
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
 __client__ = None
 
 
@@ -233,3 +1021,27 @@ def configure(**config):
     __client__ = Client(**config)
 
     return __client__
+
+
+__async_client__ = None
+
+
+def default_async():
+    """:rtype : AsyncClient"""
+    global __async_client__
+
+    if __async_client__ is None:
+        raise ImproperlyConfigured(
+            "GreenInvoice async client not configured yet. Please call green_invoice.client.configure_async()."
+        )
+
+    return __async_client__
+
+
+def configure_async(**config):
+    """:rtype : AsyncClient"""
+    global __async_client__
+
+    __async_client__ = AsyncClient(**config)
+
+    return __async_client__
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Runs one call per key at a time, concurrent callers of the same key wait for it
+    and share its result or error.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.suppressed = 0
+
+    def do(self, key, fn):
+        """
+        :param key: identity of the call
+        :param fn: callable performing the call
+        :return: tuple of fn's result and whether it was shared from another caller's call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.suppressed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
+
+
+class AsyncSingleFlight(object):
+    """
+    SingleFlight for coroutines running on one event loop
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.suppressed = 0
+
+    async def do(self, key, fn):
+        """
+        :param key: identity of the call
+        :param fn: coroutine function performing the call
+        :return: tuple of fn's result and whether it was shared from another caller's call
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self.suppressed += 1
+            # Shielded, so a cancelled follower doesn't cancel the leader's call
+            return await asyncio.shield(future), True
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when there are no followers
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
@@ -0,0 +1,111 @@
+import datetime
+import decimal
+import enum
+import json
+from abc import ABC, abstractmethod
+
+from .exceptions import ImproperlyConfigured
+
+
+def _default(obj):
+    """
+    Fallback encoding for values json doesn't know.
+    IntEnum and str based enums, like the ones in models.py, never get here: they are
+    encoded natively as their int or str value.
+    """
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    raise TypeError(
+        "Object of type {} is not JSON serializable".format(type(obj).__name__)
+    )
+
+
+class JSONCodec(ABC):
+    """
+    Encodes request bodies and decodes response bodies
+    """
+
+    name = None
+    content_type = "application/json"
+
+    @abstractmethod
+    def dumps(self, obj):
+        """
+        :return: bytes
+        """
+        pass
+
+    @abstractmethod
+    def loads(self, data):
+        """
+        :param data: bytes, parsed without decoding them to str first
+        """
+        pass
+
+
+class StdlibJSONCodec(JSONCodec):
+    name = "json"
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(
+            ensure_ascii=False, separators=(",", ":"), default=_default
+        )
+
+    def dumps(self, obj):
+        return self._encoder.encode(obj).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    Codec backed by orjson, which parses and serializes several times faster than json
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        try:
+            import orjson
+        except ImportError:
+            raise ImproperlyConfigured(
+                "The orjson codec requires orjson. Please install green_invoice[fast]."
+            )
+        self._orjson = orjson
+
+    def dumps(self, obj):
+        return self._orjson.dumps(obj, default=_default)
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+
+CODECS = {
+    StdlibJSONCodec.name: StdlibJSONCodec,
+    OrjsonCodec.name: OrjsonCodec,
+}
+
+
+def get_codec(codec=None):
+    """
+    :param codec: a JSONCodec, one of the CODECS names, "auto" for the fastest installed
+                  codec, or None for the stdlib json codec
+    :rtype : JSONCodec
+    """
+    if isinstance(codec, JSONCodec):
+        return codec
+    if codec is None:
+        return StdlibJSONCodec()
+    if codec == "auto":
+        try:
+            return OrjsonCodec()
+        except ImproperlyConfigured:
+            return StdlibJSONCodec()
+    if codec not in CODECS:
+        raise ValueError("json codec not in {0}".format(list(CODECS)))
+    return CODECS[codec]()
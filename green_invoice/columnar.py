@@ -0,0 +1,281 @@
+from .exceptions import ImproperlyConfigured
+from .models import Currency, DocumentStatus, DocumentType
+
+# Numeric fields of IDocumentSearchResultItem that are kept as float64 columns
+AMOUNT_FIELDS = ("amount", "vat", "amountLocal", "amountOpened")
+
+# Categorical field -> its enum, a column holds indexes into the enum's members and -1
+# for missing or unknown values
+CATEGORIES = {
+    "type": DocumentType,
+    "status": DocumentStatus,
+    "currency": Currency,
+}
+
+# Fields to group by, "month" is the month of the documentDate
+GROUP_FIELDS = tuple(CATEGORIES) + ("month",)
+
+# Group keys pack a field's code + 1 (0 when missing) in these many values, months since
+# 1970 are shifted by _MONTH_OFFSET to stay positive
+_MONTH_OFFSET = 2**32
+_RADIX = dict({field: 64 for field in CATEGORIES}, month=2**33)
+
+
+def _numpy(feature="Columnar results"):
+    """
+    :param feature: what needs numpy, for the error raised when it isn't installed
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImproperlyConfigured(
+            "{} require numpy. Please install green_invoice[numpy].".format(feature)
+        )
+    return numpy
+
+
+def _items(page):
+    """
+    :param page: an IDocumentSearchResult or a list of IDocumentSearchResultItem
+    """
+    if isinstance(page, dict):
+        return page.get("items") or []
+    return page
+
+
+def _code_table(enum_class):
+    # Members don't hash like their values, so both are keys
+    codes = {}
+    for code, member in enumerate(enum_class):
+        codes[member] = codes[member.value] = code
+    return codes
+
+
+# enum -> dictionary of member and raw value to code
+_codes = {enum_class: _code_table(enum_class) for enum_class in CATEGORIES.values()}
+
+
+class DocumentColumns(object):
+    """
+    Columnar copy of document search results: float64 arrays of the AMOUNT_FIELDS, int8
+    category codes of the CATEGORIES and the documentDate months as datetime64[M].
+    Missing amounts are NaN, missing months NaT.
+    """
+
+    def __init__(self, columns, size):
+        """
+        Use from_items or from_pages
+        :param columns: dictionary of field to array
+        """
+        self.columns = columns
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    @classmethod
+    def from_items(cls, items):
+        """
+        :param items: list of IDocumentSearchResultItem, or an IDocumentSearchResult
+        """
+        np = _numpy()
+        items = _items(items)
+        size = len(items)
+        columns = {
+            "id": np.array([item.get("id") for item in items], dtype=object),
+            "month": np.array(
+                [item.get("documentDate") or "NaT" for item in items],
+                dtype="datetime64[D]",
+            ).astype("datetime64[M]"),
+        }
+        for field in AMOUNT_FIELDS:
+            # None becomes NaN
+            columns[field] = np.array(
+                [item.get(field) for item in items], dtype=np.float64
+            )
+        for field, enum_class in CATEGORIES.items():
+            code = _codes[enum_class].get
+            columns[field] = np.array(
+                [code(item.get(field), -1) for item in items], dtype=np.int8
+            )
+        return cls(columns, size)
+
+    @classmethod
+    def from_pages(cls, pages):
+        """
+        :param pages: iterable of search results, such as search_document pages
+        """
+        return cls.concatenate([cls.from_items(page) for page in pages])
+
+    @classmethod
+    def concatenate(cls, parts):
+        np = _numpy()
+        parts = list(parts)
+        if not parts:
+            return cls.from_items([])
+        columns = {
+            field: np.concatenate([part.columns[field] for part in parts])
+            for field in parts[0].columns
+        }
+        return cls(columns, sum(part.size for part in parts))
+
+    def decode(self, field):
+        """
+        :return: list of the enum members of a categorical column, None for missing codes
+        """
+        members = list(CATEGORIES[field])
+        return [members[code] if code >= 0 else None for code in self.columns[field]]
+
+
+class DocumentAggregator(object):
+    """
+    Vectorized group-by sums of document amounts, built incrementally as pages stream in:
+
+        aggregator = DocumentAggregator(by=("currency", "month"))
+        for page in pages:
+            aggregator.add(page)
+        aggregator.rows()
+
+    Every group has a `count` and the sum of each AMOUNT_FIELDS field, missing amounts
+    count as 0.
+    """
+
+    def __init__(self, by=("currency", "type", "month"), fields=AMOUNT_FIELDS):
+        """
+        :param by: GROUP_FIELDS to group by, an empty tuple for grand totals
+        :param fields: AMOUNT_FIELDS to sum
+        """
+        unknown = (set(by) - set(GROUP_FIELDS)) | (set(fields) - set(AMOUNT_FIELDS))
+        if unknown:
+            raise ValueError("Unknown fields: {}".format(", ".join(sorted(unknown))))
+        self._np = _numpy()
+        self.by = tuple(by)
+        self.fields = tuple(fields)
+        # packed group key -> array of the count and the sums of fields
+        self._groups = {}
+
+    def add(self, page):
+        """
+        :param page: DocumentColumns, an IDocumentSearchResult or a list of its items
+        :return: self
+        """
+        np = self._np
+        if not isinstance(page, DocumentColumns):
+            page = DocumentColumns.from_items(page)
+        if not page.size:
+            return self
+
+        # One int64 key per document, the `by` fields packed in mixed radix
+        keys = np.zeros(page.size, dtype=np.int64)
+        for field in self.by:
+            keys = keys * _RADIX[field] + self._key_part(page, field)
+        unique, inverse = np.unique(keys, return_inverse=True)
+
+        groups = len(unique)
+        sums = np.empty((groups, len(self.fields) + 1))
+        sums[:, 0] = np.bincount(inverse, minlength=groups)
+        for index, field in enumerate(self.fields, 1):
+            sums[:, index] = np.bincount(
+                inverse, weights=np.nan_to_num(page[field]), minlength=groups
+            )
+
+        # Only the distinct groups of the page are merged in Python
+        for key, row in zip(unique.tolist(), sums):
+            total = self._groups.get(key)
+            if total is None:
+                self._groups[key] = row
+            else:
+                total += row
+        return self
+
+    def add_pages(self, pages):
+        for page in pages:
+            self.add(page)
+        return self
+
+    def _key_part(self, page, field):
+        np = self._np
+        if field == "month":
+            months = page["month"]
+            # 0 for NaT
+            return np.where(np.isnat(months), 0, months.view(np.int64) + _MONTH_OFFSET)
+        return page[field].astype(np.int64) + 1
+
+    def _unpack(self, keys):
+        """
+        :param keys: int64 array of packed group keys
+        :return: dictionary of `by` field to codes, months as datetime64[M]
+        """
+        np = self._np
+        codes = {}
+        for field in reversed(self.by):
+            keys, part = np.divmod(keys, _RADIX[field])
+            if field == "month":
+                months = (part - _MONTH_OFFSET).astype("datetime64[M]")
+                months[part == 0] = np.datetime64("NaT")
+                codes[field] = months
+            else:
+                codes[field] = (part - 1).astype(np.int8)
+        return {field: codes[field] for field in self.by}
+
+    def rows(self):
+        """
+        :return: list of group dictionaries, the `by` fields decoded to enum members and
+                 "YYYY-MM" months, then `count` and the sums, sorted by group
+        """
+        arrays = self.to_arrays()
+        columns = []
+        for field in self.by:
+            if field == "month":
+                columns.append(
+                    [None if self._np.isnat(m) else str(m) for m in arrays[field]]
+                )
+            else:
+                members = list(CATEGORIES[field])
+                columns.append(
+                    [members[code] if code >= 0 else None for code in arrays[field]]
+                )
+        columns.append(arrays["count"].tolist())
+        columns.extend(arrays[field].tolist() for field in self.fields)
+        names = self.by + ("count",) + self.fields
+        return [dict(zip(names, values)) for values in zip(*columns)]
+
+    def to_arrays(self):
+        """
+        :return: dictionary of arrays, the `by` fields as codes (months as datetime64[M]),
+                 then `count` and the sums, one element per group sorted by group
+        """
+        np = self._np
+        keys = sorted(self._groups)
+        sums = np.array([self._groups[key] for key in keys]).reshape(
+            len(keys), len(self.fields) + 1
+        )
+        arrays = self._unpack(np.array(keys, dtype=np.int64))
+        arrays["count"] = sums[:, 0].astype(np.int64)
+        for index, field in enumerate(self.fields, 1):
+            arrays[field] = sums[:, index]
+        return arrays
+
+
+def totals(pages, by=("currency",)):
+    """
+    :return: document counts and amount, VAT, local amount and open amount sums per group
+    """
+    return DocumentAggregator(by=by).add_pages(pages).rows()
+
+
+def vat_breakdown(pages, by=("currency", "month")):
+    """
+    :return: amount and VAT sums per currency and month
+    """
+    return DocumentAggregator(by=by, fields=("amount", "vat")).add_pages(pages).rows()
+
+
+def open_balances(pages, by=("currency",)):
+    """
+    :return: open amount sums per currency
+    """
+    return DocumentAggregator(by=by, fields=("amountOpened",)).add_pages(pages).rows()
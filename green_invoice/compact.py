@@ -0,0 +1,189 @@
+import enum
+import typing
+
+from . import models
+from .codec import get_codec
+
+_codec = None
+
+
+def _json():
+    # Nested values are stored as JSON, any codec reads what another wrote
+    global _codec
+    if _codec is None:
+        _codec = get_codec("auto")
+    return _codec
+
+
+def _encode(value):
+    # A copy, as orjson's bytes keep their whole initial buffer of about 1 KiB
+    return bytes(memoryview(_json().dumps(value)))
+
+
+def _is_enum(hint):
+    return isinstance(hint, type) and issubclass(hint, enum.Enum)
+
+
+def _is_nested(hint):
+    if isinstance(hint, type):
+        # TypedDict classes are dict subclasses
+        return issubclass(hint, (dict, list))
+    return typing.get_origin(hint) in (list, dict)
+
+
+class CompactModel(object):
+    """
+    Base of the compact result models, see compact_class.
+    Fields the API didn't return read as None, enum fields read as enum members (raw
+    values the enum doesn't know are kept as they are), and nested dictionaries and
+    lists are kept encoded until first read.
+    """
+
+    __slots__ = ("_extra",)
+
+    # Set by compact_class
+    typed_dict = None
+    fields = ()
+    # field -> dictionary of raw value to enum member
+    enums = {}
+    nested = frozenset()
+
+    def __init__(self, item):
+        """
+        :param item: result item dictionary as returned by the API
+        """
+        enums = self.enums
+        nested = self.nested
+        extra = None
+        for field, value in item.items():
+            if field not in self.fields:
+                if extra is None:
+                    extra = {}
+                extra[field] = value
+            elif value is None:
+                continue
+            elif field in nested:
+                setattr(self, "_" + field, _encode(value))
+            elif field in enums:
+                setattr(self, field, enums[field].get(value, value))
+            else:
+                setattr(self, field, value)
+        if extra is not None:
+            self._extra = extra
+
+    def __getattr__(self, name):
+        # Only reached for fields the API didn't return
+        if name in self.fields:
+            return None
+        raise AttributeError("{} has no field {}".format(type(self).__name__, name))
+
+    # TypedDict compatible read access, so code written against the dictionaries works
+
+    def __getitem__(self, field):
+        value = self.get(field, _missing)
+        if value is _missing:
+            raise KeyError(field)
+        return value
+
+    def __contains__(self, field):
+        return self.get(field, _missing) is not _missing
+
+    def get(self, field, default=None):
+        if field in self.fields:
+            slot = "_" + field if field in self.nested else field
+            try:
+                object.__getattribute__(self, slot)
+            except AttributeError:
+                return default
+            return getattr(self, field)
+        extra = getattr(self, "_extra", None)
+        return extra.get(field, default) if extra else default
+
+    def to_dict(self):
+        """
+        :return: the item as the API returned it, a dictionary of the TypedDict
+        """
+        result = {}
+        for field in self.fields:
+            value = self.get(field, _missing)
+            if value is _missing:
+                continue
+            if field in self.enums and isinstance(value, enum.Enum):
+                value = value.value
+            result[field] = value
+        extra = getattr(self, "_extra", None)
+        if extra:
+            result.update(extra)
+        return result
+
+    def __eq__(self, other):
+        if isinstance(other, CompactModel):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "<{} {}>".format(type(self).__name__, self.get("id"))
+
+
+_missing = object()
+
+
+def _nested_property(field):
+    slot = "_" + field
+
+    def get(self):
+        value = getattr(self, slot)
+        if isinstance(value, bytes):
+            value = _json().loads(value)
+            setattr(self, slot, value)
+        return value
+
+    def set(self, value):
+        setattr(self, slot, value)
+
+    return property(get, set)
+
+
+def compact_class(name, typed_dict):
+    """
+    Build a CompactModel with a slot for every field of a TypedDict
+    :param typed_dict: TypedDict of models.py whose annotations define the fields
+    """
+    hints = typing.get_type_hints(typed_dict)
+    enums = {
+        field: {member.value: member for member in hint}
+        for field, hint in hints.items()
+        if _is_enum(hint)
+    }
+    nested = frozenset(field for field, hint in hints.items() if _is_nested(hint))
+    namespace = {
+        "__slots__": tuple(
+            "_" + field if field in nested else field for field in hints
+        ),
+        "typed_dict": typed_dict,
+        "fields": frozenset(hints),
+        "enums": enums,
+        "nested": nested,
+    }
+    for field in nested:
+        namespace[field] = _nested_property(field)
+    return type(name, (CompactModel,), namespace)
+
+
+CompactDocument = compact_class("CompactDocument", models.IDocumentSearchResultItem)
+CompactClient = compact_class("CompactClient", models.IClientSearchResultItem)
+
+
+def compact_result(result, model):
+    """
+    :param result: search result dictionary as returned by the API
+    :param model: CompactModel class of its items
+    :return: the result with its items as `model` instances
+    """
+    if not result or not result.get("items"):
+        return result
+    return dict(result, items=[model(item) for item in result["items"]])
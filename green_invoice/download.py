@@ -0,0 +1,260 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import time
+
+from .exceptions import DownloadError
+
+# Partial downloads are kept next to their destination under this suffix until complete
+PART_SUFFIX = ".part"
+
+CHUNK_SIZE = 64 * 1024
+
+_content_range = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+_digest_sha256 = re.compile(r"(?:^|,)\s*sha-256=:?([A-Za-z0-9+/=]+):?", re.IGNORECASE)
+
+
+def document_file_path(dest, document_id):
+    """
+    :param dest: file path, or a directory to download into as <document_id>.pdf, either
+                 existing or ending with a separator, in which case it is created
+    """
+    if dest.endswith((os.sep, os.altsep or os.sep)):
+        os.makedirs(dest, exist_ok=True)
+    if os.path.isdir(dest):
+        return os.path.join(dest, "{}.pdf".format(document_id))
+    return dest
+
+
+class DownloadResult(object):
+    def __init__(self, url, path, size, sha256, seconds, resumed_from=0, attempts=1):
+        self.url = url
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.seconds = seconds
+        # Bytes of a previous partial download that were kept
+        self.resumed_from = resumed_from
+        self.attempts = attempts
+        self.document_id = None
+
+    def __repr__(self):
+        return "<DownloadResult {} {} bytes>".format(self.path, self.size)
+
+
+class DownloadReport(object):
+    """
+    Outcome of a batch of downloads with aggregate throughput
+    """
+
+    def __init__(self, results, errors, seconds):
+        """
+        :param results: dictionary of document id to DownloadResult
+        :param errors: dictionary of document id to the exception that failed its download
+        :param seconds: wall clock duration of the batch
+        """
+        self.results = results
+        self.errors = errors
+        self.seconds = seconds
+
+    @property
+    def bytes(self):
+        """
+        :return: bytes transferred, not counting resumed parts that were already on disk
+        """
+        return sum(r.size - r.resumed_from for r in self.results.values())
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    @property
+    def documents_per_second(self):
+        return len(self.results) / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (
+            "{} downloaded, {} failed, {:.1f} MiB in {:.2f}s "
+            "({:.2f} MiB/s, {:.1f} documents/s)"
+        ).format(
+            len(self.results),
+            len(self.errors),
+            self.bytes / 2**20,
+            self.seconds,
+            self.bytes_per_second / 2**20,
+            self.documents_per_second,
+        )
+
+
+class FileDownload(object):
+    """
+    Streams one file to disk through a `.part` file, resuming a previous partial download
+    with a Range request, and verifies its size and checksum before moving it in place.
+    Driven by Client.download and AsyncClient.download:
+    request_headers() -> begin(status, headers) -> write(chunk)... -> finish()
+    """
+
+    def __init__(self, url, path, expected_size=None, expected_sha256=None):
+        """
+        :param expected_size: size in bytes the file must have
+        :param expected_sha256: hex digest the file must have
+        """
+        self.url = url
+        self.path = path
+        self.part_path = path + PART_SUFFIX
+        self.expected_size = expected_size
+        self.expected_sha256 = expected_sha256.lower() if expected_sha256 else None
+        self.started = time.monotonic()
+        self.attempts = 0
+        self.resumed_from = 0
+        # Bytes written by the current attempt
+        self.written = 0
+        self._offset = 0
+        self._file = None
+        self._hash = None
+        self._total = None
+        self._digest = None
+
+    def request_headers(self):
+        """
+        Start an attempt
+        :return: headers of the request, asking for the rest of a partial download
+        """
+        self.attempts += 1
+        self.written = 0
+        self._offset = (
+            os.path.getsize(self.part_path) if os.path.exists(self.part_path) else 0
+        )
+        # Sizes and ranges are only meaningful for the unencoded file
+        headers = {"Accept-Encoding": "identity"}
+        if self._offset:
+            headers["Range"] = "bytes={}-".format(self._offset)
+        return headers
+
+    def begin(self, status_code, headers):
+        """
+        :param headers: response headers, a case insensitive mapping
+        :raises DownloadError: when the response isn't the file or the requested part of it
+        """
+        if status_code == 416 and self._offset:
+            # The part may already hold the whole file
+            total = self._parse_total(headers.get("Content-Range"))
+            if total is not None and total == self._offset:
+                self._open(self._offset, total, headers, resume=True)
+                return
+            self._discard()
+            raise DownloadError(
+                description="Partial download of {} is invalid".format(self.url),
+                status_code=status_code,
+            )
+
+        if status_code == 206 and self._offset:
+            match = _content_range.match(headers.get("Content-Range") or "")
+            if not match or int(match.group(1)) != self._offset:
+                raise DownloadError(
+                    description="Unexpected range {} for {}".format(
+                        headers.get("Content-Range"), self.url
+                    ),
+                    status_code=status_code,
+                )
+            total = None if match.group(3) == "*" else int(match.group(3))
+            self._open(self._offset, total, headers, resume=True)
+            return
+
+        if status_code == 200:
+            # Full content, the server ignored or doesn't support ranges
+            length = headers.get("Content-Length")
+            self._open(0, int(length) if length else None, headers, resume=False)
+            return
+
+        raise DownloadError(
+            description="Could not download {}".format(self.url),
+            status_code=status_code,
+        )
+
+    @staticmethod
+    def _parse_total(content_range):
+        match = re.match(r"^bytes \*/(\d+)$", content_range or "")
+        return int(match.group(1)) if match else None
+
+    def _open(self, offset, total, headers, resume):
+        self._hash = hashlib.sha256()
+        if resume:
+            # Hash the part already on disk, so the checksum covers the whole file
+            with open(self.part_path, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    self._hash.update(chunk)
+            self.resumed_from = offset
+        else:
+            self.resumed_from = 0
+        self._total = total
+        self._digest = headers.get("Digest") or headers.get("Repr-Digest")
+        self._file = open(self.part_path, "ab" if resume else "wb")
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.written += len(chunk)
+
+    def suspend(self):
+        """
+        End a failed attempt, keeping what was written for the next one to resume from
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _discard(self):
+        self.suspend()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+    def finish(self):
+        """
+        Verify the downloaded file and move it to its destination
+        :rtype : DownloadResult
+        :raises DownloadError: on a size or checksum mismatch, the partial file is removed
+        """
+        self._file.flush()
+        size = self._file.tell()
+        self.suspend()
+        sha256 = self._hash.hexdigest()
+
+        for expected, actual, what in (
+            (self._total, size, "size"),
+            (self.expected_size, size, "size"),
+            (self._digest_sha256(), sha256, "checksum"),
+            (self.expected_sha256, sha256, "checksum"),
+        ):
+            if expected is not None and expected != actual:
+                self._discard()
+                raise DownloadError(
+                    description="Downloaded file {} has {} {}, expected {}".format(
+                        self.url, what, actual, expected
+                    )
+                )
+
+        os.replace(self.part_path, self.path)
+        return DownloadResult(
+            self.url,
+            self.path,
+            size,
+            sha256,
+            time.monotonic() - self.started,
+            resumed_from=self.resumed_from,
+            attempts=self.attempts,
+        )
+
+    def _digest_sha256(self):
+        """
+        :return: hex sha256 advertised by the server in a Digest or Repr-Digest header
+        """
+        match = _digest_sha256.search(self._digest or "")
+        if not match:
+            return None
+        try:
+            return binascii.hexlify(base64.b64decode(match.group(1))).decode("ascii")
+        except (binascii.Error, ValueError):
+            return None
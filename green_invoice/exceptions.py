@@ -54,6 +54,10 @@ class APIError(Exception):
         return outputString
 
 
+class DownloadError(APIError):
+    pass
+
+
 class CardError(Exception):
     simple_description_matcher = re.compile(
         "Order creation could not be completed because of payment processing failure: (\w+) - (.*)"
@@ -93,4 +97,35 @@ class ImproperlyConfigured(Exception):
 
 
 class ValidationError(Exception):
-    pass
+    """
+    A draft was rejected before it was sent, see validation.py
+    """
+
+    def __init__(self, errors):
+        """
+        :param errors: list of error messages, or a single message
+        """
+        self.errors = errors if isinstance(errors, list) else [errors]
+        super(ValidationError, self).__init__(self.errors)
+
+    def __str__(self):
+        return "; ".join(str(error) for error in self.errors)
+
+
+class CircuitOpenError(APIError):
+    """
+    A call was rejected without being sent, as its endpoint's circuit is open, see
+    circuit.py
+    """
+
+    def __init__(self, endpoint, retry_after=None):
+        """
+        :param endpoint: endpoint of the rejected call
+        :param retry_after: seconds until the circuit lets calls through again
+        """
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        description = "Circuit open for {}".format(endpoint)
+        if retry_after:
+            description += ", calls are rejected for {:.1f}s".format(retry_after)
+        super(CircuitOpenError, self).__init__(description=description)
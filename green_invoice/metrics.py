@@ -0,0 +1,339 @@
+import bisect
+import contextvars
+import re
+import threading
+import time
+
+# Phases of an API call, in the order they happen
+PHASES = ("auth", "serialize", "connect", "send", "ttfb", "read", "parse")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current_trace = contextvars.ContextVar("green_invoice_trace", default=None)
+
+_id_segment = re.compile(r"^(?=.*\d)(?!v\d+$)[\w-]+$")
+
+
+def endpoint_of(path):
+    """
+    Collapse entity ids out of a path, e.g. /v1/clients/123/assoc -> /v1/clients/{id}/assoc
+    """
+    return "/".join(
+        "{id}" if _id_segment.match(segment) else segment
+        for segment in path.split("?", 1)[0].split("/")
+    )
+
+
+class RequestTrace(object):
+    """
+    Timings of one API call. Every completed phase is reported to the hooks as
+    hook(phase, trace, seconds), and the end of the call as hook("request", trace, seconds).
+    """
+
+    def __init__(self, method, path, hooks):
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint_of(path)
+        self.hooks = hooks
+        self.phases = {}
+        self.status_code = None
+        self.error = None
+        self.token_refreshed = False
+        self.pool = None
+        self.started = time.monotonic()
+        self.duration = None
+
+    def record(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        self.hooks.emit(phase, self, seconds)
+
+    def finish(self):
+        self.duration = time.monotonic() - self.started
+        self.hooks.emit("request", self, self.duration)
+
+    def activate(self):
+        """
+        Make this the trace of the current thread or task, so that phases measured deep
+        inside the HTTP stack (see `record_phase`) are attributed to it
+        :return: token for `deactivate`
+        """
+        return _current_trace.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current_trace.reset(token)
+
+
+def current_trace():
+    """
+    :return: RequestTrace of the API call in progress in this thread or task, if traced
+    """
+    return _current_trace.get()
+
+
+def suspend_trace():
+    """
+    Stop attributing phases to the current trace, e.g. while fetching a token
+    :return: token for `RequestTrace.deactivate`
+    """
+    return _current_trace.set(None)
+
+
+def record_phase(phase, seconds):
+    """
+    Attribute a phase duration to the API call in progress, if it is being traced
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(phase, seconds)
+
+
+class HttpxTracer(object):
+    """
+    httpx `trace` extension reporting connect, send and time to first byte to a RequestTrace
+    """
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.mark = time.monotonic()
+
+    def __call__(self, event_name, info):
+        now = time.monotonic()
+        if event_name.endswith("send_request_headers.started"):
+            # Everything until now was spent acquiring and opening a connection
+            self.trace.record("connect", now - self.mark)
+            self.mark = now
+        elif event_name.endswith("send_request_body.complete"):
+            self.trace.record("send", now - self.mark)
+        elif event_name.endswith("receive_response_headers.started"):
+            self.mark = now
+        elif event_name.endswith("receive_response_headers.complete"):
+            self.trace.record("ttfb", now - self.mark)
+
+
+class AsyncHttpxTracer(HttpxTracer):
+    async def __call__(self, event_name, info):
+        super().__call__(event_name, info)
+
+
+def httpx_pool_stats(client, maxsize):
+    """
+    :param client: httpx.Client or httpx.AsyncClient
+    :param maxsize: maximum pooled connections the client was configured with
+    :return: dictionary of connections in use and maximum pooled connections, empty when
+             the pool can't be inspected
+    """
+    # httpx doesn't expose its pool publicly, report what httpcore gives us if we can
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return {}
+    return {
+        "in_use": sum(1 for c in connections if not c.is_idle()),
+        "max": maxsize,
+    }
+
+
+class Hooks(object):
+    """
+    Callbacks notified of the phases of every API call
+    """
+
+    def __init__(self, hooks=None):
+        self._hooks = list(hooks or [])
+
+    def add(self, hook):
+        """
+        :param hook: callable as hook(event, trace, seconds), where event is one of
+                     PHASES or "request" once the call is over
+        """
+        self._hooks.append(hook)
+
+    def remove(self, hook):
+        self._hooks.remove(hook)
+
+    def emit(self, event, trace, seconds):
+        for hook in self._hooks:
+            hook(event, trace, seconds)
+
+    def __bool__(self):
+        return bool(self._hooks)
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return (
+        "{"
+        + ",".join(
+            '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+            for k, v in labels
+        )
+        + "}"
+    )
+
+
+class MetricsRegistry(object):
+    """
+    Hook collecting per endpoint latency histograms, error counts by status code,
+    connection pool utilization and token refreshes.
+    `expose()` renders them in the Prometheus text exposition format.
+    """
+
+    prefix = "green_invoice_"
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}  # name -> {labels: value}
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+
+    def __call__(self, event, trace, seconds):
+        if event == "request":
+            self._observe_request(trace, seconds)
+            return
+
+        if event == "auth" and trace.token_refreshed:
+            self.inc("token_refreshes_total", help="Bearer token refreshes")
+            self.observe(
+                "token_refresh_seconds", seconds, help="Bearer token refresh latency"
+            )
+        self.observe(
+            "request_phase_seconds",
+            seconds,
+            help="Duration of each phase of API calls",
+            phase=event,
+            endpoint=trace.endpoint,
+        )
+
+    def _observe_request(self, trace, seconds):
+        status = trace.status_code if trace.status_code is not None else "error"
+        self.observe(
+            "request_duration_seconds",
+            seconds,
+            help="API call latency",
+            method=trace.method,
+            endpoint=trace.endpoint,
+        )
+        self.inc(
+            "requests_total",
+            help="API calls",
+            method=trace.method,
+            endpoint=trace.endpoint,
+            status=status,
+        )
+        if trace.error is not None or not (200 <= (trace.status_code or 0) < 300):
+            self.inc(
+                "request_errors_total",
+                help="Failed API calls by status code",
+                endpoint=trace.endpoint,
+                status=status,
+            )
+        if trace.pool:
+            for name, value in trace.pool.items():
+                self.set(
+                    "pool_connections_" + name,
+                    value,
+                    help="Connection pool utilization",
+                )
+
+    def inc(self, name, value=1, help=None, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._metric(self._counters, name, help)
+            values[key] = values.get(key, 0) + value
+
+    def set(self, name, value, help=None, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._metric(self._gauges, name, help)[key] = value
+
+    def observe(self, name, value, help=None, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._metric(self._histograms, name, help)
+            histogram = values.get(key)
+            if histogram is None:
+                histogram = values[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def _metric(self, kind, name, help):
+        name = self.prefix + name
+        if help and name not in self._help:
+            self._help[name] = help
+        return kind.setdefault(name, {})
+
+    def get(self, name, **labels):
+        """
+        :return: value of a counter or gauge, or the Histogram of a histogram, None if unknown
+        """
+        name = self.prefix + name
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            for kind in (self._counters, self._gauges, self._histograms):
+                if name in kind:
+                    return kind[name].get(key)
+        return None
+
+    def expose(self):
+        """
+        :return: all metrics in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            for kind, type_name in (
+                (self._counters, "counter"),
+                (self._gauges, "gauge"),
+            ):
+                for name, values in sorted(kind.items()):
+                    self._header(lines, name, type_name)
+                    for labels, value in sorted(values.items()):
+                        lines.append(
+                            "{}{} {}".format(name, _format_labels(labels), value)
+                        )
+
+            for name, values in sorted(self._histograms.items()):
+                self._header(lines, name, "histogram")
+                for labels, histogram in sorted(values.items()):
+                    cumulative = 0
+                    for bound, count in zip(
+                        self.buckets + (float("inf"),), histogram.counts
+                    ):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(
+                            "{}_bucket{} {}".format(
+                                name, _format_labels(labels + (("le", le),)), cumulative
+                            )
+                        )
+                    lines.append(
+                        "{}_sum{} {}".format(
+                            name, _format_labels(labels), histogram.sum
+                        )
+                    )
+                    lines.append(
+                        "{}_count{} {}".format(
+                            name, _format_labels(labels), histogram.count
+                        )
+                    )
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines, name, type_name):
+        if name in self._help:
+            lines.append("# HELP {} {}".format(name, self._help[name]))
+        lines.append("# TYPE {} {}".format(name, type_name))
@@ -0,0 +1,367 @@
+import json
+import sqlite3
+import threading
+import time
+
+from .codec import get_codec
+
+# Bumped whenever _MIGRATIONS gets a new step
+SCHEMA_VERSION = 2
+
+
+def _backfill_documents(mirror):
+    # Fill the columns and payments added by version 2 from the stored documents
+    documents = [
+        (document_id, mirror.json_codec.loads(data))
+        for document_id, data in mirror._db.execute("SELECT id, data FROM documents")
+    ]
+    rows = [_document_row(item) for _, item in documents]
+    mirror._db.executemany(
+        "UPDATE documents SET number = ?, client_name = ?, description = ? "
+        "WHERE id = ?",
+        [(r["number"], r["client_name"], r["description"], r["id"]) for r in rows],
+    )
+    _write_payments(mirror._db, documents)
+
+
+# Schema changes, the one at index i upgrades a database from version i to i + 1.
+# Steps are SQL statements or functions of the Mirror.
+_MIGRATIONS = [
+    [
+        """
+        CREATE TABLE documents (
+            id TEXT PRIMARY KEY,
+            document_date TEXT,
+            creation_date INTEGER,
+            client_id TEXT,
+            type INTEGER,
+            status INTEGER,
+            currency TEXT,
+            amount REAL,
+            amount_opened REAL,
+            data BLOB NOT NULL,
+            synced_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE clients (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            active INTEGER,
+            creation_date INTEGER,
+            last_update_date INTEGER,
+            data BLOB NOT NULL,
+            synced_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE sync_state (
+            entity TEXT PRIMARY KEY,
+            high_water INTEGER,
+            run TEXT,
+            last_synced_at REAL
+        )
+        """,
+    ],
+    [
+        "ALTER TABLE documents ADD COLUMN number TEXT",
+        "ALTER TABLE documents ADD COLUMN client_name TEXT",
+        "ALTER TABLE documents ADD COLUMN description TEXT",
+        """
+        CREATE TABLE document_payments (
+            document_id TEXT NOT NULL,
+            type INTEGER
+        )
+        """,
+        _backfill_documents,
+        # Sort orders of the document search, with the id as tie breaker
+        "CREATE INDEX documents_document_date ON documents (document_date, id)",
+        "CREATE INDEX documents_creation_date ON documents (creation_date, id)",
+        "CREATE INDEX documents_client_id ON documents (client_id, document_date)",
+        "CREATE INDEX documents_status ON documents (status)",
+        "CREATE INDEX documents_type ON documents (type)",
+        "CREATE INDEX documents_currency ON documents (currency)",
+        "CREATE INDEX documents_number ON documents (number)",
+        "CREATE INDEX document_payments_document_id ON document_payments (document_id)",
+        "CREATE INDEX document_payments_type ON document_payments (type, document_id)",
+    ],
+]
+
+
+def _document_row(item):
+    client = item.get("client") or {}
+    return {
+        "id": item["id"],
+        "number": None if item.get("number") is None else str(item["number"]),
+        "description": item.get("description"),
+        "document_date": item.get("documentDate"),
+        "creation_date": item.get("creationDate"),
+        "client_id": client.get("id"),
+        "client_name": client.get("name"),
+        "type": item.get("type"),
+        "status": item.get("status"),
+        "currency": item.get("currency"),
+        "amount": item.get("amount"),
+        "amount_opened": item.get("amountOpened"),
+    }
+
+
+def _write_payments(db, documents):
+    """
+    Replace the payment types indexed for documents
+    :param documents: pairs of document id and document dictionary
+    """
+    ids = [document_id for document_id, _ in documents]
+    for start in range(0, len(ids), 500):
+        chunk = ids[start : start + 500]
+        db.execute(
+            "DELETE FROM document_payments WHERE document_id IN ({})".format(
+                ",".join("?" * len(chunk))
+            ),
+            chunk,
+        )
+    db.executemany(
+        "INSERT INTO document_payments (document_id, type) VALUES (?, ?)",
+        [
+            (document_id, payment_type)
+            for document_id, item in documents
+            # One row per distinct type is enough to filter by it
+            for payment_type in sorted(
+                {p.get("type") for p in item.get("payment") or []} - {None}
+            )
+        ],
+    )
+
+
+def _client_row(item):
+    active = item.get("active")
+    return {
+        "id": item["id"],
+        "name": item.get("name"),
+        "active": None if active is None else int(active),
+        "creation_date": item.get("creationDate"),
+        "last_update_date": item.get("lastUpdateDate"),
+    }
+
+
+class Mirror(object):
+    """
+    Local SQLite copy of an account's documents and clients, kept up to date by
+    sync.SyncEngine. Entities are stored whole as JSON, with the fields used for filtering
+    copied to columns.
+    """
+
+    # entity -> (table, row function, high water mark column)
+    ENTITIES = {
+        "documents": ("documents", _document_row, "creation_date"),
+        "clients": ("clients", _client_row, "last_update_date"),
+    }
+
+    def __init__(self, path=":memory:", json_codec=None):
+        """
+        :param path: SQLite database file, created if missing
+        :param json_codec: JSONCodec or codec name for the stored entities
+        """
+        self.path = path
+        self.json_codec = get_codec(json_codec)
+        self._lock = threading.RLock()
+        self._depth = 0
+        # Transactions are managed explicitly, see `transaction`
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _migrate(self):
+        with self.transaction():
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            for steps in _MIGRATIONS[version:]:
+                for step in steps:
+                    if callable(step):
+                        step(self)
+                    else:
+                        self._db.execute(step)
+            self._db.execute("PRAGMA user_version = {:d}".format(SCHEMA_VERSION))
+
+    def transaction(self):
+        """
+        :return: context manager running its block in one transaction, nested ones join it
+        """
+        return _Transaction(self)
+
+    def execute(self, sql, parameters=()):
+        """
+        :return: all rows of a query
+        """
+        with self._lock:
+            return self._db.execute(sql, parameters).fetchall()
+
+    # Entities
+
+    def upsert(self, entity, items):
+        """
+        Insert new and update changed entities, unchanged ones aren't written
+        :param entity: one of ENTITIES
+        :param items: entity dictionaries as returned by the API
+        :return: tuple of the number of inserted and updated entities
+        """
+        table, row_function, _ = self.ENTITIES[entity]
+        items = list(items)
+        rows = []
+        for item in items:
+            row = row_function(item)
+            row["data"] = self.json_codec.dumps(item)
+            rows.append(row)
+        if not rows:
+            return 0, 0
+
+        with self.transaction():
+            existing = self._existing_data(table, [row["id"] for row in rows])
+            changed = [
+                index
+                for index, row in enumerate(rows)
+                if existing.get(row["id"]) != row["data"]
+            ]
+            if changed:
+                self._write_rows(table, [rows[i] for i in changed], time.time())
+                if entity == "documents":
+                    _write_payments(
+                        self._db, [(rows[i]["id"], items[i]) for i in changed]
+                    )
+        changed = [rows[i] for i in changed]
+        inserted = sum(1 for row in changed if row["id"] not in existing)
+        return inserted, len(changed) - inserted
+
+    def _existing_data(self, table, ids):
+        existing = {}
+        # Stay well within SQLite's limit of bound parameters
+        for start in range(0, len(ids), 500):
+            chunk = ids[start : start + 500]
+            existing.update(
+                self._db.execute(
+                    "SELECT id, data FROM {} WHERE id IN ({})".format(
+                        table, ",".join("?" * len(chunk))
+                    ),
+                    chunk,
+                ).fetchall()
+            )
+        return existing
+
+    def _write_rows(self, table, rows, synced_at):
+        columns = list(rows[0]) + ["synced_at"]
+        self._db.executemany(
+            "INSERT INTO {table} ({columns}) VALUES ({values}) "
+            "ON CONFLICT(id) DO UPDATE SET {updates}".format(
+                table=table,
+                columns=", ".join(columns),
+                values=", ".join("?" * len(columns)),
+                updates=", ".join(
+                    "{0} = excluded.{0}".format(column)
+                    for column in columns
+                    if column != "id"
+                ),
+            ),
+            [tuple(row.values()) + (synced_at,) for row in rows],
+        )
+
+    def get(self, entity, entity_id):
+        """
+        :return: the stored entity dictionary, or None
+        """
+        table = self.ENTITIES[entity][0]
+        rows = self.execute(
+            "SELECT data FROM {} WHERE id = ?".format(table), (entity_id,)
+        )
+        return self.json_codec.loads(rows[0][0]) if rows else None
+
+    def count(self, entity):
+        table = self.ENTITIES[entity][0]
+        return self.execute("SELECT COUNT(*) FROM {}".format(table))[0][0]
+
+    def high_water(self, entity):
+        """
+        :return: newest creation (documents) or update (clients) timestamp stored, or None
+        """
+        table, _, column = self.ENTITIES[entity]
+        return self.execute("SELECT MAX({}) FROM {}".format(column, table))[0][0]
+
+    # Sync state
+
+    def get_run(self, entity):
+        """
+        :return: checkpoint of the entity's unfinished sync run, or None
+        """
+        rows = self.execute("SELECT run FROM sync_state WHERE entity = ?", (entity,))
+        return json.loads(rows[0][0]) if rows and rows[0][0] else None
+
+    def save_run(self, entity, run):
+        with self.transaction():
+            self._db.execute(
+                "INSERT INTO sync_state (entity, run) VALUES (?, ?) "
+                "ON CONFLICT(entity) DO UPDATE SET run = excluded.run",
+                (entity, json.dumps(run)),
+            )
+
+    def finish_run(self, entity):
+        """
+        Clear the entity's checkpoint and record its high water mark
+        """
+        with self.transaction():
+            self._db.execute(
+                "INSERT INTO sync_state (entity, high_water, run, last_synced_at) "
+                "VALUES (?, ?, NULL, ?) ON CONFLICT(entity) DO UPDATE SET "
+                "high_water = excluded.high_water, run = NULL, "
+                "last_synced_at = excluded.last_synced_at",
+                (entity, self.high_water(entity), time.time()),
+            )
+
+    def sync_state(self, entity):
+        """
+        :return: dictionary of the high water mark, unfinished run and last sync time
+        """
+        rows = self.execute(
+            "SELECT high_water, run, last_synced_at FROM sync_state WHERE entity = ?",
+            (entity,),
+        )
+        high_water, run, last_synced_at = rows[0] if rows else (None, None, None)
+        return {
+            "high_water": high_water,
+            "run": json.loads(run) if run else None,
+            "last_synced_at": last_synced_at,
+        }
+
+
+class _Transaction(object):
+    def __init__(self, mirror):
+        self.mirror = mirror
+
+    def __enter__(self):
+        mirror = self.mirror
+        mirror._lock.acquire()
+        if mirror._depth == 0:
+            try:
+                mirror._db.execute("BEGIN IMMEDIATE")
+            except Exception:
+                mirror._lock.release()
+                raise
+        mirror._depth += 1
+        return mirror
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        mirror = self.mirror
+        try:
+            mirror._depth -= 1
+            if mirror._depth == 0:
+                mirror._db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        finally:
+            mirror._lock.release()
@@ -1,4 +1,3 @@
-from .client import default as default_client, default_user_agent
 from typing import TypedDict, List, Literal
 import enum
 
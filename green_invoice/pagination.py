@@ -0,0 +1,359 @@
+import asyncio
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SearchCursor(object):
+    """
+    Position of a paginated search.
+    Pass it back to `iter_documents`/`iter_clients` to resume right after the last yielded item.
+    """
+
+    def __init__(self, params, page=1, offset=0, pages=None, yielded=0, done=False):
+        """
+        :param params: search params, without `page`
+        :param page: page to fetch next
+        :param offset: number of items of `page` that were already yielded
+        :param pages: total pages as last reported by the API
+        :param yielded: total items yielded so far
+        :param done: True once the last page was consumed
+        """
+        self.params = params
+        self.page = page
+        self.offset = offset
+        self.pages = pages
+        self.yielded = yielded
+        self.done = done
+
+    def to_dict(self):
+        return {
+            "params": self.params,
+            "page": self.page,
+            "offset": self.offset,
+            "pages": self.pages,
+            "yielded": self.yielded,
+            "done": self.done,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def __repr__(self):
+        return "SearchCursor(page={}, offset={}, pages={}, yielded={})".format(
+            self.page, self.offset, self.pages, self.yielded
+        )
+
+
+def _initial_cursor(params, page_size, cursor):
+    if cursor is not None:
+        return cursor
+
+    params = dict(params or {})
+    page = params.pop("page", 1)
+    if page_size is not None:
+        params["pageSize"] = page_size
+    return SearchCursor(params, page=page)
+
+
+def _page_items(cursor, result):
+    """
+    Record a fetched page on the cursor
+    :return: tuple of the items not yielded yet and whether the page was empty
+    """
+    result = result or {}
+    cursor.pages = result.get("pages")
+    items = result.get("items") or []
+    return items[cursor.offset :], not items
+
+
+def _pages_to_prefetch(cursor, result, pending, window, remaining):
+    """
+    :param remaining: items still wanted by max_items, or None
+    :return: page numbers to schedule so that `window` pages ahead of the cursor are in flight
+    """
+    if cursor.pages is None:
+        return []
+
+    last_page = cursor.pages
+    page_size = (result or {}).get("pageSize")
+    if remaining is not None and page_size:
+        # Don't fetch pages beyond what max_items needs
+        needed = -(-(remaining + cursor.offset) // page_size)
+        last_page = min(last_page, cursor.page + needed - 1)
+
+    next_page = pending[-1][0] + 1 if pending else cursor.page + 1
+    last_page = min(last_page, cursor.page + window)
+    return list(range(next_page, last_page + 1))
+
+
+def _advance(cursor, page_was_empty):
+    """
+    Move the cursor past a fully consumed page
+    :return: True if there are more pages to fetch
+    """
+    if page_was_empty or (cursor.pages is not None and cursor.page >= cursor.pages):
+        cursor.done = True
+        return False
+    cursor.page += 1
+    cursor.offset = 0
+    return True
+
+
+class SearchIterator(object):
+    """
+    Lazily yields search result items page by page, only one page is held in memory at a time
+    """
+
+    def __init__(
+        self, search, params=None, page_size=None, max_items=None, cursor=None
+    ):
+        """
+        :param search: callable taking search params and returning one result page
+        :param params: search params
+        :param page_size: items per page, overrides `pageSize` in params
+        :param max_items: stop after yielding this many items
+        :param cursor: SearchCursor to resume from, params and page_size are ignored when given
+        """
+        self._search = search
+        self.max_items = max_items
+        self.cursor = _initial_cursor(params, page_size, cursor)
+        self._items = self._generate()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._items)
+
+    def close(self):
+        self._items.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _fetch(self, cursor):
+        return self._search(dict(cursor.params, page=cursor.page))
+
+    def _generate(self):
+        cursor = self.cursor
+        count = 0
+        while not cursor.done:
+            if self.max_items is not None and count >= self.max_items:
+                return
+
+            items, empty = _page_items(cursor, self._fetch(cursor))
+            for item in items:
+                if self.max_items is not None and count >= self.max_items:
+                    return
+                cursor.offset += 1
+                cursor.yielded += 1
+                count += 1
+                yield item
+
+            if not _advance(cursor, empty):
+                return
+
+
+class AsyncSearchIterator(object):
+    """
+    `async for` counterpart of SearchIterator, `search` must be a coroutine function
+    """
+
+    def __init__(
+        self, search, params=None, page_size=None, max_items=None, cursor=None
+    ):
+        self._search = search
+        self.max_items = max_items
+        self.cursor = _initial_cursor(params, page_size, cursor)
+        self._items = self._generate()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._items.__anext__()
+
+    async def aclose(self):
+        await self._items.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def _fetch(self, cursor):
+        return await self._search(dict(cursor.params, page=cursor.page))
+
+    async def _generate(self):
+        cursor = self.cursor
+        count = 0
+        while not cursor.done:
+            if self.max_items is not None and count >= self.max_items:
+                return
+
+            items, empty = _page_items(cursor, await self._fetch(cursor))
+            for item in items:
+                if self.max_items is not None and count >= self.max_items:
+                    return
+                cursor.offset += 1
+                cursor.yielded += 1
+                count += 1
+                yield item
+
+            if not _advance(cursor, empty):
+                return
+
+
+class PrefetchingSearchIterator(SearchIterator):
+    """
+    SearchIterator that fetches up to `prefetch` pages ahead on a thread pool.
+    Items are still yielded in page order. Pages that were not started yet are
+    cancelled when the iterator is closed early.
+    """
+
+    def __init__(
+        self,
+        search,
+        params=None,
+        page_size=None,
+        max_items=None,
+        cursor=None,
+        prefetch=2,
+        concurrency=None,
+    ):
+        """
+        :param prefetch: number of pages to read ahead of the page being consumed
+        :param concurrency: number of fetching threads, defaults to `prefetch`
+        """
+        self.prefetch = prefetch
+        self.concurrency = concurrency or prefetch
+        super().__init__(
+            search, params, page_size=page_size, max_items=max_items, cursor=cursor
+        )
+
+    def _fetch_page(self, params, page):
+        return self._search(dict(params, page=page))
+
+    def _generate(self):
+        cursor = self.cursor
+        count = 0
+        pending = collections.deque()  # (page, future) in page order
+        executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="green-invoice-prefetch"
+        )
+        try:
+            while not cursor.done:
+                if self.max_items is not None and count >= self.max_items:
+                    return
+
+                if pending and pending[0][0] == cursor.page:
+                    result = pending.popleft()[1].result()
+                else:
+                    result = self._fetch(cursor)
+                items, empty = _page_items(cursor, result)
+
+                remaining = None if self.max_items is None else self.max_items - count
+                for page in _pages_to_prefetch(
+                    cursor, result, pending, self.prefetch, remaining
+                ):
+                    pending.append(
+                        (
+                            page,
+                            executor.submit(self._fetch_page, cursor.params, page),
+                        )
+                    )
+                del result
+
+                for item in items:
+                    if self.max_items is not None and count >= self.max_items:
+                        return
+                    cursor.offset += 1
+                    cursor.yielded += 1
+                    count += 1
+                    yield item
+
+                if not _advance(cursor, empty):
+                    return
+        finally:
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+class AsyncPrefetchingSearchIterator(AsyncSearchIterator):
+    """
+    AsyncSearchIterator that fetches up to `prefetch` pages ahead as asyncio tasks
+    """
+
+    def __init__(
+        self,
+        search,
+        params=None,
+        page_size=None,
+        max_items=None,
+        cursor=None,
+        prefetch=2,
+        concurrency=None,
+    ):
+        """
+        :param prefetch: number of pages to read ahead of the page being consumed
+        :param concurrency: maximum concurrent page fetches, defaults to `prefetch`
+        """
+        self.prefetch = prefetch
+        self.concurrency = concurrency or prefetch
+        super().__init__(
+            search, params, page_size=page_size, max_items=max_items, cursor=cursor
+        )
+
+    async def _fetch_page(self, semaphore, params, page):
+        async with semaphore:
+            return await self._search(dict(params, page=page))
+
+    async def _generate(self):
+        cursor = self.cursor
+        count = 0
+        pending = collections.deque()  # (page, task) in page order
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            while not cursor.done:
+                if self.max_items is not None and count >= self.max_items:
+                    return
+
+                if pending and pending[0][0] == cursor.page:
+                    result = await pending.popleft()[1]
+                else:
+                    result = await self._fetch(cursor)
+                items, empty = _page_items(cursor, result)
+
+                remaining = None if self.max_items is None else self.max_items - count
+                for page in _pages_to_prefetch(
+                    cursor, result, pending, self.prefetch, remaining
+                ):
+                    pending.append(
+                        (
+                            page,
+                            asyncio.ensure_future(
+                                self._fetch_page(semaphore, cursor.params, page)
+                            ),
+                        )
+                    )
+                del result
+
+                for item in items:
+                    if self.max_items is not None and count >= self.max_items:
+                        return
+                    cursor.offset += 1
+                    cursor.yielded += 1
+                    count += 1
+                    yield item
+
+                if not _advance(cursor, empty):
+                    return
+        finally:
+            for _, task in pending:
+                task.cancel()
@@ -0,0 +1,165 @@
+from typing import List, Optional
+
+from . import models
+from .pagination import SearchIterator
+
+
+class ILocalDocumentSearchFields(models.IDocumentSearchFields, total=False):
+    currency: List[models.Currency]
+    opened: bool  # only documents with (True) or without (False) an open amount
+    minAmountOpened: float
+    maxAmountOpened: float
+
+
+DEFAULT_PAGE_SIZE = 25
+
+# sort field -> ORDER BY, newest first, both backed by an index
+_ORDER_BY = {
+    "documentDate": "document_date DESC, id DESC",
+    "creationDate": "creation_date DESC, id DESC",
+}
+
+
+def _like(text):
+    # Substring match, with LIKE's wildcards in the text matched literally
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return "%" + escaped + "%"
+
+
+def _in(column, values):
+    return "{} IN ({})".format(column, ",".join("?" * len(values))), list(values)
+
+
+class DocumentQuery(object):
+    """
+    Answers document searches from a mirror.Mirror instead of the API.
+    Takes the IDocumentSearchFields of DocumentResource.search_document, plus the
+    filters of ILocalDocumentSearchFields, and returns the same IDocumentSearchResult.
+    Results are only as fresh as the mirror's last sync.
+    """
+
+    def __init__(self, mirror):
+        """
+        :param mirror: Mirror kept up to date by sync.SyncEngine
+        """
+        self.mirror = mirror
+        """:type : .mirror.Mirror"""
+
+    def search_document(
+        self, params: ILocalDocumentSearchFields
+    ) -> models.IDocumentSearchResult:
+        """
+        :param params: document search params
+        :return: documents search results dictionary
+        """
+        params = dict(params or {})
+        page = max(int(params.pop("page", None) or 1), 1)
+        page_size = max(int(params.pop("pageSize", None) or DEFAULT_PAGE_SIZE), 1)
+        sort = params.pop("sort", None) or "documentDate"
+        if sort not in _ORDER_BY:
+            raise ValueError("sort not in {0}".format(list(_ORDER_BY)))
+        # Links are part of the stored items already
+        params.pop("download", None)
+
+        where, values = self._where(params)
+        total = self.mirror.execute("SELECT COUNT(*) FROM documents" + where, values)[
+            0
+        ][0]
+        rows = self.mirror.execute(
+            "SELECT data FROM documents{} ORDER BY {} LIMIT ? OFFSET ?".format(
+                where, _ORDER_BY[sort]
+            ),
+            values + [page_size, (page - 1) * page_size],
+        )
+
+        loads = self.mirror.json_codec.loads
+        return {
+            "total": total,
+            "page": page,
+            "pageSize": page_size,
+            "pages": (total + page_size - 1) // page_size,
+            "items": [loads(data) for data, in rows],
+        }
+
+    def iter_documents(
+        self,
+        params: ILocalDocumentSearchFields = None,
+        page_size: Optional[int] = None,
+        max_items: Optional[int] = None,
+        cursor=None,
+    ) -> SearchIterator:
+        """
+        Lazily iterates over the documents of all result pages, see
+        DocumentResource.iter_documents
+        """
+        return SearchIterator(
+            self.search_document,
+            params,
+            page_size=page_size,
+            max_items=max_items,
+            cursor=cursor,
+        )
+
+    # noinspection PyMethodMayBeStatic
+    def _where(self, params):
+        """
+        :param params: search params without the paging and sorting ones
+        :return: tuple of the WHERE clause and its values
+        """
+        params = dict(params)
+        clauses = []
+        values = []
+
+        def add(clause, clause_values):
+            clauses.append(clause)
+            values.extend(clause_values)
+
+        for field, column in (
+            ("type", "type"),
+            ("status", "status"),
+            ("currency", "currency"),
+        ):
+            selected = params.pop(field, None)
+            if selected:
+                add(*_in(column, selected))
+
+        payment_types = params.pop("paymentTypes", None)
+        if payment_types:
+            clause, clause_values = _in("type", payment_types)
+            add(
+                "id IN (SELECT document_id FROM document_payments WHERE {})".format(
+                    clause
+                ),
+                clause_values,
+            )
+
+        for field, clause in (
+            ("number", "number = ?"),
+            ("fromDate", "document_date >= ?"),
+            ("toDate", "document_date <= ?"),
+            ("clientId", "client_id = ?"),
+            ("minAmountOpened", "amount_opened >= ?"),
+            ("maxAmountOpened", "amount_opened <= ?"),
+        ):
+            value = params.pop(field, None)
+            if value is not None:
+                add(clause, [str(value) if field == "number" else value])
+
+        for field, column in (
+            ("clientName", "client_name"),
+            ("description", "description"),
+        ):
+            text = params.pop(field, None)
+            if text:
+                add("{} LIKE ? ESCAPE '\\'".format(column), [_like(text)])
+
+        opened = params.pop("opened", None)
+        if opened is not None:
+            add("amount_opened > 0" if opened else "COALESCE(amount_opened, 0) = 0", [])
+
+        if params:
+            raise ValueError("Unsupported search fields: {}".format(", ".join(params)))
+
+        if not clauses:
+            return "", values
+        return " WHERE " + " AND ".join(clauses), values
@@ -0,0 +1,197 @@
+import threading
+import time
+
+
+def parse_retry_after(value, now=None):
+    """
+    :param value: Retry-After header, either delay seconds or an HTTP date
+    :return: seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    from email.utils import parsedate_to_datetime
+
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+    return max(0.0, retry_at - (now if now is not None else time.time()))
+
+
+def parse_rate_limit_reset(headers, now=None):
+    """
+    Reads the X-RateLimit-* / RateLimit-* headers
+    :return: seconds until the quota resets if it is exhausted, otherwise None
+    """
+    remaining = headers.get("X-RateLimit-Remaining", headers.get("RateLimit-Remaining"))
+    reset = headers.get("X-RateLimit-Reset", headers.get("RateLimit-Reset"))
+    if remaining is None or reset is None:
+        return None
+    try:
+        if float(remaining) > 0:
+            return None
+        reset = float(reset)
+    except ValueError:
+        return None
+    if reset > 1e9:  # Epoch timestamp rather than delta seconds
+        reset -= now if now is not None else time.time()
+    return max(0.0, reset)
+
+
+class TokenBucket(object):
+    """
+    Token bucket whose rate adapts AIMD style: it is multiplied by `decrease_factor`
+    when the API throttles us, and grows additively while calls succeed.
+    """
+
+    def __init__(
+        self,
+        rate,
+        burst=None,
+        min_rate=0.5,
+        max_rate=None,
+        decrease_factor=0.5,
+        increase=1.0,
+    ):
+        """
+        :param rate: initial requests per second
+        :param burst: bucket capacity, defaults to `rate`
+        :param min_rate: lowest rate to back off to
+        :param max_rate: highest rate to probe up to, defaults to 4 times `rate`
+        :param decrease_factor: rate multiplier applied when throttled
+        :param increase: requests per second added for every second of successful calls
+        """
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate or self.rate * 4
+        self.decrease_factor = decrease_factor
+        self.increase = increase
+
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._decreased_at = 0.0
+
+        self.throttled = 0
+        self.waited_seconds_total = 0.0
+
+    def reserve(self):
+        """
+        Take a token, going into debt if the bucket is empty
+        :return: seconds the caller has to wait before sending
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            delay = max(delay, self._blocked_until - now)
+            self.waited_seconds_total += delay
+            return delay
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttled(self, retry_after=None):
+        """
+        :param retry_after: seconds the API asked us to wait, if known
+        """
+        with self._lock:
+            self.throttled += 1
+            now = time.monotonic()
+            # Concurrent 429s caused by the same burst only back off once
+            if now - self._decreased_at >= 1.0:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self._decreased_at = now
+            if retry_after is not None:
+                self._block(retry_after)
+
+    def block(self, seconds):
+        """
+        Hold every request of this bucket for `seconds`
+        """
+        with self._lock:
+            self._block(seconds)
+
+    def _block(self, seconds):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        # Forget the burst accumulated so far, traffic resumes at the new rate
+        self._tokens = min(self._tokens, 0.0)
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "throttled": self.throttled,
+                "waited_seconds_total": self.waited_seconds_total,
+            }
+
+
+class RateLimiter(object):
+    """
+    Client side rate limiter with one adaptive TokenBucket per configured endpoint.
+    Endpoints are path prefixes, a request uses the bucket of the longest matching prefix
+    or the default bucket.
+    """
+
+    def __init__(self, rate=5, burst=None, endpoints=None, **bucket_options):
+        """
+        :param rate: initial requests per second of the default bucket
+        :param burst: capacity of the default bucket
+        :param endpoints: dictionary of path prefix to rate, or to TokenBucket keyword arguments
+        :param bucket_options: TokenBucket keyword arguments shared by all buckets
+        """
+        self.default = TokenBucket(rate, burst=burst, **bucket_options)
+        self.buckets = {}
+        for prefix, options in (endpoints or {}).items():
+            if not isinstance(options, dict):
+                options = {"rate": options}
+            self.buckets[prefix] = TokenBucket(**dict(bucket_options, **options))
+        self._prefixes = sorted(self.buckets, key=len, reverse=True)
+
+    def bucket_for(self, path):
+        for prefix in self._prefixes:
+            if path.startswith(prefix):
+                return self.buckets[prefix]
+        return self.default
+
+    def reserve(self, path):
+        """
+        :return: seconds to wait before sending a request to `path`
+        """
+        return self.bucket_for(path).reserve()
+
+    def update(self, path, status_code, headers):
+        """
+        Adapt the rate of `path`'s bucket to the API's response
+        """
+        bucket = self.bucket_for(path)
+        if status_code == 429:
+            bucket.on_throttled(parse_retry_after(headers.get("Retry-After")))
+            return
+
+        reset = parse_rate_limit_reset(headers)
+        if reset is not None:
+            bucket.block(reset)
+        elif 200 <= status_code < 500:
+            bucket.on_success()
+
+    @property
+    def stats(self):
+        stats = {"default": self.default.stats}
+        for prefix, bucket in self.buckets.items():
+            stats[prefix] = bucket.stats
+        return stats
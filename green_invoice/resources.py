@@ -1,22 +1,100 @@
+import asyncio
+import collections
+import copy
+import datetime
+import numbers
+import os
 import re
-from abc import abstractmethod
-from typing import List, Optional
-from urllib.parse import urlparse
-
-import requests
-from lxml import etree
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional, Sequence, Union
 
 from . import models
-from .client import default as default_client
+from .compact import CompactClient, CompactDocument, compact_result
+from .download import DownloadReport, DownloadResult, document_file_path
+from .exceptions import DownloadError
+from .validation import REQUIRED, compile_validator, validate_draft
+from .vat import _value, preview
+from .pagination import (
+    AsyncPrefetchingSearchIterator,
+    AsyncSearchIterator,
+    PrefetchingSearchIterator,
+    SearchIterator,
+)
+from .client import default as default_client, default_async as default_async_client
+from .tenants import (
+    default as default_registry,
+    default_async as default_async_registry,
+)
 
 
 class Resource(object):
-    def __init__(self, client=None):
-        self.client = client or default_client()
+    def __init__(
+        self, client=None, cache=None, cache_ttl=None, compact=False, tenant=None
+    ):
+        """
+        :param client: Client to use, defaults to the configured one
+        :param cache: optional CacheBackend serving repeated reads of the same entity
+        :param cache_ttl: seconds to cache entities, None for the backend's default
+        :param compact: return search result items as compact.CompactModel objects
+                        instead of dictionaries
+        :param tenant: use the client of this tenant from the configured registry, see
+                       tenants.configure
+        """
+        self.client = client or self._default_client(tenant)
         """:type : .client.Client"""
+        self.cache = cache
+        """:type : .cache.CacheBackend"""
+        self.cache_ttl = cache_ttl
+        self.compact = compact
+
+    # noinspection PyMethodMayBeStatic
+    def _default_client(self, tenant=None):
+        if tenant is not None:
+            return default_registry().get(tenant)
+        return default_client()
+
+    def request(self, method, path, data=None, **kwargs):
+        response, body = self.client.request(method, path, data, **kwargs)
+        return response, body
+
+    def _cache_key(self, kind, entity_id):
+        # Namespaced by account, so a shared cache can serve several clients
+        return "{}:{}:{}:{}".format(
+            self.client.env, self.client.api_key_id, kind, entity_id
+        )
+
+    def _cache_get(self, key):
+        if self.cache is None:
+            return None
+        value = self.cache.get(key)
+        # Copies keep callers from mutating the cached entity
+        return copy.deepcopy(value) if value is not None else None
+
+    def _cache_set(self, key, value):
+        if self.cache is not None and value is not None:
+            self.cache.set(key, copy.deepcopy(value), ttl=self.cache_ttl)
+
+    def _search_result(self, body, model):
+        return compact_result(body, model) if self.compact else body
+
+    def _cache_invalidate(self, *keys):
+        if self.cache is not None:
+            for key in keys:
+                self.cache.delete(key)
+
 
-    def request(self, method, path, data=None):
-        response, body = self.client.request(method, path, data)
+class AsyncResource(Resource):
+    # noinspection PyMethodMayBeStatic
+    def _default_client(self, tenant=None):
+        if tenant is not None:
+            return default_async_registry().get(tenant)
+        return default_async_client()
+
+    async def request(self, method, path, data=None, **kwargs):
+        response, body = await self.client.request(method, path, data, **kwargs)
         return response, body
 
 
@@ -32,9 +110,15 @@ class ClientResource(Resource):
         :param client_id: Green Invoice client id
         :return: client dictionary
         """
+        key = self._cache_key("client", client_id)
+        body = self._cache_get(key)
+        if body is not None:
+            return body
+
         response, body = self.request(
             "GET", self.client_path.format(client_id=client_id)
         )
+        self._cache_set(key, body)
         return body
 
     def search_client(
@@ -45,32 +129,82 @@ class ClientResource(Resource):
         :return: clients search results dictionary
         """
         response, body = self.request(
-            "POST", self.clients_path + "/search", data=params
+            "POST", self.clients_path + "/search", data=params, idempotent=True
         )
-        return body
+        return self._search_result(body, CompactClient)
 
-    def create(self, client_params: models.IClientDraft) -> models.IClient:
+    def iter_clients(
+        self,
+        params: models.IClientSearchFields = None,
+        page_size: Optional[int] = None,
+        max_items: Optional[int] = None,
+        cursor=None,
+        prefetch: int = 0,
+        concurrency: Optional[int] = None,
+    ) -> SearchIterator:
+        """
+        Lazily iterates over the clients of all search result pages
+        :param params: Green Invoice client search params
+        :param page_size: items per page
+        :param max_items: stop after this many clients
+        :param cursor: SearchCursor of a previous iteration to resume from
+        :param prefetch: number of pages to fetch ahead concurrently, 0 fetches pages one by one
+        :param concurrency: maximum concurrent page fetches, defaults to `prefetch`
+        :return: iterator of client search result items, its `cursor` tracks the position
+        """
+        if prefetch:
+            return PrefetchingSearchIterator(
+                self.search_client,
+                params,
+                page_size=page_size,
+                max_items=max_items,
+                cursor=cursor,
+                prefetch=prefetch,
+                concurrency=concurrency,
+            )
+        return SearchIterator(
+            self.search_client,
+            params,
+            page_size=page_size,
+            max_items=max_items,
+            cursor=cursor,
+        )
+
+    def create(
+        self, client_params: models.IClientDraft, validate: bool = True
+    ) -> models.IClient:
         """
         Creates a new client
         :param client_params:
+        :param validate: check the draft against IClientDraft before sending it
         :return: Returns the newly created Green Invoice client
+        :raises ValidationError: when the draft is invalid
         """
+        if validate:
+            validate_draft(models.IClientDraft, client_params)
 
         response, body = self.request("POST", self.clients_path, data=client_params)
 
         return body
 
-    def update(self, client_id: str, client_params: models.IClientDraft):
+    def update(
+        self, client_id: str, client_params: models.IClientDraft, validate: bool = True
+    ):
         """
         Updates an existing client
         :param client_id: Green Invoice client id
         :param client_params:
+        :param validate: check the draft against IClientDraft before sending it
         :return: Returns the updated Green Invoice client
+        :raises ValidationError: when the draft is invalid
         """
+        if validate:
+            validate_draft(models.IClientDraft, client_params, new=False)
 
         response, body = self.request(
             "PUT", self.client_path.format(client_id=client_id), data=client_params
         )
+        self._cache_invalidate(self._cache_key("client", client_id))
         return body
 
     def delete(self, client_id: str):
@@ -83,6 +217,7 @@ class ClientResource(Resource):
         response, body = self.request(
             "DELETE", self.client_path.format(client_id=client_id)
         )
+        self._cache_invalidate(self._cache_key("client", client_id))
         return body
 
     def associate_documents(self, client_id: str, document_ids: List[str]):
@@ -90,7 +225,258 @@ class ClientResource(Resource):
         response, _ = self.request(
             "POST", self.client_path.format(client_id=client_id) + "/assoc", data=data
         )
-        return response.ok
+        self._cache_invalidate(
+            self._cache_key("client", client_id),
+            *[self._cache_key("document", id) for id in document_ids]
+        )
+        return 200 <= response.status_code < 300
+
+
+# Tolerated difference between our clock and the API's when matching creation dates.
+# Generous, as claimed ids and the rows and amounts already tell identical drafts'
+# documents apart, while a document missed for a fast clock would be created again.
+CREATION_DATE_SKEW = 15 * 60
+
+# Tolerated difference between a document's amounts and the draft's
+AMOUNT_TOLERANCE = 0.005
+
+
+def _created_document_search_params(document_params):
+    """
+    :return: search params narrowing down documents that may have been created from the draft
+    """
+    date = document_params.get("date") or datetime.date.today()
+    if isinstance(date, str):
+        date = datetime.date.fromisoformat(date)
+    elif isinstance(date, datetime.datetime):
+        date = date.date()
+    params = {
+        # One day of slack on each side for time zone differences
+        "fromDate": (date - datetime.timedelta(days=1)).isoformat(),
+        "toDate": (date + datetime.timedelta(days=1)).isoformat(),
+        "sort": "creationDate",
+    }
+    if "type" in document_params:
+        params["type"] = [document_params["type"]]
+
+    client = document_params.get("client") or {}
+    if client.get("id"):
+        params["clientId"] = client["id"]
+    elif client.get("name"):
+        params["clientName"] = client["name"]
+    if document_params.get("description"):
+        params["description"] = document_params["description"]
+    return params
+
+
+def _draft_key(document_params):
+    """
+    :return: hashable key of the fields a created document is matched on, equal for
+             drafts whose documents can't be told apart
+    """
+    client = document_params.get("client") or {}
+    return (
+        _value(document_params.get("type")),
+        _value(document_params.get("currency")),
+        document_params.get("description") or "",
+        client.get("id"),
+        client.get("name"),
+        tuple(
+            (
+                row.get("description") or "",
+                row.get("price"),
+                row.get("quantity"),
+                _value(row.get("currency")),
+                _value(row.get("vatType")),
+            )
+            for row in document_params.get("income") or []
+        ),
+        tuple(
+            (_value(row.get("type")), row.get("price"))
+            for row in document_params.get("payment") or []
+        ),
+    )
+
+
+def _same_amount(a, b):
+    # Either may be a Decimal
+    return (
+        a is not None and b is not None and abs(float(a) - float(b)) < AMOUNT_TOLERANCE
+    )
+
+
+def _matches_rows(item_rows, draft_rows, fields):
+    """
+    :param fields: dictionary of the row fields to compare to their default value
+    """
+    if len(item_rows) != len(draft_rows):
+        return False
+    for item_row, draft_row in zip(item_rows, draft_rows):
+        for field, default in fields.items():
+            if field not in draft_row:
+                continue
+            expected = _value(draft_row[field])
+            actual = _value(item_row.get(field, default))
+            if isinstance(expected, numbers.Number) and not isinstance(expected, bool):
+                if not _same_amount(actual, expected):
+                    return False
+            elif (actual or default) != (expected or default):
+                return False
+    return True
+
+
+def _matches_created_document(item, document_params, since):
+    """
+    :param item: document search result item, dictionary or CompactDocument
+    :param since: unix timestamp of the first creation attempt
+    """
+    if (item.get("creationDate") or 0) < since - CREATION_DATE_SKEW:
+        return False
+    for field in ("type", "currency"):
+        if field in document_params and _value(item.get(field)) != _value(
+            document_params[field]
+        ):
+            return False
+    if (item.get("description") or "") != (document_params.get("description") or ""):
+        return False
+
+    client = document_params.get("client") or {}
+    item_client = item.get("client") or {}
+    if client.get("id") and item_client.get("id") != client["id"]:
+        return False
+    if client.get("name") and item_client.get("name") != client["name"]:
+        return False
+
+    income = document_params.get("income") or []
+    if not _matches_rows(
+        item.get("income") or [],
+        income,
+        {"description": "", "price": 0, "quantity": 1, "currency": None, "vatType": 0},
+    ):
+        return False
+    if not _matches_rows(
+        item.get("payment") or [],
+        document_params.get("payment") or [],
+        {"type": None, "price": 0},
+    ):
+        return False
+
+    # The amount before VAT only depends on the VAT rate when prices include it
+    if item.get("amountExcludedVat") is not None and not any(
+        _value(row.get("vatType")) == models.IncomeVatType.INCLUDED for row in income
+    ):
+        expected = preview(document_params)["amountExcludedVat"]
+        if not _same_amount(item["amountExcludedVat"], expected):
+            return False
+    return True
+
+
+def _created_document(item) -> models.ICreatedDocument:
+    """
+    :param item: document search result item of a document found by find_created_document
+    :return: the item in the shape `create` returns documents in
+    """
+    document = {"id": item.get("id")}
+    number = item.get("number")
+    if number is not None:
+        document["number"] = int(number) if str(number).isdigit() else number
+    for field in ("signed", "lang", "url"):
+        value = item.get(field)
+        if value is not None:
+            document[field] = _value(value)
+    return document
+
+
+class CreatedDocuments(object):
+    """
+    Ids of the documents created by concurrent `create` calls, shared by the calls of a
+    batch so that a retried call never takes a document another call created for its own.
+    Before searching for its document, a retried call waits until no call of an
+    identical draft has an attempt in flight, which may have created a document not
+    known here yet.
+    """
+
+    def __init__(self):
+        self.ids = set()
+        self._condition = threading.Condition()
+        # draft key -> attempts in flight
+        self._sending = collections.Counter()
+
+    def start(self, key):
+        with self._condition:
+            self._sending[key] += 1
+
+    def finish(self, key, document_id=None):
+        """
+        :param document_id: id of the document the attempt created, if it did
+        """
+        with self._condition:
+            self._sending[key] -= 1
+            if not self._sending[key]:
+                del self._sending[key]
+            if document_id is not None:
+                self.ids.add(document_id)
+            self._condition.notify_all()
+
+    def wait(self, key):
+        """
+        Wait until no attempt of an identical draft is in flight
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: key not in self._sending)
+
+    def claim(self, document_id):
+        """
+        :return: whether the document was free, it's taken from now on
+        """
+        with self._condition:
+            if document_id in self.ids:
+                return False
+            self.ids.add(document_id)
+            return True
+
+
+class AsyncCreatedDocuments(CreatedDocuments):
+    """
+    CreatedDocuments of AsyncDocumentResource, waited on from the event loop
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._changed = None
+
+    def finish(self, key, document_id=None):
+        super().finish(key, document_id)
+        if self._changed is not None:
+            # Wakes every waiter, which waits on a new event if it has to wait again
+            self._changed.set()
+            self._changed = None
+
+    async def wait(self, key):
+        while key in self._sending:
+            if self._changed is None:
+                self._changed = asyncio.Event()
+            await self._changed.wait()
+
+
+def _invalid_drafts(drafts):
+    """
+    :return: dictionary of the index of every invalid document draft to its ValidationError
+    """
+    return compile_validator(models.IDocumentDraft).validate_many(
+        drafts, REQUIRED[models.IDocumentDraft]
+    )
+
+
+def _document_link(links, document_id, lang):
+    url = (links or {}).get(_value(lang))
+    if not url:
+        raise DownloadError(
+            description="Document {} has no {} download link".format(
+                document_id, _value(lang)
+            )
+        )
+    return url
 
 
 class DocumentResource(Resource):
@@ -105,9 +491,15 @@ class DocumentResource(Resource):
         :param document_id: Green Invoice client id
         :return: client dictionary
         """
+        key = self._cache_key("document", document_id)
+        body = self._cache_get(key)
+        if body is not None:
+            return body
+
         response, body = self.request(
             "GET", self.document_path.format(document_id=document_id)
         )
+        self._cache_set(key, body)
         return body
 
     def search_document(
@@ -118,21 +510,182 @@ class DocumentResource(Resource):
         :return: documents search results dictionary
         """
         response, body = self.request(
-            "POST", self.documents_path + "/search", data=params
+            "POST", self.documents_path + "/search", data=params, idempotent=True
         )
-        return body
+        return self._search_result(body, CompactDocument)
 
-    def create(self, document_params: models.IDocumentDraft) -> models.IDocument:
+    def iter_documents(
+        self,
+        params: models.IDocumentSearchFields = None,
+        page_size: Optional[int] = None,
+        max_items: Optional[int] = None,
+        cursor=None,
+        prefetch: int = 0,
+        concurrency: Optional[int] = None,
+    ) -> SearchIterator:
+        """
+        Lazily iterates over the documents of all search result pages
+        :param params: Green Invoice document search params
+        :param page_size: items per page
+        :param max_items: stop after this many documents
+        :param cursor: SearchCursor of a previous iteration to resume from
+        :param prefetch: number of pages to fetch ahead concurrently, 0 fetches pages one by one
+        :param concurrency: maximum concurrent page fetches, defaults to `prefetch`
+        :return: iterator of document search result items, its `cursor` tracks the position
+        """
+        if prefetch:
+            return PrefetchingSearchIterator(
+                self.search_document,
+                params,
+                page_size=page_size,
+                max_items=max_items,
+                cursor=cursor,
+                prefetch=prefetch,
+                concurrency=concurrency,
+            )
+        return SearchIterator(
+            self.search_document,
+            params,
+            page_size=page_size,
+            max_items=max_items,
+            cursor=cursor,
+        )
+
+    def create(
+        self,
+        document_params: models.IDocumentDraft,
+        idempotency_key: Optional[str] = None,
+        validate: bool = True,
+        created: Optional[CreatedDocuments] = None,
+    ) -> models.ICreatedDocument:
         """
         Creates a new document
+        Failed attempts are retried according to the client's retry policy, but before
+        re-sending, recently created documents are searched for one matching the draft
+        (its client, description, income and payment rows, currency and amount), so that
+        a retry never issues a duplicate document.
         :param document_params:
+        :param idempotency_key: sent as the Idempotency-Key header, generated if not given
+        :param validate: check the draft against IDocumentDraft before sending it
+        :param created: CreatedDocuments shared by concurrent creates, so that they never
+                        take each other's documents for their own, see create_many
         :return: Returns the newly created Green Invoice document
+        :raises ValidationError: when the draft is invalid
         """
+        if validate:
+            validate_draft(models.IDocumentDraft, document_params)
+        if created is None:
+            created = CreatedDocuments()
+        key = _draft_key(document_params)
+        started = time.time()
+        sending = True
+
+        def before_retry():
+            nonlocal sending
+            created.finish(key)
+            sending = False
+            created.wait(key)
+            item = self.find_created_document(document_params, started, created)
+            if item is not None:
+                return _created_document(item)
+            created.start(key)
+            sending = True
+            return None
 
-        response, body = self.request("POST", self.documents_path, data=document_params)
+        created.start(key)
+        document_id = None
+        try:
+            response, body = self.request(
+                "POST",
+                self.documents_path,
+                data=document_params,
+                headers={"Idempotency-Key": idempotency_key or uuid.uuid4().hex},
+                idempotent=True,
+                before_retry=before_retry,
+            )
+            if response is not None:
+                document_id = (body or {}).get("id")
+        finally:
+            # Known as taken before identical drafts waiting on this attempt search
+            if sending:
+                created.finish(key, document_id)
 
         return body
 
+    def find_created_document(
+        self,
+        document_params: models.IDocumentDraft,
+        since: float,
+        created: Optional[CreatedDocuments] = None,
+    ) -> Optional[models.IDocumentSearchResultItem]:
+        """
+        Looks for a document created from `document_params` after `since`
+        :param document_params: the draft that was sent to `create`
+        :param since: unix timestamp of the first creation attempt
+        :param created: CreatedDocuments whose documents are skipped, the found one is
+                        claimed in it
+        :return: the matching document search result item, or None
+        """
+        for item in self.iter_documents(
+            _created_document_search_params(document_params),
+            page_size=50,
+            max_items=500,
+        ):
+            if _matches_created_document(item, document_params, since) and (
+                created is None or created.claim(item["id"])
+            ):
+                return item
+        return None
+
+    def create_many(
+        self,
+        drafts: Sequence[models.IDocumentDraft],
+        concurrency: int = 4,
+        on_progress: Optional[Callable] = None,
+        validate: bool = True,
+    ) -> List[Union[models.ICreatedDocument, Exception]]:
+        """
+        Creates many documents in parallel over the client's connection pool.
+        A failing draft doesn't stop the others, its exception is returned in its place.
+        :param drafts: documents to create
+        :param concurrency: maximum documents created at the same time
+        :param on_progress: called as on_progress(index, result, completed, total) in the
+                            calling thread each time a draft finishes
+        :param validate: check all drafts first, invalid ones fail with a ValidationError
+                         without being sent
+        :return: list in the order of `drafts`, each item is either the created
+                 document or the exception (usually an APIError) raised while creating it
+        """
+        results = [None] * len(drafts)
+        invalid = _invalid_drafts(drafts) if validate else {}
+        for completed, (index, error) in enumerate(sorted(invalid.items()), 1):
+            results[index] = error
+            if on_progress:
+                on_progress(index, error, completed, len(drafts))
+
+        # Identical drafts must not take each other's documents when retried
+        created = CreatedDocuments()
+        with ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="green-invoice-create"
+        ) as executor:
+            futures = {
+                executor.submit(
+                    self.create, draft, validate=False, created=created
+                ): index
+                for index, draft in enumerate(drafts)
+                if index not in invalid
+            }
+            for completed, future in enumerate(as_completed(futures), len(invalid) + 1):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    results[index] = e
+                if on_progress:
+                    on_progress(index, results[index], completed, len(drafts))
+
+        return results
+
     def get_document_download_link(self, document_id: str) -> models.IDocumentUrl:
         """
         Gets document's download link as IDocumentUrl
@@ -145,3 +698,437 @@ class DocumentResource(Resource):
             self.document_path.format(document_id=document_id) + "/download/links",
         )
         return body
+
+    def download_document(
+        self,
+        document_id: str,
+        dest: str,
+        lang: Union[models.DocumentLanguage, str] = "origin",
+        expected_sha256: Optional[str] = None,
+    ) -> DownloadResult:
+        """
+        Downloads a document's PDF, streaming it to disk.
+        An interrupted download is resumed from its `.part` file on the next call.
+        :param document_id: Green Invoice document id
+        :param dest: file path, or a directory to save <document_id>.pdf in, which is
+                     created if the path ends with a separator
+        :param lang: DocumentLanguage of the copy, or "origin" for the original
+        :param expected_sha256: hex digest the file must have
+        :return: DownloadResult with the file's path, size and sha256
+        """
+        links = self.get_document_download_link(document_id)
+        result = self.client.download(
+            _document_link(links, document_id, lang),
+            document_file_path(dest, document_id),
+            expected_sha256=expected_sha256,
+        )
+        result.document_id = document_id
+        return result
+
+    def download_documents(
+        self,
+        document_ids: Sequence[str],
+        dest_dir: str,
+        concurrency: int = 8,
+        lang: Union[models.DocumentLanguage, str] = "origin",
+        on_progress: Optional[Callable] = None,
+    ) -> DownloadReport:
+        """
+        Downloads many documents' PDFs in parallel over the client's connection pools,
+        keep `concurrency` within the client's pool_maxsize so that connections are reused.
+        A failing download doesn't stop the others, its exception is reported instead.
+        :param document_ids: Green Invoice document ids
+        :param dest_dir: directory to save the files in as <document_id>.pdf, created if needed
+        :param concurrency: maximum documents downloaded at the same time
+        :param lang: DocumentLanguage of the copies, or "origin" for the originals
+        :param on_progress: called as on_progress(document_id, result, completed, total) in
+                            the calling thread each time a download finishes, result is
+                            either a DownloadResult or an exception
+        :return: DownloadReport of the results, errors and aggregate throughput
+        """
+        os.makedirs(dest_dir, exist_ok=True)
+        document_ids = list(dict.fromkeys(document_ids))
+        results, errors = {}, {}
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="green-invoice-download"
+        ) as executor:
+            futures = {
+                executor.submit(
+                    self.download_document, document_id, dest_dir, lang
+                ): document_id
+                for document_id in document_ids
+            }
+            for completed, future in enumerate(as_completed(futures), 1):
+                document_id = futures[future]
+                try:
+                    result = results[document_id] = future.result()
+                except Exception as e:
+                    result = errors[document_id] = e
+                if on_progress:
+                    on_progress(document_id, result, completed, len(document_ids))
+
+        return DownloadReport(results, errors, time.monotonic() - started)
+
+
+class AsyncClientResource(AsyncResource, ClientResource):
+    async def find_by_client_id(self, client_id) -> models.IClient:
+        """
+        :param client_id: Green Invoice client id
+        :return: client dictionary
+        """
+        key = self._cache_key("client", client_id)
+        body = self._cache_get(key)
+        if body is not None:
+            return body
+
+        response, body = await self.request(
+            "GET", self.client_path.format(client_id=client_id)
+        )
+        self._cache_set(key, body)
+        return body
+
+    async def search_client(
+        self, params: models.IClientSearchFields
+    ) -> models.IClientSearchResult:
+        """
+        :param params: Green Invoice client search params
+        :return: clients search results dictionary
+        """
+        response, body = await self.request(
+            "POST", self.clients_path + "/search", data=params, idempotent=True
+        )
+        return self._search_result(body, CompactClient)
+
+    def iter_clients(
+        self,
+        params: models.IClientSearchFields = None,
+        page_size: Optional[int] = None,
+        max_items: Optional[int] = None,
+        cursor=None,
+        prefetch: int = 0,
+        concurrency: Optional[int] = None,
+    ) -> AsyncSearchIterator:
+        if prefetch:
+            return AsyncPrefetchingSearchIterator(
+                self.search_client,
+                params,
+                page_size=page_size,
+                max_items=max_items,
+                cursor=cursor,
+                prefetch=prefetch,
+                concurrency=concurrency,
+            )
+        return AsyncSearchIterator(
+            self.search_client,
+            params,
+            page_size=page_size,
+            max_items=max_items,
+            cursor=cursor,
+        )
+
+    async def create(
+        self, client_params: models.IClientDraft, validate: bool = True
+    ) -> models.IClient:
+        """
+        Creates a new client
+        :param client_params:
+        :param validate: check the draft against IClientDraft before sending it
+        :return: Returns the newly created Green Invoice client
+        :raises ValidationError: when the draft is invalid
+        """
+        if validate:
+            validate_draft(models.IClientDraft, client_params)
+
+        response, body = await self.request(
+            "POST", self.clients_path, data=client_params
+        )
+
+        return body
+
+    async def update(
+        self, client_id: str, client_params: models.IClientDraft, validate: bool = True
+    ):
+        """
+        Updates an existing client
+        :param client_id: Green Invoice client id
+        :param client_params:
+        :param validate: check the draft against IClientDraft before sending it
+        :return: Returns the updated Green Invoice client
+        :raises ValidationError: when the draft is invalid
+        """
+        if validate:
+            validate_draft(models.IClientDraft, client_params, new=False)
+
+        response, body = await self.request(
+            "PUT", self.client_path.format(client_id=client_id), data=client_params
+        )
+        self._cache_invalidate(self._cache_key("client", client_id))
+        return body
+
+    async def delete(self, client_id: str):
+        """
+        Deletes an existing client
+        :param client_id: Green Invoice client id
+        :return: Returns the deleted Green Invoice client
+        """
+
+        response, body = await self.request(
+            "DELETE", self.client_path.format(client_id=client_id)
+        )
+        self._cache_invalidate(self._cache_key("client", client_id))
+        return body
+
+    async def associate_documents(self, client_id: str, document_ids: List[str]):
+        data = {"ids": document_ids}
+        response, _ = await self.request(
+            "POST", self.client_path.format(client_id=client_id) + "/assoc", data=data
+        )
+        self._cache_invalidate(
+            self._cache_key("client", client_id),
+            *[self._cache_key("document", id) for id in document_ids]
+        )
+        return 200 <= response.status_code < 300
+
+
+class AsyncDocumentResource(AsyncResource, DocumentResource):
+    async def find_by_document_id(self, document_id) -> models.IClient:
+        """
+        :param document_id: Green Invoice client id
+        :return: client dictionary
+        """
+        key = self._cache_key("document", document_id)
+        body = self._cache_get(key)
+        if body is not None:
+            return body
+
+        response, body = await self.request(
+            "GET", self.document_path.format(document_id=document_id)
+        )
+        self._cache_set(key, body)
+        return body
+
+    async def search_document(
+        self, params: models.IDocumentSearchFields
+    ) -> models.IDocumentSearchResult:
+        """
+        :param params: Green Invoice document search params
+        :return: documents search results dictionary
+        """
+        response, body = await self.request(
+            "POST", self.documents_path + "/search", data=params, idempotent=True
+        )
+        return self._search_result(body, CompactDocument)
+
+    def iter_documents(
+        self,
+        params: models.IDocumentSearchFields = None,
+        page_size: Optional[int] = None,
+        max_items: Optional[int] = None,
+        cursor=None,
+        prefetch: int = 0,
+        concurrency: Optional[int] = None,
+    ) -> AsyncSearchIterator:
+        if prefetch:
+            return AsyncPrefetchingSearchIterator(
+                self.search_document,
+                params,
+                page_size=page_size,
+                max_items=max_items,
+                cursor=cursor,
+                prefetch=prefetch,
+                concurrency=concurrency,
+            )
+        return AsyncSearchIterator(
+            self.search_document,
+            params,
+            page_size=page_size,
+            max_items=max_items,
+            cursor=cursor,
+        )
+
+    async def create(
+        self,
+        document_params: models.IDocumentDraft,
+        idempotency_key: Optional[str] = None,
+        validate: bool = True,
+        created: Optional[AsyncCreatedDocuments] = None,
+    ) -> models.ICreatedDocument:
+        """
+        Creates a new document, see DocumentResource.create
+        :param document_params:
+        :param idempotency_key: sent as the Idempotency-Key header, generated if not given
+        :param validate: check the draft against IDocumentDraft before sending it
+        :param created: AsyncCreatedDocuments shared by concurrent creates
+        :return: Returns the newly created Green Invoice document
+        """
+        if validate:
+            validate_draft(models.IDocumentDraft, document_params)
+        if created is None:
+            created = AsyncCreatedDocuments()
+        key = _draft_key(document_params)
+        started = time.time()
+        sending = True
+
+        async def before_retry():
+            nonlocal sending
+            created.finish(key)
+            sending = False
+            await created.wait(key)
+            item = await self.find_created_document(document_params, started, created)
+            if item is not None:
+                return _created_document(item)
+            created.start(key)
+            sending = True
+            return None
+
+        created.start(key)
+        document_id = None
+        try:
+            response, body = await self.request(
+                "POST",
+                self.documents_path,
+                data=document_params,
+                headers={"Idempotency-Key": idempotency_key or uuid.uuid4().hex},
+                idempotent=True,
+                before_retry=before_retry,
+            )
+            if response is not None:
+                document_id = (body or {}).get("id")
+        finally:
+            # Known as taken before identical drafts waiting on this attempt search
+            if sending:
+                created.finish(key, document_id)
+
+        return body
+
+    async def find_created_document(
+        self,
+        document_params: models.IDocumentDraft,
+        since: float,
+        created: Optional[CreatedDocuments] = None,
+    ) -> Optional[models.IDocumentSearchResultItem]:
+        """
+        Looks for a document created from `document_params` after `since`
+        """
+        async for item in self.iter_documents(
+            _created_document_search_params(document_params),
+            page_size=50,
+            max_items=500,
+        ):
+            if _matches_created_document(item, document_params, since) and (
+                created is None or created.claim(item["id"])
+            ):
+                return item
+        return None
+
+    async def create_many(
+        self,
+        drafts: Sequence[models.IDocumentDraft],
+        concurrency: int = 4,
+        on_progress: Optional[Callable] = None,
+        validate: bool = True,
+    ) -> List[Union[models.ICreatedDocument, Exception]]:
+        """
+        Creates many documents concurrently, see DocumentResource.create_many
+        """
+        results = [None] * len(drafts)
+        invalid = _invalid_drafts(drafts) if validate else {}
+        for completed, (index, error) in enumerate(sorted(invalid.items()), 1):
+            results[index] = error
+            if on_progress:
+                on_progress(index, error, completed, len(drafts))
+        semaphore = asyncio.Semaphore(concurrency)
+        created = AsyncCreatedDocuments()
+
+        async def create(index, draft):
+            async with semaphore:
+                try:
+                    return index, await self.create(
+                        draft, validate=False, created=created
+                    )
+                except Exception as e:
+                    return index, e
+
+        tasks = [
+            create(index, draft)
+            for index, draft in enumerate(drafts)
+            if index not in invalid
+        ]
+        for completed, task in enumerate(asyncio.as_completed(tasks), len(invalid) + 1):
+            index, results[index] = await task
+            if on_progress:
+                on_progress(index, results[index], completed, len(drafts))
+
+        return results
+
+    async def get_document_download_link(self, document_id: str) -> models.IDocumentUrl:
+        """
+        Gets document's download link as IDocumentUrl
+        :param document_id: Green Invoice document id
+        :return: Returns the IDocumentUrl of a Green Invoice document
+        """
+
+        response, body = await self.request(
+            "GET",
+            self.document_path.format(document_id=document_id) + "/download/links",
+        )
+        return body
+
+    async def download_document(
+        self,
+        document_id: str,
+        dest: str,
+        lang: Union[models.DocumentLanguage, str] = "origin",
+        expected_sha256: Optional[str] = None,
+    ) -> DownloadResult:
+        """
+        Downloads a document's PDF, see DocumentResource.download_document
+        """
+        links = await self.get_document_download_link(document_id)
+        result = await self.client.download(
+            _document_link(links, document_id, lang),
+            document_file_path(dest, document_id),
+            expected_sha256=expected_sha256,
+        )
+        result.document_id = document_id
+        return result
+
+    async def download_documents(
+        self,
+        document_ids: Sequence[str],
+        dest_dir: str,
+        concurrency: int = 8,
+        lang: Union[models.DocumentLanguage, str] = "origin",
+        on_progress: Optional[Callable] = None,
+    ) -> DownloadReport:
+        """
+        Downloads many documents' PDFs concurrently, see DocumentResource.download_documents
+        """
+        os.makedirs(dest_dir, exist_ok=True)
+        document_ids = list(dict.fromkeys(document_ids))
+        results, errors = {}, {}
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def download(document_id):
+            async with semaphore:
+                try:
+                    return document_id, await self.download_document(
+                        document_id, dest_dir, lang
+                    )
+                except Exception as e:
+                    return document_id, e
+
+        tasks = [download(document_id) for document_id in document_ids]
+        for completed, task in enumerate(asyncio.as_completed(tasks), 1):
+            document_id, result = await task
+            if isinstance(result, Exception):
+                errors[document_id] = result
+            else:
+                results[document_id] = result
+            if on_progress:
+                on_progress(document_id, result, completed, len(document_ids))
+
+        return DownloadReport(results, errors, time.monotonic() - started)
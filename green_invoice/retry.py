@@ -0,0 +1,84 @@
+import random
+import time
+
+
+class RetryPolicy(object):
+    """
+    Exponential backoff with full jitter, bounded by a number of attempts and a total time budget
+    """
+
+    IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+    def __init__(
+        self,
+        max_attempts=3,
+        backoff_factor=0.5,
+        backoff_max=30,
+        jitter=True,
+        total_timeout=60,
+        retry_statuses=(429, 500, 502, 503, 504),
+        methods=IDEMPOTENT_METHODS,
+    ):
+        """
+        :param max_attempts: attempts per call, including the first one
+        :param backoff_factor: base delay in seconds, doubled on every attempt
+        :param backoff_max: upper bound of a single delay
+        :param jitter: randomize delays between 0 and the exponential backoff
+        :param total_timeout: seconds after which no more attempts are started
+        :param retry_statuses: HTTP status codes worth retrying
+        :param methods: HTTP methods retried automatically
+        """
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.total_timeout = total_timeout
+        self.retry_statuses = frozenset(retry_statuses)
+        self.methods = frozenset(m.upper() for m in methods)
+
+    def is_retryable(self, method, idempotent=None):
+        """
+        :param idempotent: overrides the method based decision, e.g. for POST searches
+        """
+        if idempotent is not None:
+            return idempotent
+        return method.upper() in self.methods
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        :param attempt: number of attempts made so far
+        :param retry_after: delay requested by the API, used as a lower bound
+        :return: seconds to wait before the next attempt
+        """
+        delay = min(self.backoff_max, self.backoff_factor * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def start(self):
+        """
+        :return: RetryState tracking the attempts of one call
+        """
+        return RetryState(self)
+
+
+class RetryState(object):
+    def __init__(self, policy):
+        self.policy = policy
+        self.attempts = 1
+        self.deadline = time.monotonic() + policy.total_timeout
+
+    def next_delay(self, retry_after=None):
+        """
+        Count another attempt
+        :return: seconds to wait before it, or None if attempts or time budget are exhausted
+        """
+        if self.attempts >= self.policy.max_attempts:
+            return None
+        delay = self.policy.backoff(self.attempts, retry_after)
+        if time.monotonic() + delay > self.deadline:
+            return None
+        self.attempts += 1
+        return delay
@@ -0,0 +1,258 @@
+import datetime
+import time
+
+from .resources import ClientResource, DocumentResource
+
+# Keys of a documents run's checkpoint only used while paging new documents
+_CREATED_KEYS = ("created_since", "created_last", "created_order")
+
+
+class SyncResult(object):
+    def __init__(self, entity, resumed=False):
+        self.entity = entity
+        # Whether the run continued from the checkpoint of an interrupted one
+        self.resumed = resumed
+        self.pages = 0
+        self.fetched = 0
+        self.inserted = 0
+        self.updated = 0
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return (
+            "<SyncResult {} pages={} fetched={} inserted={} updated={} "
+            "seconds={:.2f}{}>".format(
+                self.entity,
+                self.pages,
+                self.fetched,
+                self.inserted,
+                self.updated,
+                self.seconds,
+                " resumed" if self.resumed else "",
+            )
+        )
+
+
+class SyncEngine(object):
+    """
+    Incrementally syncs an account's documents and clients into a mirror.Mirror.
+
+    Documents are searched by `fromDate`/`toDate` windows sorted by creation date. A first
+    run scans from `start_date` on. Later runs first page through all documents newest
+    created first, until they reach the newest creation date already mirrored, so new
+    documents are fetched whatever their document date. Stopping there relies on the API
+    sorting by creation date newest first, which every page is checked against: once a
+    page contradicts it, or before two creation dates were seen in order, all documents
+    since `start_date` are paged through. Runs then scan the window from `lookback_days`
+    before the newest mirrored creation date, which catches status and open amount
+    changes of recent documents. Changes of older documents are picked up by
+    `rescan_documents`.
+    The client search has no date filter, so clients are scanned whole, but only new
+    clients and ones whose data changed are written.
+
+    Every fetched page is written together with a checkpoint of the run in one
+    transaction, so an interrupted run resumes after its last written page.
+    """
+
+    def __init__(
+        self,
+        mirror,
+        client=None,
+        page_size=100,
+        lookback_days=31,
+        window_days=92,
+        start_date="2000-01-01",
+    ):
+        """
+        :param mirror: Mirror to sync into
+        :param client: Client to use, defaults to the configured one
+        :param page_size: items per search page
+        :param lookback_days: days before the newest mirrored document to scan again
+        :param window_days: days of documents searched at once, bounds the page depth
+        :param start_date: earliest document date of the first run
+        """
+        self.mirror = mirror
+        """:type : .mirror.Mirror"""
+        self.documents = DocumentResource(client)
+        self.clients = ClientResource(self.documents.client)
+        self.page_size = page_size
+        self.lookback_days = lookback_days
+        self.window_days = window_days
+        self.start_date = start_date
+
+    def sync(self):
+        """
+        Sync documents and clients
+        :return: list of SyncResult
+        """
+        return [self.sync_documents(), self.sync_clients()]
+
+    # Documents
+
+    def sync_documents(self) -> SyncResult:
+        """
+        Fetch documents created or changed since the last run, or resume an interrupted run
+        """
+        run = self.mirror.get_run("documents")
+        if run is not None:
+            return self._run_documents(run, resumed=True)
+
+        high_water = self.mirror.high_water("documents")
+        if high_water is None:
+            return self._run_documents(self._documents_run(self.start_date, None))
+
+        from_date = datetime.date.fromtimestamp(high_water) - datetime.timedelta(
+            days=self.lookback_days
+        )
+        run = self._documents_run(from_date, None)
+        # New documents may be dated before the window, they're found by creation date
+        run["created_since"] = high_water
+        return self._run_documents(run)
+
+    def rescan_documents(self, from_date, to_date=None) -> SyncResult:
+        """
+        Fetch all documents of a date window again, replacing any unfinished run
+        :param from_date: first document date, a date or an ISO format string
+        :param to_date: last document date, by default today
+        """
+        run = self._documents_run(from_date, to_date)
+        self.mirror.save_run("documents", run)
+        return self._run_documents(run)
+
+    # noinspection PyMethodMayBeStatic
+    def _documents_run(self, from_date, to_date):
+        if isinstance(from_date, str):
+            from_date = datetime.date.fromisoformat(from_date)
+        if isinstance(to_date, str):
+            to_date = datetime.date.fromisoformat(to_date)
+        if to_date is None:
+            # One day ahead, in case the API's today is already tomorrow here
+            to_date = datetime.date.today() + datetime.timedelta(days=1)
+        return {
+            "to": to_date.isoformat(),
+            "window_from": from_date.isoformat(),
+            "page": 1,
+        }
+
+    def _run_documents(self, run, resumed=False):
+        result = SyncResult("documents", resumed)
+        started = time.monotonic()
+        to_date = datetime.date.fromisoformat(run["to"])
+
+        # Documents created since the last run, see the class docstring
+        while "created_since" in run:
+            body = self.documents.search_document(
+                {
+                    "fromDate": self.start_date,
+                    "toDate": run["to"],
+                    "sort": "creationDate",
+                    "page": run["page"],
+                    "pageSize": self.page_size,
+                }
+            )
+            items = (body or {}).get("items") or []
+
+            # "descending" once creation dates were seen decreasing, "unsorted" for good
+            # once one was seen increasing, checked across pages too
+            order = run.get("created_order")
+            last = run.get("created_last")
+            for item in items:
+                created = item.get("creationDate") or 0
+                if last is not None and order != "unsorted":
+                    if created > last:
+                        order = "unsorted"
+                    elif created < last:
+                        order = "descending"
+                last = created
+
+            if (
+                not items
+                or run["page"] >= ((body or {}).get("pages") or 0)
+                or (order == "descending" and last < run["created_since"])
+            ):
+                next_run = {
+                    key: value for key, value in run.items() if key not in _CREATED_KEYS
+                }
+                next_run["page"] = 1
+            else:
+                next_run = dict(
+                    run, page=run["page"] + 1, created_last=last, created_order=order
+                )
+
+            self._store_page("documents", items, next_run, result)
+            run = next_run
+
+        # Windows are scanned oldest first, so that the high water mark of an abandoned
+        # run never skips documents a later run would need
+        while run["window_from"] <= run["to"]:
+            window_from = datetime.date.fromisoformat(run["window_from"])
+            window_to = min(
+                window_from + datetime.timedelta(days=self.window_days - 1), to_date
+            )
+            body = self.documents.search_document(
+                {
+                    "fromDate": window_from.isoformat(),
+                    "toDate": window_to.isoformat(),
+                    "sort": "creationDate",
+                    "page": run["page"],
+                    "pageSize": self.page_size,
+                }
+            )
+            items = (body or {}).get("items") or []
+
+            if not items or run["page"] >= ((body or {}).get("pages") or 0):
+                next_run = dict(
+                    run,
+                    window_from=(window_to + datetime.timedelta(days=1)).isoformat(),
+                    page=1,
+                )
+            else:
+                next_run = dict(run, page=run["page"] + 1)
+
+            self._store_page("documents", items, next_run, result)
+            run = next_run
+
+        self.mirror.finish_run("documents")
+        result.seconds = time.monotonic() - started
+        return result
+
+    # Clients
+
+    def sync_clients(self) -> SyncResult:
+        """
+        Fetch all clients, writing new and changed ones, or resume an interrupted run
+        """
+        run = self.mirror.get_run("clients")
+        result = SyncResult("clients", resumed=run is not None)
+        started = time.monotonic()
+        if run is None:
+            run = {"page": 1}
+
+        while run is not None:
+            body = self.clients.search_client(
+                {"page": run["page"], "pageSize": self.page_size}
+            )
+            items = (body or {}).get("items") or []
+            done = not items or run["page"] >= ((body or {}).get("pages") or 0)
+            next_run = None if done else {"page": run["page"] + 1}
+
+            self._store_page("clients", items, next_run, result)
+            run = next_run
+
+        self.mirror.finish_run("clients")
+        result.seconds = time.monotonic() - started
+        return result
+
+    def _store_page(self, entity, items, next_run, result):
+        """
+        Write a page of entities and the checkpoint after it at once
+        """
+        with self.mirror.transaction():
+            inserted, updated = self.mirror.upsert(entity, items)
+            if next_run is not None:
+                self.mirror.save_run(entity, next_run)
+
+        result.pages += 1
+        result.fetched += len(items)
+        result.inserted += inserted
+        result.updated += updated
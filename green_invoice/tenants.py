@@ -0,0 +1,278 @@
+import collections
+import threading
+import time
+
+from .client import AsyncClient, Client
+from .exceptions import ImproperlyConfigured
+
+
+class ClientRegistry(object):
+    """
+    Hands out one Client per tenant, for applications working with many accounts.
+    All clients send their requests through one shared transport, so connections are
+    pooled across tenants, while every client keeps its own token cache.
+    Clients are created on first use and evicted least recently used first, when there
+    are more than `max_tenants` or after `idle_timeout` seconds without use. An evicted
+    tenant gets a new client, and token, on its next use.
+    """
+
+    client_class = Client
+
+    def __init__(
+        self,
+        credentials=None,
+        max_tenants=256,
+        idle_timeout=None,
+        transport=None,
+        pool_connections=10,
+        pool_maxsize=10,
+        timeout=30,
+        **client_options
+    ):
+        """
+        :param credentials: callable returning the Client arguments of a tenant, at least
+                            env, api_key_id and api_key_secret, for tenants that weren't
+                            registered
+        :param max_tenants: clients kept at most
+        :param idle_timeout: seconds after which an unused client is evicted, None to keep
+                             clients until max_tenants is reached
+        :param transport: Transport shared by all clients, or the name of one of
+                          transport.TRANSPORTS, see Client. A Transport instance is left
+                          open when the registry is closed.
+        :param timeout: seconds, None to wait forever, for a named transport
+        :param client_options: Client arguments common to all tenants, such as retry or
+                               metrics. Instances (a RateLimiter, a MetricsRegistry...) are
+                               shared by all tenants, dictionaries give each its own.
+        """
+        self.credentials = credentials
+        self.max_tenants = max_tenants
+        self.idle_timeout = idle_timeout
+        self.client_options = client_options
+        self.evictions = 0
+        self._transport = transport
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._timeout = timeout
+        self._shared = None
+        # Whether the registry created its shared transport or session, and closes it
+        self.owns_shared = True
+        self._configs = {}
+        # tenant -> (client, last used monotonic time), least recently used first
+        self._clients = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, tenant, **config):
+        """
+        :param config: Client arguments of the tenant, at least env, api_key_id and
+                       api_key_secret
+        """
+        with self._lock:
+            self._configs[tenant] = config
+            # Credentials may have changed
+            self._clients.pop(tenant, None)
+
+    def unregister(self, tenant):
+        with self._lock:
+            self._configs.pop(tenant, None)
+            self._clients.pop(tenant, None)
+
+    def get(self, tenant):
+        """
+        :return: the tenant's client
+        :raises ImproperlyConfigured: for a tenant without credentials
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(tenant)
+            if entry is not None:
+                self._clients.move_to_end(tenant)
+                client = entry[0]
+            else:
+                client = self._create(tenant)
+            self._clients[tenant] = (client, now)
+            while len(self._clients) > self.max_tenants:
+                self._clients.popitem(last=False)
+                self.evictions += 1
+        return client
+
+    __getitem__ = get
+
+    def _evict_idle(self, now):
+        if self.idle_timeout is None:
+            return
+        while self._clients:
+            tenant, (client, last_used) = next(iter(self._clients.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            del self._clients[tenant]
+            self.evictions += 1
+
+    def _config(self, tenant):
+        config = self._configs.get(tenant)
+        if config is None and self.credentials is not None:
+            config = self.credentials(tenant)
+        if config is None:
+            raise ImproperlyConfigured("No credentials for tenant {!r}".format(tenant))
+        return config
+
+    def _create(self, tenant):
+        options = dict(self.client_options, **self._config(tenant))
+        return self.client_class(**dict(options, **self._shared_options()))
+
+    def _shared_options(self):
+        # Deferred, so that importing the package doesn't import requests
+        from .transport import Transport, get_transport
+
+        if self._shared is None:
+            self.owns_shared = not isinstance(self._transport, Transport)
+            self._shared = get_transport(
+                self._transport,
+                pool_connections=self._pool_connections,
+                pool_maxsize=self._pool_maxsize,
+                timeout=self._timeout,
+            )
+        return {"transport": self._shared}
+
+    def __contains__(self, tenant):
+        return tenant in self._clients
+
+    def __len__(self):
+        return len(self._clients)
+
+    def tenants(self):
+        """
+        :return: tenants with a client, least recently used first
+        """
+        with self._lock:
+            return list(self._clients)
+
+    def pool_stats(self):
+        return self._shared.pool_stats() if self._shared is not None else {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Drop all clients and close the shared connections, unless the transport was
+        passed in
+        """
+        with self._lock:
+            self._clients.clear()
+            if self._shared is not None and self.owns_shared:
+                self._shared.close()
+            self._shared = None
+
+
+class AsyncClientRegistry(ClientRegistry):
+    """
+    ClientRegistry of AsyncClients sharing one httpx.AsyncClient
+    """
+
+    client_class = AsyncClient
+
+    def __init__(
+        self,
+        credentials=None,
+        max_tenants=256,
+        idle_timeout=None,
+        pool_maxsize=100,
+        pool_keepalive=20,
+        timeout=30,
+        **client_options
+    ):
+        super().__init__(
+            credentials,
+            max_tenants=max_tenants,
+            idle_timeout=idle_timeout,
+            pool_maxsize=pool_maxsize,
+            timeout=timeout,
+            **client_options
+        )
+        self._pool_keepalive = pool_keepalive
+
+    def _shared_options(self):
+        if self._shared is None:
+            try:
+                import httpx
+            except ImportError:
+                raise ImproperlyConfigured(
+                    "AsyncClient requires httpx. Please install green_invoice[async]."
+                )
+
+            self._shared = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self._pool_maxsize,
+                    max_keepalive_connections=self._pool_keepalive,
+                ),
+                timeout=self._timeout,
+            )
+        return {"session": self._shared, "pool_maxsize": self._pool_maxsize}
+
+    def pool_stats(self):
+        return {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        with self._lock:
+            self._clients.clear()
+            session, self._shared = self._shared, None
+        if session is not None:
+            await session.aclose()
+
+
+__registry__ = None
+
+
+def default():
+    """:rtype : ClientRegistry"""
+    global __registry__
+
+    if __registry__ is None:
+        raise ImproperlyConfigured(
+            "GreenInvoice tenants not configured yet. Please call green_invoice.tenants.configure()."
+        )
+
+    return __registry__
+
+
+def configure(**config):
+    """:rtype : ClientRegistry"""
+    global __registry__
+
+    __registry__ = ClientRegistry(**config)
+
+    return __registry__
+
+
+__async_registry__ = None
+
+
+def default_async():
+    """:rtype : AsyncClientRegistry"""
+    global __async_registry__
+
+    if __async_registry__ is None:
+        raise ImproperlyConfigured(
+            "GreenInvoice async tenants not configured yet. Please call green_invoice.tenants.configure_async()."
+        )
+
+    return __async_registry__
+
+
+def configure_async(**config):
+    """:rtype : AsyncClientRegistry"""
+    global __async_registry__
+
+    __async_registry__ = AsyncClientRegistry(**config)
+
+    return __async_registry__
@@ -0,0 +1,418 @@
+"""
+Transports sending the Client's HTTP requests.
+Kept out of client.py so that importing the package doesn't import requests.
+"""
+
+import datetime
+import threading
+import time
+from abc import ABC, abstractmethod
+from http import HTTPStatus
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .exceptions import ImproperlyConfigured
+from .metrics import HttpxTracer, current_trace, httpx_pool_stats, record_phase
+
+
+class BearerAuth(requests.auth.AuthBase):
+    def __init__(self, token):
+        self.token = token
+
+    def __call__(self, r):
+        r.headers["authorization"] = "Bearer " + self.token
+        return r
+
+
+class _TimedConnectionMixin(object):
+    """
+    Reports connect, send and time to first byte of urllib3 connections to the current trace
+    """
+
+    def connect(self):
+        started = time.monotonic()
+        try:
+            return super().connect()
+        finally:
+            record_phase("connect", time.monotonic() - started)
+
+    def request(self, *args, **kwargs):
+        if self.sock is None:
+            # Connect explicitly, so the handshake isn't counted as sending
+            self.connect()
+        started = time.monotonic()
+        try:
+            return super().request(*args, **kwargs)
+        finally:
+            record_phase("send", time.monotonic() - started)
+
+    def getresponse(self, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            return super().getresponse(*args, **kwargs)
+        finally:
+            record_phase("ttfb", time.monotonic() - started)
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedPoolMixin(object):
+    """
+    Reports the time spent waiting for a pooled connection to the current trace
+    """
+
+    def _get_conn(self, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            return super()._get_conn(*args, **kwargs)
+        finally:
+            record_phase("connect", time.monotonic() - started)
+
+
+class _TimedHTTPConnectionPool(_TimedPoolMixin, HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(_TimedPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class InstrumentedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connection pools report their phases to the current RequestTrace
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+    def pool_stats(self):
+        """
+        :return: dictionary of connections in use and maximum pooled connections
+        """
+        in_use = maxsize = 0
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            queue = getattr(pool, "pool", None)
+            if queue is None:
+                continue
+            # Free slots are kept in the queue, either as idle connections or None
+            maxsize += queue.maxsize
+            in_use += queue.maxsize - queue.qsize()
+        return {"in_use": in_use, "max": maxsize}
+
+
+class Request(object):
+    """
+    HTTP request as handed to a Transport
+    """
+
+    def __init__(self, method, url, headers=None, body=None):
+        self.method = method
+        self.url = url
+        self.headers = headers or {}
+        self.body = body
+
+
+class Response(object):
+    """
+    Minimal response, with the attributes of requests.Response the Client relies on
+    """
+
+    def __init__(
+        self, status_code, headers=None, content=b"", request=None, elapsed=None
+    ):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.content = content
+        self.request = request
+        self.url = request.url if request is not None else None
+        self.elapsed = elapsed or datetime.timedelta()
+
+    @property
+    def reason(self):
+        try:
+            return HTTPStatus(self.status_code).phrase
+        except ValueError:
+            return ""
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+
+class StreamedResponse(object):
+    """
+    Response whose body is read in chunks, close it (or use it as a context manager) to
+    release its connection
+    """
+
+    def __init__(self, status_code, headers, chunks, close=None):
+        """
+        :param chunks: iterator of the body's byte chunks
+        """
+        self.status_code = status_code
+        self.headers = headers
+        self.chunks = chunks
+        self._close = close
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._close is not None:
+            self._close()
+
+
+class Transport(ABC):
+    """
+    Sends the Client's HTTP requests.
+    Responses are returned with their body read, and expose status_code, headers (case
+    insensitive), content, text and elapsed like requests.Response does.
+    """
+
+    name = None
+
+    # Exceptions raised by `send` when the request didn't get through, those are retried
+    connection_errors = ()
+
+    @abstractmethod
+    def send(self, request):
+        """
+        :param request: Request
+        :return: the response, with its body read
+        """
+        pass
+
+    def stream(self, request, chunk_size=65536):
+        """
+        Send a request without reading its response body, e.g. to download a file
+        :rtype : StreamedResponse
+        """
+        # Transports that can't stream read the whole body
+        response = self.send(request)
+        content = response.content
+        return StreamedResponse(
+            response.status_code,
+            response.headers,
+            (content[i : i + chunk_size] for i in range(0, len(content), chunk_size)),
+        )
+
+    def pool_stats(self):
+        """
+        :return: dictionary of connections in use and maximum pooled connections
+        """
+        return {}
+
+    def close(self):
+        """
+        Close pooled connections
+        """
+        pass
+
+
+class RequestsTransport(Transport):
+    """
+    HTTP/1.1 transport over long-lived requests.Sessions, so keep-alive connections
+    (and their TLS handshakes) are reused across calls.
+    requests.Session isn't thread-safe, so every thread gets its own, all mounting one
+    adapter whose urllib3 pools are shared, and thread-safe.
+    """
+
+    name = "requests"
+    connection_errors = (
+        requests.ConnectionError,
+        requests.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+    )
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, timeout=30):
+        """
+        :param pool_connections: number of hosts to keep connection pools for
+        :param pool_maxsize: connections kept per host
+        :param timeout: seconds to wait for a connection and between received bytes,
+                        None to wait forever
+        """
+        self.adapter = InstrumentedHTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        """
+        :return: the current thread's requests.Session
+        """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self.adapter)
+            session.mount("http://", self.adapter)
+            self._local.session = session
+        return session
+
+    def send(self, request):
+        prepared = requests.Request(
+            request.method, request.url, request.headers, data=request.body
+        ).prepare()
+        response = self.session.send(prepared, stream=True, timeout=self.timeout)
+        started = time.monotonic()
+        response.content
+        record_phase("read", time.monotonic() - started)
+        return response
+
+    def stream(self, request, chunk_size=65536):
+        prepared = requests.Request(
+            request.method, request.url, request.headers, data=request.body
+        ).prepare()
+        response = self.session.send(prepared, stream=True, timeout=self.timeout)
+        return StreamedResponse(
+            response.status_code,
+            response.headers,
+            response.iter_content(chunk_size),
+            response.close,
+        )
+
+    def pool_stats(self):
+        return self.adapter.pool_stats()
+
+    def close(self):
+        # Closes the shared pools, which is all the sessions hold on to
+        self.adapter.close()
+
+
+class HTTP2Transport(Transport):
+    """
+    HTTP/2 transport backed by httpx. Concurrent calls, e.g. from `create_many` or
+    prefetching iterators, are multiplexed as streams over a few connections instead of
+    taking a connection each.
+    Requires httpx with HTTP/2 support (pip install green_invoice[http2]).
+    """
+
+    name = "http2"
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, timeout=30):
+        """
+        :param pool_connections: ignored, httpx pools connections of all hosts together
+        :param pool_maxsize: maximum open connections
+        :param timeout: seconds, None to wait forever
+        """
+        try:
+            import h2  # noqa: F401
+            import httpx
+        except ImportError:
+            raise ImproperlyConfigured(
+                "The http2 transport requires httpx and h2. Please install green_invoice[http2]."
+            )
+        self.connection_errors = (httpx.TransportError,)
+        self.pool_maxsize = pool_maxsize
+        self.client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize
+            ),
+            timeout=timeout,
+        )
+
+    def send(self, request):
+        trace = current_trace()
+        r = self.client.build_request(
+            request.method,
+            request.url,
+            headers=request.headers,
+            content=request.body,
+            extensions={"trace": HttpxTracer(trace)} if trace else None,
+        )
+        response = self.client.send(r, stream=True)
+        started = time.monotonic()
+        try:
+            response.read()
+        finally:
+            response.close()
+        record_phase("read", time.monotonic() - started)
+        return response
+
+    def stream(self, request, chunk_size=65536):
+        r = self.client.build_request(
+            request.method, request.url, headers=request.headers, content=request.body
+        )
+        response = self.client.send(r, stream=True)
+        return StreamedResponse(
+            response.status_code,
+            response.headers,
+            response.iter_bytes(chunk_size),
+            response.close,
+        )
+
+    def pool_stats(self):
+        return httpx_pool_stats(self.client, self.pool_maxsize)
+
+    def close(self):
+        self.client.close()
+
+
+class InProcessTransport(Transport):
+    """
+    Transport handing requests to a function in the same process instead of the network,
+    for tests and benchmarks
+    """
+
+    name = "inprocess"
+
+    def __init__(self, handler):
+        """
+        :param handler: callable as handler(request) returning a tuple of status code,
+                        headers dictionary and body bytes
+        """
+        self.handler = handler
+
+    def send(self, request):
+        started = time.monotonic()
+        status_code, headers, content = self.handler(request)
+        return Response(
+            status_code,
+            headers,
+            content or b"",
+            request=request,
+            elapsed=datetime.timedelta(seconds=time.monotonic() - started),
+        )
+
+
+TRANSPORTS = {
+    RequestsTransport.name: RequestsTransport,
+    HTTP2Transport.name: HTTP2Transport,
+}
+
+
+def get_transport(transport=None, **options):
+    """
+    :param transport: a Transport, one of the TRANSPORTS names, or None for the requests
+                      transport
+    :param options: arguments of the transport class when given by name
+    :rtype : Transport
+    """
+    if isinstance(transport, Transport):
+        return transport
+    if transport is None:
+        transport = RequestsTransport.name
+    if transport not in TRANSPORTS:
+        raise ValueError("transport not in {0}".format(list(TRANSPORTS)))
+    return TRANSPORTS[transport](**options)
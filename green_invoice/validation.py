@@ -0,0 +1,212 @@
+import datetime
+import decimal
+import enum
+import functools
+import typing
+
+from . import models
+from .exceptions import ValidationError
+
+# Fields the API rejects a new entity without
+REQUIRED = {
+    models.IDocumentDraft: ("type",),
+    models.IClientDraft: ("name",),
+}
+
+
+def _is_typed_dict(hint):
+    return (
+        isinstance(hint, type)
+        and issubclass(hint, dict)
+        and hasattr(hint, "__annotations__")
+    )
+
+
+def _describe(hint):
+    return getattr(hint, "__name__", None) or str(hint).replace("typing.", "")
+
+
+# Paths to checked values are linked (parent, field or index) pairs, only rendered for
+# error messages
+def _path(path):
+    parts = []
+    while path:
+        path, key = path
+        parts.append("[{}]".format(key) if isinstance(key, int) else "." + key)
+    return "".join(reversed(parts)).lstrip(".") or "value"
+
+
+def _type_checker(types, expected):
+    def check(value, path, errors):
+        # bool is an int, but never a valid number here
+        if not isinstance(value, types) or (
+            isinstance(value, bool) and bool not in types
+        ):
+            errors.append(
+                "{}: expected {}, got {}".format(
+                    _path(path), expected, type(value).__name__
+                )
+            )
+
+    return check
+
+
+def _choice_checker(allowed, expected):
+    def check(value, path, errors):
+        try:
+            valid = not isinstance(value, bool) and value in allowed
+        except TypeError:
+            # Unhashable, such as a list
+            valid = False
+        if not valid:
+            errors.append(
+                "{}: {!r} is not a valid {}".format(_path(path), value, expected)
+            )
+
+    return check
+
+
+def _list_checker(item_check):
+    def check(value, path, errors):
+        if not isinstance(value, (list, tuple)):
+            errors.append(
+                "{}: expected a list, got {}".format(_path(path), type(value).__name__)
+            )
+            return
+        if item_check is not None:
+            for index, item in enumerate(value):
+                item_check(item, (path, index), errors)
+
+    return check
+
+
+def _is_date_field(field):
+    return field == "date" or (field is not None and field.endswith("Date"))
+
+
+def _compile(hint, strict, field=None):
+    """
+    Values the JSON codec encodes for a type are accepted as well, see codec._default
+    :param field: name of the field the hint annotates
+    :return: function checking a value against a type hint as check(value, path, errors),
+             or None when any value is fine
+    """
+    if _is_typed_dict(hint):
+        return compile_validator(hint, strict).check
+    if isinstance(hint, type) and issubclass(hint, enum.Enum):
+        # Members as well as their raw values
+        allowed = frozenset(hint) | frozenset(member.value for member in hint)
+        return _choice_checker(allowed, hint.__name__)
+    if hint in (int, float):
+        # The API takes either for its numbers
+        return _type_checker((int, float, decimal.Decimal), "a number")
+    if hint is str and _is_date_field(field):
+        # Encoded as ISO format dates
+        return _type_checker((str, datetime.date), "a date")
+    if hint in (str, bool, dict):
+        return _type_checker((hint,), hint.__name__)
+    if hint is list:
+        return _list_checker(None)
+
+    origin = typing.get_origin(hint)
+    if origin is list:
+        (item_hint,) = typing.get_args(hint) or (typing.Any,)
+        return _list_checker(_compile(item_hint, strict))
+    if origin is typing.Literal:
+        return _choice_checker(frozenset(typing.get_args(hint)), _describe(hint))
+    return None
+
+
+class Validator(object):
+    """
+    Checks dictionaries against a TypedDict of models.py, compiled once from its
+    annotations, see compile_validator.
+    Fields are optional and may be None. Enum fields take members or raw values, number
+    fields take ints, floats or Decimals, and date fields ISO format strings, dates or
+    datetimes.
+    """
+
+    def __init__(self, typed_dict, strict=False):
+        """
+        :param strict: report fields the TypedDict doesn't have
+        """
+        self.typed_dict = typed_dict
+        self.strict = strict
+        # field -> check function, None for fields taking any value
+        self.checks = {
+            field: _compile(hint, strict, field)
+            for field, hint in typing.get_type_hints(typed_dict).items()
+        }
+
+    def check(self, value, path, errors):
+        if not isinstance(value, dict):
+            errors.append(
+                "{}: expected {}, got {}".format(
+                    _path(path), self.typed_dict.__name__, type(value).__name__
+                )
+            )
+            return
+        checks = self.checks
+        for field, field_value in value.items():
+            try:
+                check = checks[field]
+            except KeyError:
+                if self.strict:
+                    errors.append("{}: unknown field".format(_path((path, field))))
+                continue
+            if check is not None and field_value is not None:
+                check(field_value, (path, field), errors)
+
+    def errors(self, value, required=()):
+        """
+        :param required: fields that must be present and not None
+        :return: list of error messages, empty when the value is valid
+        """
+        errors = []
+        if isinstance(value, dict):
+            for field in required:
+                if value.get(field) is None:
+                    errors.append("{}: required".format(field))
+        self.check(value, None, errors)
+        return errors
+
+    def validate(self, value, required=()):
+        """
+        :raises ValidationError: listing every problem of the value
+        """
+        errors = self.errors(value, required)
+        if errors:
+            raise ValidationError(errors)
+
+    def validate_many(self, values, required=()):
+        """
+        Validate a batch without stopping at the first invalid value
+        :return: dictionary of the index of every invalid value to its ValidationError
+        """
+        invalid = {}
+        for index, value in enumerate(values):
+            errors = self.errors(value, required)
+            if errors:
+                invalid[index] = ValidationError(errors)
+        return invalid
+
+
+@functools.lru_cache(maxsize=None)
+def compile_validator(typed_dict, strict=False) -> Validator:
+    """
+    :param typed_dict: TypedDict of models.py
+    :return: the Validator of the TypedDict, compiled on first use
+    """
+    # Nested TypedDicts are compiled through this cache as well
+    return Validator(typed_dict, strict=strict)
+
+
+def validate_draft(typed_dict, draft, new=True):
+    """
+    Validate a draft before it's sent to the API
+    :param typed_dict: models.IDocumentDraft or models.IClientDraft
+    :param new: whether the draft creates an entity, which needs the REQUIRED fields
+    :raises ValidationError: listing every problem of the draft
+    """
+    required = REQUIRED.get(typed_dict, ()) if new else ()
+    compile_validator(typed_dict).validate(draft, required)
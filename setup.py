@@ -28,6 +28,12 @@ setup(
     long_description_content_type="text/markdown",
     packages=find_packages(),
     install_requires=requires,
+    extras_require={
+        "async": ["httpx"],
+        "fast": ["orjson"],
+        "http2": ["httpx[http2]"],
+        "numpy": ["numpy"],
+    },
     setup_requires=requires,
     # For a list of valid classifiers, see https://pypi.org/classifiers/
     classifiers=[  # Optional
@@ -0,0 +1,90 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"
+    ),
+)
+
+from mock_server import API_PREFIX, MockGreenInvoice  # noqa: E402
+
+from green_invoice import auth, cache, circuit, ratelimit  # noqa: E402
+from green_invoice.client import AsyncClient, Client  # noqa: E402
+from green_invoice.transport import InProcessTransport, Request  # noqa: E402
+
+API_URL = "http://mock" + API_PREFIX
+
+# Fast retries, with enough attempts to get through the injected errors
+RETRY = {"max_attempts": 10, "backoff_factor": 0.001, "jitter": False}
+
+
+def mock_client(handler, **options):
+    """
+    :param handler: InProcessTransport handler, usually a MockGreenInvoice's handle_request
+    """
+    client_class = type("MockClient", (Client,), {"ENDPOINTS": {"sandbox": API_URL}})
+    return client_class(
+        "sandbox",
+        "api-key-id",
+        "api-key-secret",
+        transport=InProcessTransport(handler),
+        **dict({"retry": RETRY}, **options)
+    )
+
+
+def mock_async_client(handler, **options):
+    import httpx
+
+    def send(request):
+        status_code, headers, content = handler(
+            Request(request.method, str(request.url), request.headers, request.content)
+        )
+        return httpx.Response(status_code, headers=headers, content=content)
+
+    client_class = type(
+        "MockAsyncClient", (AsyncClient,), {"ENDPOINTS": {"sandbox": API_URL}}
+    )
+    return client_class(
+        "sandbox",
+        "api-key-id",
+        "api-key-secret",
+        session=httpx.AsyncClient(transport=httpx.MockTransport(send)),
+        **dict({"retry": RETRY}, **options)
+    )
+
+
+@pytest.fixture
+def api():
+    return MockGreenInvoice()
+
+
+class FakeClock(object):
+    """
+    Stands in for the time module, time only passes when told to
+    """
+
+    def __init__(self, now=1700000000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    advance = sleep
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    for module in (auth, cache, circuit, ratelimit):
+        monkeypatch.setattr(module, "time", clock)
+    return clock
@@ -0,0 +1,142 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+
+import pytest
+
+from green_invoice.auth import AsyncTokenCache, TokenCache, decode_jwt_expiry
+from green_invoice.exceptions import APIError
+from green_invoice.resources import ClientResource
+
+from conftest import mock_client
+
+
+def jwt(exp):
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode("utf-8"))
+    return "header.{}.signature".format(payload.rstrip(b"=").decode("ascii"))
+
+
+def test_decode_jwt_expiry():
+    assert decode_jwt_expiry(jwt(1700000300)) == 1700000300
+    assert decode_jwt_expiry("not a token") is None
+    assert decode_jwt_expiry(None) is None
+
+
+def test_token_is_refreshed_before_it_expires(clock):
+    fetched = []
+
+    def fetch_token():
+        fetched.append(jwt(clock.now + 300))
+        return fetched[-1]
+
+    cache = TokenCache(fetch_token, refresh_margin=60)
+
+    assert cache.get() == cache.get() == fetched[0]
+    clock.advance(239)
+    assert cache.get() == fetched[0]
+    clock.advance(1)
+    assert cache.get() == fetched[1]
+    assert cache.stats["refreshes"] == 2
+    assert cache.stats["hits"] == 2
+
+
+def test_token_is_kept_for_half_its_lifetime_at_least(clock):
+    tokens = iter([jwt(clock.now + 100), "opaque", "opaque"])
+    cache = TokenCache(lambda: next(tokens), refresh_margin=60, default_ttl=300)
+
+    cache.get()
+    clock.advance(49)
+    cache.get()
+    assert cache.stats["refreshes"] == 1
+    clock.advance(1)
+    cache.get()
+    assert cache.stats["refreshes"] == 2
+    # Without an exp claim the token is assumed to last default_ttl
+    clock.advance(239)
+    cache.get()
+    assert cache.stats["refreshes"] == 2
+    clock.advance(1)
+    cache.get()
+    assert cache.stats["refreshes"] == 3
+
+
+def test_concurrent_threads_refresh_once():
+    fetched = []
+    start = threading.Barrier(16)
+
+    def fetch_token():
+        fetched.append(None)
+        time.sleep(0.05)
+        return jwt(time.time() + 300)
+
+    cache = TokenCache(fetch_token)
+
+    def get():
+        start.wait()
+        return cache.get()
+
+    threads = [threading.Thread(target=get) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(fetched) == 1
+
+
+def test_concurrent_tasks_refresh_once():
+    fetched = []
+
+    async def fetch_token():
+        fetched.append(None)
+        await asyncio.sleep(0.05)
+        return jwt(time.time() + 300)
+
+    async def get_all():
+        cache = AsyncTokenCache(fetch_token)
+        return await asyncio.gather(*[cache.get() for _ in range(16)])
+
+    tokens = asyncio.run(get_all())
+
+    assert len(set(tokens)) == 1
+    assert len(fetched) == 1
+
+
+def reject_calls(api, count):
+    """
+    :return: handler answering the first `count` API calls with a 401, as for a revoked
+             token, and the list of token requests
+    """
+    rejected = [0]
+    token_requests = []
+
+    def handler(request):
+        if request.url.endswith("/account/token"):
+            token_requests.append(request)
+        elif rejected[0] < count:
+            rejected[0] += 1
+            return 401, {"Content-Type": "application/json"}, b'{"errorCode": 401}'
+        return api.handle_request(request)
+
+    return handler, token_requests
+
+
+def test_revoked_token_is_refreshed_once(api):
+    client = api.add_client({"name": "Acme"})
+    handler, token_requests = reject_calls(api, 1)
+    resource = ClientResource(mock_client(handler, retry=False))
+
+    assert resource.find_by_client_id(client["id"])["name"] == "Acme"
+    assert len(token_requests) == 2
+
+
+def test_rejected_token_is_not_refreshed_again(api):
+    client = api.add_client({"name": "Acme"})
+    handler, token_requests = reject_calls(api, 3)
+    resource = ClientResource(mock_client(handler, retry=False))
+
+    with pytest.raises(APIError):
+        resource.find_by_client_id(client["id"])
+    assert len(token_requests) == 2
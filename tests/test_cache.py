@@ -0,0 +1,100 @@
+import pytest
+
+from green_invoice.cache import MemoryCache
+from green_invoice.exceptions import APIError
+from green_invoice.resources import ClientResource, DocumentResource
+
+from conftest import mock_client
+from test_resources import DRAFT
+
+
+def counting(api):
+    """
+    :return: handler passing requests on to the mock API, and the list of requests sent
+    """
+    requests = []
+
+    def handler(request):
+        requests.append((request.method, request.url.split("/v1/", 1)[1]))
+        return api.handle_request(request)
+
+    return handler, requests
+
+
+def test_memory_cache_expires_entries(clock):
+    cache = MemoryCache(ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=10)
+
+    clock.advance(10)
+    assert cache.get("b") == 2
+    clock.advance(0.001)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    clock.advance(50)
+    assert cache.get("a") is None
+    assert cache.stats["expirations"] == 2
+
+
+def test_memory_cache_evicts_the_least_recently_used(clock):
+    cache = MemoryCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.stats["evictions"] == 1
+
+
+def test_resource_serves_cached_entities_until_they_expire(api, clock):
+    client = api.add_client({"name": "Acme"})
+    handler, requests = counting(api)
+    resource = ClientResource(mock_client(handler), cache=MemoryCache(), cache_ttl=30)
+
+    for _ in range(3):
+        assert resource.find_by_client_id(client["id"])["name"] == "Acme"
+    clock.advance(31)
+    resource.find_by_client_id(client["id"])
+
+    assert requests.count(("GET", "clients/" + client["id"])) == 2
+
+
+def test_cached_entities_are_copies(api, clock):
+    client = api.add_client({"name": "Acme", "emails": ["a@acme.com"]})
+    resource = ClientResource(mock_client(api.handle_request), cache=MemoryCache())
+
+    fetched = resource.find_by_client_id(client["id"])
+    fetched["name"] = "Changed"
+    cached = resource.find_by_client_id(client["id"])
+    cached["emails"].append("b@acme.com")
+
+    assert resource.find_by_client_id(client["id"]) == dict(
+        client, name="Acme", emails=["a@acme.com"]
+    )
+
+
+def test_update_and_delete_invalidate_the_cached_client(api, clock):
+    client = api.add_client({"name": "Acme"})
+    resource = ClientResource(mock_client(api.handle_request), cache=MemoryCache())
+    resource.find_by_client_id(client["id"])
+
+    resource.update(client["id"], {"name": "Acme Ltd"})
+    assert resource.find_by_client_id(client["id"])["name"] == "Acme Ltd"
+
+    resource.delete(client["id"])
+    with pytest.raises(APIError):
+        resource.find_by_client_id(client["id"])
+
+
+def test_associating_documents_invalidates_them(api, clock):
+    client = api.add_client({"name": "Acme"})
+    document = api.add_document(DRAFT)
+    cache = MemoryCache()
+    documents = DocumentResource(mock_client(api.handle_request), cache=cache)
+    clients = ClientResource(documents.client, cache=cache)
+    documents.find_by_document_id(document["id"])
+
+    clients.associate_documents(client["id"], [document["id"]])
+
+    assert documents.find_by_document_id(document["id"])["client"]["id"] == client["id"]
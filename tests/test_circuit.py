@@ -0,0 +1,156 @@
+import pytest
+
+from green_invoice.circuit import CLOSED, HALF_OPEN, OPEN, Circuit, CircuitBreaker
+from green_invoice.exceptions import CircuitOpenError
+
+
+def call(circuit, status_code=200):
+    with circuit.call((ConnectionError,)) as admitted:
+        admitted.status_code = status_code
+
+
+def open_circuit(**options):
+    circuit = Circuit(
+        "/v1/documents", **dict({"min_calls": 2, "reset_timeout": 30}, **options)
+    )
+    call(circuit, 503)
+    call(circuit, 503)
+    assert circuit.state == OPEN
+    return circuit
+
+
+def test_opens_once_failures_reach_the_threshold(clock):
+    circuit = Circuit("/v1/documents", window=4, min_calls=4, failure_threshold=0.5)
+
+    call(circuit, 503)
+    call(circuit, 503)
+    call(circuit)
+    assert circuit.state == CLOSED  # Fewer than min_calls
+    call(circuit, 404)
+    assert circuit.state == OPEN
+    assert circuit.opened == 1
+
+
+def test_only_counts_the_window(clock):
+    circuit = Circuit("/v1/documents", window=4, min_calls=4, failure_threshold=0.5)
+
+    for status_code in (503, 200, 200, 200, 200, 503, 200, 200):
+        call(circuit, status_code)
+
+    assert circuit.state == CLOSED
+    assert circuit.stats["failures"] == 1
+
+
+def test_connection_errors_and_slow_calls_fail(clock):
+    circuit = Circuit("/v1/documents", min_calls=3, slow_call_seconds=5)
+
+    with pytest.raises(ConnectionError):
+        with circuit.call((ConnectionError,)):
+            raise ConnectionError()
+    with pytest.raises(ValueError):
+        with circuit.call((ConnectionError,)):
+            raise ValueError()  # Not a connection error, doesn't count
+    with circuit.call((ConnectionError,)) as admitted:
+        clock.advance(5)
+        admitted.status_code = 200
+    assert circuit.stats["calls"] == 2
+    call(circuit)
+
+    assert circuit.state == OPEN
+
+
+def test_fails_fast_while_open(clock):
+    circuit = open_circuit()
+    clock.advance(10)
+
+    with pytest.raises(CircuitOpenError) as raised:
+        call(circuit)
+    assert raised.value.endpoint == "/v1/documents"
+    assert raised.value.retry_after == 20
+    with pytest.raises(CircuitOpenError):
+        circuit.check()
+    assert circuit.rejected == 2
+
+
+def test_half_open_after_the_reset_timeout_lets_probes_through(clock):
+    circuit = open_circuit(half_open_probes=2)
+    clock.advance(29)
+    assert circuit.state == OPEN
+    clock.advance(1)
+    assert circuit.state == HALF_OPEN
+
+    first = circuit.call()
+    second = circuit.call()
+    with pytest.raises(CircuitOpenError) as raised:
+        circuit.call()
+    assert raised.value.retry_after == 0
+
+    with first:
+        first.status_code = 200
+    assert circuit.state == HALF_OPEN
+    with second:
+        second.status_code = 200
+    assert circuit.state == CLOSED
+
+
+def test_a_failed_probe_opens_the_circuit_again(clock):
+    circuit = open_circuit(half_open_probes=2)
+    clock.advance(30)
+
+    call(circuit)
+    call(circuit, 503)
+
+    assert circuit.state == OPEN
+    assert circuit.opened == 2
+    with pytest.raises(CircuitOpenError) as raised:
+        circuit.check()
+    assert raised.value.retry_after == 30
+
+
+def test_a_probe_failing_otherwise_frees_its_slot(clock):
+    circuit = open_circuit()
+    clock.advance(30)
+
+    with pytest.raises(ValueError):
+        with circuit.call((ConnectionError,)):
+            raise ValueError()
+    call(circuit)
+
+    assert circuit.state == CLOSED
+
+
+def test_breaker_has_a_circuit_per_endpoint_and_notifies_hooks(clock):
+    changes = []
+    breaker = CircuitBreaker(
+        endpoints={"/v1/documents": {"min_calls": 1}},
+        min_calls=100,
+        reset_timeout=30,
+        hooks=[lambda *change: changes.append(change)],
+    )
+    later = []
+
+    def hook(*change):
+        later.append(change)
+
+    breaker.add_hook(hook)
+
+    call(breaker.circuit_for("/v1/documents/abc123"), 503)
+    call(breaker.circuit_for("/v1/clients/abc123"), 503)
+    assert breaker.state("/v1/documents/def456") == OPEN
+    assert breaker.state("/v1/clients/def456") == CLOSED
+    clock.advance(30)
+    breaker.check("/v1/documents/abc123")
+    call(breaker.circuit_for("/v1/documents/abc123"))
+
+    assert changes == [
+        ("/v1/documents/{id}", CLOSED, OPEN),
+        ("/v1/documents/{id}", OPEN, HALF_OPEN),
+        ("/v1/documents/{id}", HALF_OPEN, CLOSED),
+    ]
+    assert later == changes
+    assert set(breaker.stats) == {"/v1/documents/{id}", "/v1/clients/{id}"}
+
+    breaker.remove_hook(hook)
+    call(breaker.circuit_for("/v1/documents/abc123"), 503)
+    assert changes[-1] == ("/v1/documents/{id}", CLOSED, OPEN)
+    assert len(later) == 3
@@ -0,0 +1,34 @@
+import pytest
+import requests
+
+from mock_server import API_PREFIX, start_server
+
+from green_invoice.client import Client
+from green_invoice.exceptions import CircuitOpenError
+from green_invoice.resources import ClientResource
+
+
+def test_hung_calls_time_out_and_open_the_circuit(api):
+    server = start_server(api)
+    client_class = type(
+        "MockClient", (Client,), {"ENDPOINTS": {"sandbox": api.base_url + API_PREFIX}}
+    )
+    client = client_class(
+        "sandbox",
+        "api-key-id",
+        "api-key-secret",
+        retry=False,
+        circuit_breaker={"min_calls": 1, "reset_timeout": 60},
+        timeout=0.2,
+    )
+    try:
+        clients = ClientResource(client)
+        created = clients.create({"name": "Acme"})
+        api.latency = 1
+        with pytest.raises(requests.Timeout):
+            clients.find_by_client_id(created["id"])
+        with pytest.raises(CircuitOpenError):
+            clients.find_by_client_id(created["id"])
+    finally:
+        client.close()
+        server.shutdown()
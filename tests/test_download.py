@@ -0,0 +1,96 @@
+import os
+
+import pytest
+import requests
+
+from mock_server import API_PREFIX, DROP_AFTER_HEADER, pdf_bytes, start_server
+
+from green_invoice.client import Client
+from green_invoice.resources import DocumentResource
+
+from conftest import RETRY
+from test_resources import DRAFT
+
+
+class DroppingAPI(object):
+    """
+    Drops the connection halfway through the next `drops` file downloads
+    """
+
+    def __init__(self, api, drops):
+        self.api = api
+        self.drops = drops
+
+    def handle(self, method, path, headers, body):
+        status, response_headers, content = self.api.handle(method, path, headers, body)
+        if "/files/" in path and self.drops:
+            self.drops -= 1
+            response_headers[DROP_AFTER_HEADER] = str(len(content) // 2)
+        return status, response_headers, content
+
+    def __getattr__(self, name):
+        return getattr(self.api, name)
+
+
+@pytest.fixture
+def server(api):
+    # Several chunks, so that whole ones are written before a connection is dropped
+    api.pdf_size = 2**20
+    dropping = DroppingAPI(api, 0)
+    server = start_server(dropping)
+    api.base_url = dropping.base_url
+    yield dropping
+    server.shutdown()
+
+
+def documents(server, **options):
+    client_class = type(
+        "MockClient",
+        (Client,),
+        {"ENDPOINTS": {"sandbox": server.base_url + API_PREFIX}},
+    )
+    client = client_class(
+        "sandbox", "api-key-id", "api-key-secret", **dict({"retry": RETRY}, **options)
+    )
+    return DocumentResource(client)
+
+
+def test_download_into_a_new_directory(server, tmp_path):
+    document = server.api.add_document(DRAFT)
+    dest = str(tmp_path / "invoices") + os.sep
+
+    result = documents(server).download_document(document["id"], dest)
+
+    assert result.path == os.path.join(dest, document["id"] + ".pdf")
+    with open(result.path, "rb") as f:
+        assert f.read() == pdf_bytes(document["id"], "origin", server.pdf_size)
+
+
+def test_interrupted_download_resumes(server, tmp_path):
+    document = server.api.add_document(DRAFT)
+    server.drops = 1
+    resource = documents(server, retry=False)
+
+    with pytest.raises(requests.RequestException):
+        resource.download_document(document["id"], str(tmp_path))
+    path = tmp_path / (document["id"] + ".pdf")
+    assert not path.exists()
+    assert os.path.getsize(str(path) + ".part") == server.pdf_size // 2
+
+    result = resource.download_document(document["id"], str(tmp_path))
+
+    assert result.resumed_from == server.pdf_size // 2
+    assert path.read_bytes() == pdf_bytes(document["id"], "origin", server.pdf_size)
+    assert not os.path.exists(str(path) + ".part")
+
+
+def test_retried_download_resumes(server, tmp_path):
+    document = server.api.add_document(DRAFT)
+    server.drops = 2
+
+    result = documents(server).download_document(document["id"], str(tmp_path))
+
+    assert result.attempts == 3
+    assert result.resumed_from == server.pdf_size * 3 // 4
+    with open(result.path, "rb") as f:
+        assert f.read() == pdf_bytes(document["id"], "origin", server.pdf_size)
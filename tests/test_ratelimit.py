@@ -0,0 +1,103 @@
+from green_invoice.ratelimit import (
+    RateLimiter,
+    TokenBucket,
+    parse_rate_limit_reset,
+    parse_retry_after,
+)
+
+
+def test_bucket_refills_at_its_rate(clock):
+    bucket = TokenBucket(rate=2, burst=2)
+
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0.5]
+    assert bucket.reserve() == 1.0  # Queued behind the previous caller
+    clock.advance(1)
+    assert bucket.reserve() == 0.5
+    clock.advance(10)
+    # Refilled up to the burst only
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0.5]
+    assert bucket.stats["waited_seconds_total"] == 2.5
+
+
+def test_rate_increases_additively_up_to_the_ceiling(clock):
+    bucket = TokenBucket(rate=2, max_rate=3)
+
+    bucket.on_success()
+    assert bucket.rate == 2.5
+    bucket.on_success()
+    assert bucket.rate == 2.9
+    bucket.on_success()
+    assert bucket.rate == 3
+
+
+def test_rate_decreases_multiplicatively_down_to_the_floor(clock):
+    bucket = TokenBucket(rate=4, min_rate=0.75)
+
+    bucket.on_throttled()
+    assert bucket.rate == 2
+    bucket.on_throttled()  # The same burst, backs off once
+    assert bucket.rate == 2
+    clock.advance(1)
+    bucket.on_throttled()
+    assert bucket.rate == 1
+    clock.advance(1)
+    bucket.on_throttled()
+    assert bucket.rate == 0.75
+    assert bucket.stats["throttled"] == 4
+
+
+def test_retry_after_holds_every_request(clock):
+    bucket = TokenBucket(rate=10)
+
+    bucket.on_throttled(retry_after=3)
+
+    assert bucket.rate == 5
+    # Every request waits for the Retry-After, whatever tokens were left
+    assert [bucket.reserve() for _ in range(3)] == [3, 3, 3]
+    clock.advance(3)
+    assert bucket.reserve() == 0
+
+
+def test_limiter_adapts_the_bucket_of_the_endpoint(clock):
+    limiter = RateLimiter(rate=4, endpoints={"/v1/documents": 2})
+    documents = limiter.bucket_for("/v1/documents/search")
+
+    limiter.update("/v1/documents/search", 429, {"Retry-After": "2"})
+    assert documents.rate == 1
+    assert limiter.reserve("/v1/documents/search") == 2
+    assert limiter.reserve("/v1/clients/search") == 0
+    assert limiter.default.rate == 4
+
+    limiter.update("/v1/clients/search", 200, {})
+    assert limiter.default.rate == 4.25
+    limiter.update(
+        "/v1/clients/search",
+        200,
+        {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(clock.now + 5)},
+    )
+    assert limiter.default.rate == 4.25
+    assert limiter.reserve("/v1/clients/search") == 5
+
+
+def test_parse_headers(clock):
+    assert parse_retry_after("1.5") == 1.5
+    assert parse_retry_after("-1") == 0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412470) == 10
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+    assert (
+        parse_rate_limit_reset({"RateLimit-Remaining": "1", "RateLimit-Reset": "5"})
+        is None
+    )
+    assert (
+        parse_rate_limit_reset({"RateLimit-Remaining": "0", "RateLimit-Reset": "5"})
+        == 5
+    )
+    assert (
+        parse_rate_limit_reset(
+            {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1700000030"},
+            now=1700000000,
+        )
+        == 30
+    )
@@ -0,0 +1,162 @@
+import asyncio
+import datetime
+import decimal
+import threading
+import time
+import types
+
+import green_invoice.resources
+
+from green_invoice.resources import (
+    AsyncDocumentResource,
+    ClientResource,
+    DocumentResource,
+)
+
+from conftest import mock_async_client, mock_client
+
+DRAFT = {
+    "type": 320,
+    "description": "Monthly plan",
+    "currency": "ILS",
+    "client": {"name": "Acme"},
+    "income": [{"description": "Plan", "quantity": 1, "price": 100, "vatType": 0}],
+}
+
+
+def fail_creations(api, count, created=True):
+    """
+    :param created: whether the server creates the failed documents, as if the response
+                    was lost on the way back
+    :return: handler answering the first `count` document creations with a 503
+    """
+    lock = threading.Lock()
+    failed = [0]
+
+    def handler(request):
+        if request.method == "POST" and request.url.endswith("/v1/documents"):
+            with lock:
+                fail = failed[0] < count
+                failed[0] += fail
+            if fail:
+                if created:
+                    api.handle_request(request)
+                return 503, {"Retry-After": "0"}, b"{}"
+        return api.handle_request(request)
+
+    return handler
+
+
+def assert_created_once(api, results, count):
+    assert not [r for r in results if isinstance(r, Exception)]
+    assert len(api.documents) == count
+    assert {r["id"] for r in results} == set(api.documents)
+    for result in results:
+        assert isinstance(result["number"], int)
+        assert set(result) <= {"id", "number", "signed", "lang", "url"}
+
+
+def test_create_many_identical_drafts_with_errors(api):
+    api.error_rate = 0.3
+    resource = DocumentResource(mock_client(api.handle_request))
+
+    results = resource.create_many([dict(DRAFT) for _ in range(20)])
+
+    assert_created_once(api, results, 20)
+
+
+def test_create_many_identical_drafts_with_lost_responses(api):
+    resource = DocumentResource(mock_client(fail_creations(api, 8)), compact=True)
+
+    results = resource.create_many([dict(DRAFT) for _ in range(20)], concurrency=8)
+
+    assert_created_once(api, results, 20)
+
+
+def test_create_finds_its_document_after_lost_response(api):
+    resource = DocumentResource(mock_client(fail_creations(api, 1)))
+
+    result = resource.create(DRAFT)
+
+    (document,) = api.documents.values()
+    assert result == {
+        "id": document["id"],
+        "number": int(document["number"]),
+        "signed": document["signed"],
+        "lang": document["lang"],
+        "url": document["url"],
+    }
+
+
+def test_create_finds_its_document_of_a_date_object_after_lost_response(api):
+    resource = DocumentResource(mock_client(fail_creations(api, 2)))
+
+    for date in (datetime.date.today(), datetime.datetime.now()):
+        resource.create(dict(DRAFT, date=date, description=str(date)))
+
+    assert len(api.documents) == 2
+
+
+def test_create_finds_its_document_with_a_clock_ahead_of_the_api(api, monkeypatch):
+    clock = types.SimpleNamespace(
+        time=lambda: time.time() + 10 * 60, monotonic=time.monotonic
+    )
+    monkeypatch.setattr(green_invoice.resources, "time", clock)
+    resource = DocumentResource(mock_client(fail_creations(api, 1)))
+
+    resource.create(DRAFT)
+
+    assert len(api.documents) == 1
+
+
+def test_create_ignores_documents_of_other_amounts(api):
+    api.add_document(
+        dict(DRAFT, income=[dict(DRAFT["income"][0], price=99)]),
+    )
+    api.add_document(dict(DRAFT, currency="USD"))
+    resource = DocumentResource(mock_client(fail_creations(api, 1, created=False)))
+
+    resource.create(DRAFT)
+
+    assert len(api.documents) == 3
+
+
+def test_async_create_many_identical_drafts_with_lost_responses(api):
+    async def create_many():
+        client = mock_async_client(fail_creations(api, 8))
+        try:
+            return await AsyncDocumentResource(client).create_many(
+                [dict(DRAFT) for _ in range(20)], concurrency=8
+            )
+        finally:
+            await client.close()
+
+    results = asyncio.run(create_many())
+
+    assert_created_once(api, results, 20)
+
+
+def test_associate_documents(api):
+    client = api.add_client({"name": "Acme"})
+    document = api.add_document(DRAFT)
+    resource = ClientResource(mock_client(api.handle_request))
+
+    assert resource.associate_documents(client["id"], [document["id"]]) is True
+    assert api.documents[document["id"]]["client"]["id"] == client["id"]
+
+
+def test_create_takes_what_the_codec_encodes(api):
+    resource = DocumentResource(mock_client(api.handle_request))
+    today = datetime.date.today()
+
+    resource.create(
+        dict(
+            DRAFT,
+            date=today,
+            income=[dict(DRAFT["income"][0], price=decimal.Decimal("10.5"))],
+        )
+    )
+
+    (document,) = api.documents.values()
+    assert document["documentDate"] == today.isoformat()
+    assert document["income"][0]["price"] == 10.5
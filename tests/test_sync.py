@@ -0,0 +1,129 @@
+import datetime
+
+import pytest
+
+from green_invoice.mirror import Mirror
+from green_invoice.sync import SyncEngine
+
+from conftest import mock_client
+
+
+@pytest.fixture
+def engine(api):
+    api.seed(clients=10, documents=300, days=365)
+    mirror = Mirror()
+    yield SyncEngine(mirror, mock_client(api.handle_request), page_size=50)
+    mirror.close()
+
+
+def test_sync_documents_fetches_new_documents_dated_before_the_window(api, engine):
+    engine.sync_documents()
+    date = datetime.date.today() - datetime.timedelta(days=120)
+    document = api.add_document({"type": 320, "date": date.isoformat()})
+
+    result = engine.sync_documents()
+
+    assert result.inserted == 1
+    assert engine.mirror.get("documents", document["id"]) is not None
+    assert engine.mirror.count("documents") == len(api.documents)
+
+
+def test_sync_documents_resumes_paging_new_documents(api, engine):
+    engine.sync_documents()
+    date = datetime.date.today() - datetime.timedelta(days=200)
+    new = [api.add_document({"date": date.isoformat()}) for _ in range(120)]
+    search_document = engine.documents.search_document
+    pages = []
+
+    def interrupted(params):
+        pages.append(params["page"])
+        if len(pages) == 2:
+            raise RuntimeError("interrupted")
+        return search_document(params)
+
+    engine.documents.search_document = interrupted
+    with pytest.raises(RuntimeError):
+        engine.sync_documents()
+    engine.documents.search_document = search_document
+
+    result = engine.sync_documents()
+
+    assert result.resumed
+    assert all(engine.mirror.get("documents", d["id"]) for d in new)
+
+
+def record_searches(engine, transform=None):
+    """
+    :param transform: called with each search result body, e.g. to reorder its items
+    :return: list of the search params the engine sends
+    """
+    search_document = engine.documents.search_document
+    searches = []
+
+    def search(params):
+        searches.append(params)
+        body = search_document(params)
+        return transform(body) if transform else body
+
+    engine.documents.search_document = search
+    return searches
+
+
+def test_sync_documents_stops_paging_new_documents_at_mirrored_ones(api, engine):
+    engine.sync_documents()
+    document = api.add_document({"type": 320})
+    searches = record_searches(engine)
+
+    engine.sync_documents()
+
+    new_searches = [s for s in searches if s["fromDate"] == engine.start_date]
+    assert [s["page"] for s in new_searches] == [1]
+    assert engine.mirror.get("documents", document["id"]) is not None
+
+
+def test_sync_documents_pages_all_documents_unless_sorted_newest_first(api, engine):
+    engine.sync_documents()
+    date = datetime.date.today() - datetime.timedelta(days=200)
+    document = api.add_document({"type": 320, "date": date.isoformat()})
+
+    def oldest_first(body):
+        return dict(body, items=body["items"][::-1])
+
+    searches = record_searches(engine, oldest_first)
+
+    engine.sync_documents()
+
+    new_searches = [s for s in searches if s["fromDate"] == engine.start_date]
+    assert [s["page"] for s in new_searches] == [1, 2, 3, 4, 5, 6, 7]
+    assert engine.mirror.get("documents", document["id"]) is not None
+
+
+def test_sync_documents_resumes_partway_through_a_window(api, engine):
+    # Windows of about 50 documents, over 5 pages
+    engine.start_date = (
+        datetime.date.today() - datetime.timedelta(days=365)
+    ).isoformat()
+    engine.window_days = 60
+    engine.page_size = 10
+    searches = record_searches(engine)
+    search = engine.documents.search_document
+
+    def interrupted(params):
+        if len(searches) == 4:
+            raise RuntimeError("interrupted")
+        return search(params)
+
+    engine.documents.search_document = interrupted
+    with pytest.raises(RuntimeError):
+        engine.sync_documents()
+    assert searches[3]["page"] == 4
+    engine.documents.search_document = search
+    mirrored = engine.mirror.count("documents")
+
+    result = engine.sync_documents()
+
+    assert result.resumed
+    # Continues with the page after the last written one, of the same window
+    assert searches[4] == dict(searches[3], page=searches[3]["page"] + 1)
+    assert result.inserted == len(api.documents) - mirrored
+    assert engine.mirror.count("documents") == len(api.documents)
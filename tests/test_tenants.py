@@ -0,0 +1,36 @@
+from green_invoice.resources import ClientResource
+from green_invoice.tenants import ClientRegistry
+from green_invoice.transport import InProcessTransport
+
+from conftest import API_URL
+
+
+class ClosingTransport(InProcessTransport):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def registry(transport):
+    registry = ClientRegistry(transport=transport)
+    registry.client_class = type(
+        "MockClient", (registry.client_class,), {"ENDPOINTS": {"sandbox": API_URL}}
+    )
+    for tenant in ("acme", "globex"):
+        registry.register(
+            tenant, env="sandbox", api_key_id=tenant, api_key_secret="secret"
+        )
+    return registry
+
+
+def test_close_leaves_a_passed_transport_open(api):
+    transport = ClosingTransport(api.handle_request)
+    tenants = registry(transport)
+    ClientResource(tenants["acme"]).create({"name": "Acme"})
+    ClientResource(tenants["globex"]).create({"name": "Globex"})
+
+    tenants.close()
+
+    assert not transport.closed
+    assert tenants["acme"].transport is transport
@@ -0,0 +1,165 @@
+import decimal
+import random
+import sys
+
+import pytest
+
+from green_invoice.exceptions import ImproperlyConfigured
+from green_invoice.models import DiscountType, DocumentVatType, IncomeVatType
+from green_invoice.vat import preview, preview_many
+
+# Drafts and the totals they preview to, amountLocal being the amount unless noted
+CASES = [
+    # VAT added on top of the price
+    ({"income": [{"price": 100, "quantity": 2}]}, {}, (200, 0, 36, 236)),
+    # VAT included in the price
+    (
+        {"income": [{"price": 118, "vatType": IncomeVatType.INCLUDED}]},
+        {},
+        (100, 0, 18, 118),
+    ),
+    ({"income": [{"price": 100, "vatRate": 0.17}]}, {}, (100, 0, 17, 117)),
+    # Exempt rows, documents and businesses
+    (
+        {"income": [{"price": 100}, {"price": 50, "vatType": IncomeVatType.EXEMPT}]},
+        {},
+        (100, 50, 18, 168),
+    ),
+    (
+        {"vatType": DocumentVatType.EXEMPT, "income": [{"price": 100}]},
+        {},
+        (0, 100, 0, 100),
+    ),
+    ({"income": [{"price": 100}]}, {"exempt_business": True}, (0, 100, 0, 100)),
+    # Discounts, taken off the amount before VAT
+    (
+        {
+            "income": [{"price": 100}],
+            "discount": {"amount": 10, "type": DiscountType.PERCENTAGE},
+        },
+        {},
+        (90, 0, 16.2, 106.2),
+    ),
+    (
+        {
+            "income": [{"price": 100}, {"price": 100}],
+            "discount": {"amount": 20, "type": DiscountType.SUM},
+        },
+        {},
+        (180, 0, 32.4, 212.4),
+    ),
+    (
+        {
+            "income": [{"price": 118, "vatType": IncomeVatType.INCLUDED}],
+            "discount": {"amount": 18, "type": DiscountType.SUM},
+        },
+        {},
+        (82, 0, 14.76, 96.76),
+    ),
+    # 1.005 rounds half up to agorot, though floats store it as 1.00499...
+    ({"income": [{"price": 0.335, "quantity": 3}]}, {}, (1.01, 0, 0.18, 1.19)),
+    (
+        {"income": [{"price": decimal.Decimal("0.335"), "quantity": 3}]},
+        {},
+        (1.01, 0, 0.18, 1.19),
+    ),
+    # Rows in another currency
+    (
+        {
+            "currency": "ILS",
+            "income": [{"price": 10, "currency": "USD", "currencyRate": 3.7}],
+        },
+        {},
+        (37, 0, 6.66, 43.66),
+    ),
+]
+
+
+@pytest.mark.parametrize("draft,options,totals", CASES)
+def test_preview(draft, options, totals):
+    result = preview(draft, **options)
+
+    due, exempt, vat, amount = totals
+    assert result["amountDueVat"] == due
+    assert result["amountExemptVat"] == exempt
+    assert result["amountExcludedVat"] == round(due + exempt, 2)
+    assert result["vat"] == vat
+    assert result["amount"] == result["amountLocal"] == amount
+    assert result["rounding"] == 0
+
+
+def test_preview_rows():
+    result = preview(
+        {
+            "income": [
+                {"price": 118, "vatType": IncomeVatType.INCLUDED},
+                {"price": 0.335, "quantity": 3},
+            ]
+        }
+    )
+
+    assert [
+        (row["amount"], row["vat"], row["amountTotal"]) for row in result["income"]
+    ] == [(100, 18, 118), (1.01, 0.18, 1.19)]
+
+
+@pytest.mark.parametrize("price,amount,rounding", [(10.4, 12, -0.27), (10.6, 13, 0.49)])
+def test_preview_rounds_the_amount_to_whole_units(price, amount, rounding):
+    result = preview({"rounding": True, "income": [{"price": price}]})
+
+    assert result["amount"] == amount
+    assert result["rounding"] == rounding
+
+
+def test_preview_converts_the_amount_to_the_local_currency():
+    result = preview({"currency": "USD", "income": [{"price": 100}]}, currency_rate=3.7)
+
+    assert result["amount"] == 118
+    assert result["amountLocal"] == 436.6
+
+
+def random_drafts(count, seed=0):
+    rnd = random.Random(seed)
+    drafts = []
+    for _ in range(count):
+        rows = [
+            {
+                "price": round(rnd.uniform(-50, 500), rnd.choice((0, 2, 3))),
+                "quantity": rnd.choice((None, 1, 2, 0.5, 3)),
+                "vatType": rnd.choice(list(IncomeVatType)),
+            }
+            for _ in range(rnd.randint(0, 4))
+        ]
+        for row in rows:
+            if rnd.random() < 0.2:
+                row.update(currency="USD", currencyRate=3.7)
+        draft = {"currency": "ILS", "income": rows, "rounding": rnd.random() < 0.3}
+        if rnd.random() < 0.3:
+            draft["discount"] = {
+                "amount": rnd.choice((5, 12.5, 30)),
+                "type": rnd.choice(list(DiscountType)),
+            }
+        if rnd.random() < 0.1:
+            draft["vatType"] = DocumentVatType.EXEMPT
+        drafts.append(draft)
+    return drafts
+
+
+@pytest.mark.parametrize("exempt_business", [False, True])
+def test_preview_many_matches_preview(exempt_business):
+    drafts = random_drafts(500)
+    rates = [random.Random(index).choice((1.0, 3.7)) for index in range(len(drafts))]
+
+    totals = preview_many(drafts, currency_rates=rates, exempt_business=exempt_business)
+
+    for index, (draft, rate) in enumerate(zip(drafts, rates)):
+        expected = preview(draft, currency_rate=rate, exempt_business=exempt_business)
+        for name, values in totals.items():
+            assert values[index] == expected[name], (index, name)
+
+
+def test_preview_many_requires_numpy(monkeypatch):
+    monkeypatch.setitem(sys.modules, "numpy", None)
+
+    with pytest.raises(ImproperlyConfigured):
+        preview_many(random_drafts(1))